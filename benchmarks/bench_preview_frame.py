@@ -0,0 +1,88 @@
+# benchmarks/bench_preview_frame.py
+
+"""
+Микробенчмарк подготовки кадра превью 1280x720 в потоке камеры.
+
+    before - прежний путь: capture_array() (новый массив на каждый кадр),
+             перестановка каналов BGR -> RGB индексированием и новый QImage;
+    after  - формат BGR888 (байты уже в порядке RGB), копирование буфера
+             камеры в кадр из пула, QImage построен один раз при создании пула.
+
+Выводится время на кадр и объем памяти, выделяемой на кадр (tracemalloc).
+
+Запуск из корня репозитория:
+    python benchmarks/bench_preview_frame.py --frames 300
+"""
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_camera import install_stub_modules
+
+install_stub_modules()
+
+from PyQt5.QtGui import QImage                                           # noqa: E402
+from spectrometer_app.core.frame_pool import FramePool, copy_into_frame  # noqa: E402
+
+WIDTH, HEIGHT = 1280, 720
+
+
+def before(camera_buffer):
+    array = camera_buffer.copy()                    # capture_array() копирует буфер
+    array[:, :, [0, 2]] = array[:, :, [2, 0]]       # BGR -> RGB
+    h, w, ch = array.shape
+    image = QImage(array.data, w, h, ch * w, QImage.Format_RGB888)
+    return image, array
+
+
+def make_after(pool):
+    def after(camera_buffer):
+        frame = pool.acquire()
+        copy_into_frame(camera_buffer, frame)
+        frame.release()
+        return frame
+    return after
+
+
+def measure(function, camera_buffer, frames):
+    for _ in range(10):                             # прогрев
+        function(camera_buffer)
+
+    start_time = time.perf_counter()
+    for _ in range(frames):
+        function(camera_buffer)
+    per_frame = (time.perf_counter() - start_time) / frames
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    for _ in range(10):
+        function(camera_buffer)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_frame, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=300, help="число кадров для замера")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    camera_buffer = rng.integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+    pool = FramePool(WIDTH, HEIGHT)
+
+    for name, function in (("before", before), ("after", make_after(pool))):
+        per_frame, peak = measure(function, camera_buffer, args.frames)
+        print(f"{name:>6}: {per_frame * 1000:6.2f} ms/frame, "
+              f"peak allocation {peak / 1024 / 1024:6.2f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/bench_raw_bayer.py
+
+"""
+Бенчмарк сырого пути анализа: распаковка CSI2P 10/12 бит и линейное
+изображение Байера (RawBayerConverter) без ISP.
+
+Режимы:
+    preview - режим сенсора, используемый видеопотоком (imx708 2304x1296, 10 бит;
+              HQ 2028x1520, 12 бит), полный кадр и только полоса ROI (5% высоты);
+    full    - полное разрешение сенсора (imx708 4608x2592, HQ 4056x3040).
+
+Перед замером распаковка сверяется с эталоном (упаковка случайных данных).
+Выводится время на кадр и достижимая частота кадров.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_raw_bayer.py --frames 30
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_camera import install_stub_modules
+
+install_stub_modules()
+
+from spectrometer_app.core.raw_bayer import RawBayerConverter, unpack_raw   # noqa: E402
+
+MODES = [
+    ('imx708 preview', 'SRGGB10_CSI2P', (2304, 1296)),
+    ('imx708 full',    'SRGGB10_CSI2P', (4608, 2592)),
+    ('HQ preview',     'SBGGR12_CSI2P', (2028, 1520)),
+    ('HQ full',        'SBGGR12_CSI2P', (4056, 3040)),
+]
+
+
+def pack_raw(pixels, bit_depth, stride_align=32):
+    """Эталонная упаковка CSI2P (векторная) с выравниванием строки, как у буфера камеры"""
+    height, width = pixels.shape
+    if bit_depth == 10:
+        groups = pixels.reshape(height, width // 4, 4)
+        packed = np.empty((height, width // 4, 5), dtype=np.uint8)
+        packed[..., :4] = groups >> 2
+        packed[..., 4] = sum(((groups[..., i] & 0x3) << (2 * i)) for i in range(4))
+    else:
+        groups = pixels.reshape(height, width // 2, 2)
+        packed = np.empty((height, width // 2, 3), dtype=np.uint8)
+        packed[..., :2] = groups >> 4
+        packed[..., 2] = (groups[..., 0] & 0xF) | ((groups[..., 1] & 0xF) << 4)
+    packed = packed.reshape(height, -1)
+    stride = -(-packed.shape[1] // stride_align) * stride_align
+    buffer = np.zeros((height, stride), dtype=np.uint8)
+    buffer[:, :packed.shape[1]] = packed
+    return buffer
+
+
+def measure(function, frames):
+    function()   # прогрев (выделение буферов)
+    start = time.perf_counter()
+    for _ in range(frames):
+        function()
+    return (time.perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=30, help="кадров на замер")
+    parser.add_argument('--roi', type=float, default=0.05, help="высота полосы ROI, доля кадра")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'mode':<16} {'path':<22} {'ms/frame':>9} {'fps':>8}")
+    for name, raw_format, (width, height) in MODES:
+        bit_depth = 10 if '10' in raw_format else 12
+        pixels = rng.integers(0, 1 << bit_depth, size=(height, width), dtype=np.uint16)
+        buffer = pack_raw(pixels, bit_depth)
+        assert np.array_equal(unpack_raw(buffer, width, bit_depth, True), pixels), "unpack mismatch"
+
+        rows = max(1, int(round(args.roi * height / 2)))
+        start = (height // 2 - rows) // 2
+        for output in ('rgb', 'mono'):
+            converter = RawBayerConverter(raw_format, (width, height), output)
+            full = measure(lambda: converter.convert_rows(buffer, black_levels=(4096,) * 4), args.frames)
+            band = measure(lambda: converter.convert_rows(buffer, start, start + rows,
+                                                          black_levels=(4096,) * 4), args.frames)
+            for path, elapsed in ((f"{output} full frame", full), (f"{output} ROI band", band)):
+                print(f"{name:<16} {path:<22} {elapsed * 1000:9.2f} {1 / elapsed:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
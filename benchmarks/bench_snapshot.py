@@ -0,0 +1,134 @@
+# benchmarks/bench_snapshot.py
+
+"""
+Время полного цикла снимка (от запроса до возобновления видео) на имитации камеры.
+
+Сравниваются:
+    legacy   - прежняя схема: остановка потока, закрытие камеры, открытие второй
+               камеры для снимка, затем повторная инициализация видео (+500 мс
+               отложенного применения настроек);
+    in-place - одна камера потока, переключение режима видео/фото на месте.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_snapshot.py --runs 5
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_camera import FakePicamera2, DictSettings, install_stub_modules
+
+install_stub_modules()
+
+from PyQt5.QtCore import QCoreApplication                   # noqa: E402
+from spectrometer_app.utils.config import DEFAULT_SETTINGS  # noqa: E402
+from spectrometer_app.core.camera_thread import CameraThread             # noqa: E402
+from spectrometer_app.core.snapshot_capture import select_still_resolution  # noqa: E402
+
+
+def start_video_camera():
+    camera = FakePicamera2()
+    config = camera.create_video_configuration(main={"size": (1280, 720), "format": "RGB888"})
+    camera.configure(config)
+    camera.start()
+    return camera, config
+
+
+def legacy_snapshot(settings, results_dir, legacy_settle):
+    """Повторяет последовательность операций прежней реализации снимка"""
+    video_camera, _ = start_video_camera()
+
+    start_time = time.monotonic()
+    video_camera.capture_metadata()           # save_current_settings
+    video_camera.stop()
+    video_camera.close()
+
+    capture_cam = FakePicamera2()
+    max_res = select_still_resolution(capture_cam.sensor_modes)   # прежняя схема: опрос на каждый снимок
+    still_config = capture_cam.create_still_configuration(main={"size": max_res, "format": "RGB888"},
+                                                          raw={"size": max_res})
+    capture_cam.configure(still_config)
+    capture_cam.start()
+    time.sleep(legacy_settle)
+
+    request = capture_cam.capture_request()
+    request.make_image("main").save(os.path.join(results_dir, "legacy.jpg"))
+    capture_cam.capture_file(os.path.join(results_dir, "legacy.dng"), name="raw")
+    request.release()
+    capture_cam.stop()
+    capture_cam.close()
+
+    # initCamera(): новый поток и новая камера, настройки через 500 мс
+    video_camera, _ = start_video_camera()
+    time.sleep(0.5)
+    video_camera.capture_array("main")        # первый кадр видео
+    elapsed = time.monotonic() - start_time
+    video_camera.close()
+    return elapsed
+
+
+def in_place_snapshot(thread, settings):
+    """Снимок через поток камеры с переключением режима на месте"""
+    results = []
+    thread.snapshot_captured.connect(results.append)
+
+    start_time = time.monotonic()
+    thread._take_snapshot(settings)
+    # Кадр снимка запрашивается без блокировки - обработка событий потока
+    # камеры до возврата в видео (первый кадр видео запрашивается при возврате)
+    while not results:
+        handler, handler_args = thread._events.get(timeout=5)
+        handler(*handler_args)
+    elapsed = time.monotonic() - start_time
+
+    thread.snapshot_captured.disconnect(results.append)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="число повторений")
+    parser.add_argument('--legacy-settle', type=float, default=1.0,
+                        help="пауза time.sleep() прежней реализации, с")
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)  # noqa: F841
+    settings = DEFAULT_SETTINGS.copy()
+    settings['exposure'] = 0.01
+
+    with tempfile.TemporaryDirectory() as results_dir:
+        cwd = os.getcwd()
+        os.chdir(results_dir)
+        try:
+            legacy_times = [legacy_snapshot(settings, results_dir, args.legacy_settle)
+                            for _ in range(args.runs)]
+
+            thread = CameraThread(DictSettings(), camera_factory=FakePicamera2)
+            thread.camera, thread.video_config = start_video_camera()
+
+            FakePicamera2.stats.update(open=0, configure=0)
+            in_place_times = [in_place_snapshot(thread, settings) for _ in range(args.runs)]
+            in_place_stats = dict(FakePicamera2.stats)
+            thread.camera.close()
+        finally:
+            os.chdir(cwd)
+
+    def report(name, times):
+        times = sorted(times)
+        print(f"{name:>9}: median {times[len(times) // 2] * 1000:7.1f} ms, "
+              f"min {times[0] * 1000:7.1f} ms, max {times[-1] * 1000:7.1f} ms")
+
+    report("legacy", legacy_times)
+    report("in-place", in_place_times)
+    print(f"in-place camera opens: {in_place_stats['open']}, "
+          f"configures: {in_place_stats['configure']} for {args.runs} snapshots")
+
+
+if __name__ == '__main__':
+    main()
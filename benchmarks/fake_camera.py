@@ -0,0 +1,334 @@
+# benchmarks/fake_camera.py
+
+"""
+Имитация Picamera2 для бенчмарков без оборудования.
+
+Задержки открытия/конфигурации/запуска подобраны по порядку величины
+для Raspberry Pi 4 с модулем камеры v3 и могут быть изменены через атрибуты
+класса FakePicamera2. Если picamera2/libcamera не установлены, функция
+install_stub_modules() подставляет минимальные заглушки этих модулей,
+чтобы можно было импортировать spectrometer_app.
+"""
+
+import sys
+import time
+import types
+import numpy as np
+
+
+class _Enum:
+    """Простое перечисление: атрибуты возвращают свои имена"""
+    def __init__(self, *names):
+        for name in names:
+            setattr(self, name, name)
+
+
+class Transform:
+    def __init__(self, hflip=0, vflip=0):
+        self.hflip = hflip
+        self.vflip = vflip
+
+
+def _make_controls_module():
+    controls = types.SimpleNamespace()
+    controls.AwbModeEnum = _Enum('Auto', 'Incandescent', 'Tungsten', 'Fluorescent',
+                                 'Indoor', 'Daylight', 'Cloudy', 'Custom')
+    controls.AeExposureModeEnum = _Enum('Normal', 'Short', 'Long', 'Custom')
+    controls.AfModeEnum = _Enum('Manual', 'Auto', 'Continuous')
+    controls.draft = types.SimpleNamespace(
+        NoiseReductionModeEnum=_Enum('Off', 'Fast', 'HighQuality'))
+    return controls
+
+
+class FakeImage:
+    """Замена PIL.Image: сохраняет сырые байты массива"""
+    def __init__(self, array):
+        self.array = array
+
+    def save(self, filename, format=None, quality=None):
+        if hasattr(filename, 'write'):
+            filename.write(self.array.tobytes())
+        else:
+            self.array.tofile(filename)
+
+
+class FakeHelpers:
+    def make_image(self, array, config, width=None, height=None):
+        return FakeImage(array)
+
+    def save_dng(self, buffer, metadata, config, filename):
+        buffer.tofile(filename)
+
+
+class FakeMappedArray:
+    """Замена picamera2.MappedArray: доступ к буферу потока без копирования"""
+    def __init__(self, request, stream, reshape=True, write=False):
+        self.request = request
+        self.stream  = stream
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    @property
+    def array(self):
+        return self.request.arrays[self.stream]
+
+
+class FakeJob:
+    def __init__(self, result):
+        self._result = result
+
+    def get_result(self, timeout=None):
+        return self._result
+
+
+class FakeRequest:
+    def __init__(self, camera, arrays, metadata):
+        self.camera   = camera
+        self.config   = camera.camera_config
+        self.arrays   = arrays
+        self.metadata = metadata
+        self.released = False
+
+    def make_array(self, name):
+        return self.arrays[name].copy()
+
+    def make_buffer(self, name):
+        return self.arrays[name].reshape(-1).view(np.uint8).copy()
+
+    def make_image(self, name):
+        return FakeImage(self.arrays[name])
+
+    def get_metadata(self):
+        return dict(self.metadata)
+
+    def save_dng(self, filename, name="raw"):
+        self.arrays[name].tofile(filename)
+
+    def release(self):
+        self.released = True
+
+
+class FakePicamera2:
+    """Минимальная имитация API Picamera2, используемого приложением"""
+
+    OPEN_TIME        = 0.30   # открытие камеры, с
+    CLOSE_TIME       = 0.05
+    CONFIGURE_TIME   = 0.12   # configure() / выделение буферов
+    START_TIME       = 0.04
+    STOP_TIME        = 0.03
+    SENSOR_MODE_TIME = 0.15   # на каждый режим при опросе sensor_modes
+    FRAME_TIME       = 1.0 / 30
+
+    SENSOR_SIZE = (4608, 2592)
+    SENSOR_MODES = [
+        {'size': (1536, 864),  'bit_depth': 10, 'fps': 120.0, 'format': 'SRGGB10_CSI2P',
+         'crop_limits': (768, 432, 3072, 1728), 'exposure_limits': (9, None, None)},
+        {'size': (2304, 1296), 'bit_depth': 10, 'fps': 56.0, 'format': 'SRGGB10_CSI2P',
+         'crop_limits': (0, 0, 4608, 2592), 'exposure_limits': (13, None, None)},
+        {'size': (4608, 2592), 'bit_depth': 10, 'fps': 14.0, 'format': 'SRGGB10_CSI2P',
+         'crop_limits': (0, 0, 4608, 2592), 'exposure_limits': (26, None, None)},
+    ]
+
+    # Счетчики операций (для отчетов бенчмарков)
+    stats = {'open': 0, 'configure': 0, 'start': 0, 'exposures': 0}
+
+    def __init__(self, camera_num=0):
+        time.sleep(self.OPEN_TIME)
+        FakePicamera2.stats['open'] += 1
+        self.started       = False
+        self.camera_config = None
+        self.controls      = {}
+        self.helpers       = FakeHelpers()
+        self.camera_properties = {
+            'Model': 'imx708',
+            'PixelArraySize': self.SENSOR_SIZE,
+            'ScalerCropMaximum': (0, 0) + self.SENSOR_SIZE,
+        }
+        self._arrays = {}
+        self._last_frame = 0.0
+        self._frame_count = 0
+
+    # --- Конфигурации ---
+    def _make_configuration(self, main, lores, raw, controls, transform, buffer_count, **kwargs):
+        main = dict(main or {})
+        main.setdefault('size', (640, 480))
+        main.setdefault('format', 'XBGR8888')
+        config = {'main': main, 'lores': dict(lores) if lores else None,
+                  'raw': dict(raw) if raw else {'size': main['size'], 'format': 'SRGGB10_CSI2P'},
+                  'controls': dict(controls or {}), 'transform': transform or Transform(),
+                  'buffer_count': buffer_count}
+        config['raw'].setdefault('format', 'SRGGB10_CSI2P')
+        config.update(kwargs)
+        return config
+
+    def create_video_configuration(self, main=None, lores=None, raw=None, transform=None,
+                                   buffer_count=6, controls=None, **kwargs):
+        return self._make_configuration(main, lores, raw, controls, transform, buffer_count, **kwargs)
+
+    def create_still_configuration(self, main=None, lores=None, raw=None, transform=None,
+                                   buffer_count=1, controls=None, **kwargs):
+        return self._make_configuration(main, lores, raw, controls, transform, buffer_count, **kwargs)
+
+    def create_preview_configuration(self, *args, **kwargs):
+        return self.create_video_configuration(*args, **kwargs)
+
+    @property
+    def sensor_modes(self):
+        # Picamera2 перебирает конфигурации, чтобы узнать режимы
+        time.sleep(self.SENSOR_MODE_TIME * len(self.SENSOR_MODES))
+        return [dict(m) for m in self.SENSOR_MODES]
+
+    def configure(self, config):
+        time.sleep(self.CONFIGURE_TIME)
+        FakePicamera2.stats['configure'] += 1
+        self.camera_config = config
+        self.controls = dict(config.get('controls') or {})
+        self._arrays = {}
+        for name in ('main', 'lores', 'raw'):
+            stream = config.get(name)
+            if not stream:
+                continue
+            w, h = stream['size']
+            fmt = stream.get('format', '')
+            if name == 'raw':
+                self._arrays[name] = np.zeros((h, w * 5 // 4), dtype=np.uint8)
+            elif fmt in ('XBGR8888', 'XRGB8888'):
+                self._arrays[name] = np.full((h, w, 4), 64, dtype=np.uint8)
+            elif fmt == 'YUV420':
+                self._arrays[name] = np.full((h * 3 // 2, w), 64, dtype=np.uint8)
+            else:
+                self._arrays[name] = np.full((h, w, 3), 64, dtype=np.uint8)
+
+    def start(self, config=None, show_preview=False):
+        if config is not None:
+            self.configure(config)
+        time.sleep(self.START_TIME)
+        FakePicamera2.stats['start'] += 1
+        self.started = True
+        self._last_frame = time.monotonic()
+
+    def stop(self):
+        time.sleep(self.STOP_TIME)
+        self.started = False
+
+    def close(self):
+        time.sleep(self.CLOSE_TIME)
+        self.started = False
+
+    def switch_mode(self, camera_config, wait=None, signal_function=None):
+        self.stop()
+        self.configure(camera_config)
+        self.start()
+        return camera_config
+
+    # --- Управление ---
+    def set_controls(self, controls):
+        self.controls.update(controls)
+
+    def _frame_duration(self):
+        exposure = self.controls.get('ExposureTime')
+        if exposure:
+            return max(self.FRAME_TIME, exposure / 1e6)
+        return self.FRAME_TIME
+
+    def _wait_frame(self):
+        # Ожидание окончания очередного кадра
+        next_frame = self._last_frame + self._frame_duration()
+        delay = next_frame - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._last_frame = time.monotonic()
+        self._frame_count += 1
+        FakePicamera2.stats['exposures'] += 1
+
+    def _metadata(self):
+        metadata = {
+            'SensorTimestamp': int(self._last_frame * 1e9),
+            'ExposureTime':    int(self.controls.get('ExposureTime', self.FRAME_TIME * 1e6)),
+            'FrameDuration':   int(self._frame_duration() * 1e6),
+            'AnalogueGain':    1.0,
+            'ColourGains':     (1.8, 1.6),
+        }
+        if 'LensPosition' in self.controls:
+            metadata['LensPosition'] = self.controls['LensPosition']
+        return metadata
+
+    # --- Захват ---
+    def capture_metadata(self, wait=None):
+        self._wait_frame()
+        return self._metadata()
+
+    def capture_array(self, name="main", wait=None):
+        self._wait_frame()
+        return self._arrays[name].copy()
+
+    def capture_request(self, wait=None, flush=None, signal_function=None):
+        self._wait_frame()
+        request = FakeRequest(self, self._arrays, self._metadata())
+        if wait is False:
+            job = FakeJob(request)
+            if signal_function is not None:
+                signal_function(job)
+            return job
+        return request
+
+    def capture_file(self, file_output, name="main", format=None, wait=None):
+        self._wait_frame()
+        self._arrays[name].tofile(file_output)
+        return self._metadata()
+
+    def switch_mode_and_capture_request(self, camera_config, wait=None, signal_function=None):
+        preview_config = self.camera_config
+        self.switch_mode(camera_config)
+        request = FakeRequest(self, dict(self._arrays), None)
+        self._wait_frame()
+        request.metadata = self._metadata()
+        self.switch_mode(preview_config)
+        if wait is False:
+            job = FakeJob(request)
+            if signal_function is not None:
+                signal_function(job)
+            return job
+        return request
+
+    def wait(self, job, timeout=None):
+        return job.get_result(timeout)
+
+    def cancel_all_and_flush(self):
+        pass
+
+
+def install_stub_modules():
+    """Подставляет заглушки picamera2/libcamera, если они не установлены"""
+    try:
+        import libcamera  # noqa: F401
+    except ImportError:
+        libcamera = types.ModuleType('libcamera')
+        libcamera.controls = _make_controls_module()
+        libcamera.Transform = Transform
+        sys.modules['libcamera'] = libcamera
+
+    try:
+        import picamera2  # noqa: F401
+    except ImportError:
+        picamera2 = types.ModuleType('picamera2')
+        picamera2.Picamera2 = FakePicamera2
+        picamera2.MappedArray = FakeMappedArray
+        sys.modules['picamera2'] = picamera2
+
+
+class DictSettings:
+    """Замена QSettings для запуска без сохраненных настроек"""
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+
+    def value(self, key, default=None, type=None):
+        value = self.values.get(key, default)
+        return type(value) if type is not None and value is not None else value
+
+    def setValue(self, key, value):
+        self.values[key] = value
@@ -0,0 +1,12 @@
+# spectrometer_app/headless.py
+
+import sys
+
+try:
+    from .core.headless import main
+except ImportError:
+    from spectrometer_app.core.headless import main
+
+
+if __name__ == "__main__":
+    sys.exit(main())
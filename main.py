@@ -1,6 +1,7 @@
 # spectrometer_app/main.py
 
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QFont
 
@@ -11,6 +12,7 @@ except ImportError:
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()   # пул процессов каталога (spawn) в собранном приложении
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
 
@@ -0,0 +1,12 @@
+# spectrometer_app/reprocess.py
+
+import sys
+
+try:
+    from .core.reprocess import main
+except ImportError:
+    from spectrometer_app.core.reprocess import main
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,11 +8,22 @@ __version__ = "0.0.2"
 __author__ = "Vorobev Dmitri Alexandrovich"
 __email__ = "vorobev.da@phystech.edu"
 
-# Реэкспорт основных классов для удобного импорта
-from .core.camera_thread import CameraThread
-from .ui.main_window import CameraApp
+import importlib
 
-__all__ = [
-    'CameraThread',
-    'CameraApp',
-]
\ No newline at end of file
+# Реэкспорт основных классов для удобного импорта (лениво, PEP 562: подпакеты
+# core и utils можно использовать без PyQt5 и picamera2)
+_EXPORTS = {
+    'CameraThread': 'core.camera_thread',
+    'CameraApp':    'ui.main_window',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
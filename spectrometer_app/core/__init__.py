@@ -1,9 +1,93 @@
 # для объединения классов и функций в 1 модуль
+#
+# Импорт ленивый (PEP 562): модуль загружается при первом обращении к имени.
+# Так обработка сохраненных данных и запуск без интерфейса не тянут за собой
+# PyQt5 и picamera2, пока не используются поток камеры и окна.
 
-from .camera_thread import CameraThread
-from .snapshot import take_and_save_snapshot_standalone
+import importlib
 
-__all__ = [
-    'CameraThread',
-    'take_and_save_snapshot_standalone'
-]
\ No newline at end of file
+_EXPORTS = {   # имя -> модуль пакета
+    'CameraThread':                      'camera_thread',
+    'take_and_save_snapshot_standalone': 'snapshot',
+    'handle_snapshot_captured':          'snapshot',
+    'handle_snapshot_failed':            'snapshot',
+    'handle_snapshot_exposure_started':  'snapshot',
+    'handle_snapshot_cancelled':         'snapshot',
+    'cancel_snapshot':                   'snapshot',
+    'handle_snapshot_progress':          'snapshot',
+    'handle_snapshot_written':           'snapshot',
+    'handle_snapshot_queue_depth':       'snapshot',
+    'capture_snapshot_in_place':         'snapshot_capture',
+    'create_snapshot_configuration':     'snapshot_capture',
+    'select_still_resolution':           'snapshot_capture',
+    'extract_snapshot_job':              'snapshot_io',
+    'write_snapshot_job':                'snapshot_io',
+    'save_snapshot_metadata':            'snapshot_io',
+    'write_stack_job':                   'snapshot_io',
+    'SnapshotWriter':                    'snapshot_writer',
+    'FrameMailbox':                      'frame_mailbox',
+    'FramePool':                         'frame_pool',
+    'PooledFrame':                       'frame_pool',
+    'copy_into_frame':                   'frame_pool',
+    'stream_view':                       'frame_pool',
+    'SpectrumExtractor':                 'spectrum',
+    'CHANNEL_WEIGHTS':                   'spectrum',
+    'WavelengthCalibration':             'calibration',
+    'detect_lines':                      'calibration',
+    'CalibrationFrameStore':             'calibration_frames',
+    'MasterFrameBuilder':                'calibration_frames',
+    'FrameCorrector':                    'calibration_frames',
+    'calibration_frame_key':             'calibration_frames',
+    'FrameStacker':                      'stacking',
+    'STACK_MODES':                       'stacking',
+    'ResultsCatalog':                    'catalog',
+    'read_entry':                        'catalog',
+    'spectrum_summary':                  'catalog',
+    'HdrMerger':                         'hdr',
+    'exposure_series':                   'hdr',
+    'HDR_SATURATION':                    'hdr',
+    'SpectralAutoExposure':              'auto_exposure',
+    'measure_band':                      'auto_exposure',
+    'FocusSweep':                        'autofocus',
+    'sharpness_score':                   'autofocus',
+    'MotionProfile':                     'motion',
+    'AxisDriver':                        'motion',
+    'SimulatedAxisDriver':               'motion',
+    'GpioStepperAxisDriver':             'motion',
+    'SerialStepperAxisDriver':           'motion',
+    'create_axis_driver':                'motion',
+    'MotionController':                  'motion_controller',
+    'ScanEngine':                        'scan',
+    'ScanDataset':                       'scan_dataset',
+    'scan_points':                       'scan_dataset',
+    'scan_axis_positions':               'scan_dataset',
+    'RawBayerConverter':                 'raw_bayer',
+    'unpack_raw':                        'raw_bayer',
+    'parse_raw_format':                  'raw_bayer',
+    'resample_spectrum':                 'raw_bayer',
+    'read_dng':                          'dng',
+    'find_sources':                      'reprocess',
+    'reprocess_results':                 'reprocess',
+    'HeadlessRunner':                    'headless',
+    'load_run_config':                   'headless',
+    'plan_strip_mode':                   'sensor_strip',
+    'FrameRateMeter':                    'sensor_strip',
+    'SensorModeStore':                   'sensor_modes',
+    'select_sensor_mode':                'sensor_modes',
+    'find_sensor_mode':                  'sensor_modes',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value   # следующие обращения - без __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
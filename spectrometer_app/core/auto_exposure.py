@@ -0,0 +1,132 @@
+# spectrometer_app/core/auto_exposure.py
+
+import math
+import time
+import numpy as np
+
+
+EXPOSURE_RANGE_S = (0.01, 30.0)   # допустимая выдержка, с (как у поля выдержки)
+
+
+def measure_band(band, full_scale=255):
+    """
+    Уровень самой яркой линии и число насыщенных пикселей в полосе ROI.
+    Возвращает (пик в долях полной шкалы, число пикселей >= full_scale).
+    """
+    peak = float(band.max())
+    clipped = int(np.count_nonzero(band >= full_scale))
+    return peak / full_scale, clipped
+
+
+class SpectralAutoExposure:
+    """
+    Поиск наибольшей выдержки, при которой самая яркая линия спектра
+    остается ниже target доли полной шкалы (без насыщения).
+
+    Поиск ограниченный: пока кадр не насыщен, выдержка умножается на
+    (target / пик) в степени 1/наклон, где наклон log(пик)/log(выдержки)
+    оценивается по последним кадрам (не более чем в max_step раз); насыщенный кадр становится
+    верхней границей, и дальше выдержка ищется делением интервала
+    [нижняя, верхняя] пополам в логарифмическом масштабе. Каждая итерация -
+    один кадр с новой выдержкой, поэтому поиск завершается не более чем
+    за max_iterations кадров с учтенной выдержкой.
+
+    Связь пика и выдержки после ISP (гамма) нелинейна, поэтому прогноз
+    только задает шаг, а интервал гарантирует сходимость.
+    """
+
+    def __init__(self, target_fraction=0.85, tolerance=0.1, max_clipped=0,
+                 exposure_range=EXPOSURE_RANGE_S, max_iterations=8, max_step=16.0):
+        self.target_fraction = float(target_fraction)
+        self.tolerance       = float(tolerance)   # допустимо пик в [target*(1-tolerance), target]
+        self.max_clipped     = int(max_clipped)   # допустимое число насыщенных пикселей
+        self.min_exposure, self.max_exposure = exposure_range
+        self.max_iterations  = int(max_iterations)
+        self.max_step        = float(max_step)
+
+        self.lower      = None   # наибольшая выдержка без насыщения (пик ниже цели)
+        self.upper      = None   # наименьшая выдержка с насыщением или выше цели
+        self.best_peak  = None   # пик при выдержке lower
+        self.iterations = 0
+        self.history    = []     # (выдержка, пик, насыщено)
+        self.started    = None
+
+    def start(self, exposure):
+        """Начало поиска с текущей выдержки (с), возвращает выдержку первого кадра"""
+        self.started = time.monotonic()
+        return self._clamp(exposure)
+
+    def _clamp(self, exposure):
+        return min(self.max_exposure, max(self.min_exposure, exposure))
+
+    def update(self, exposure, peak, clipped):
+        """
+        Результат кадра с выдержкой exposure (с): пик в долях шкалы и число
+        насыщенных пикселей. Возвращает следующую выдержку или None, если поиск
+        закончен (итог - result()).
+        """
+        self.iterations += 1
+        self.history.append((exposure, peak, clipped))
+
+        over = clipped > self.max_clipped or peak > self.target_fraction
+        if over:
+            if self.upper is None or exposure < self.upper:
+                self.upper = exposure
+        else:
+            if self.lower is None or exposure > self.lower:
+                self.lower, self.best_peak = exposure, peak
+
+            # Пик в допустимом диапазоне или выдержка уже максимальная
+            if peak >= self.target_fraction * (1.0 - self.tolerance) or exposure >= self.max_exposure:
+                return None
+
+        if self.iterations >= self.max_iterations:
+            return None
+        if over and exposure <= self.min_exposure:
+            return None   # насыщение даже при минимальной выдержке
+
+        next_exposure = self._next_exposure(exposure, peak, over)
+        if self.lower is not None and self.upper is not None and self.upper / self.lower < 1.02:
+            return None   # интервал сошелся
+        return next_exposure
+
+    def _response_slope(self):
+        """
+        Наклон log(пик) от log(выдержки) по двум последним ненасыщенным кадрам
+        (1 для линейного сигнала, ~0.45 после гаммы ISP); 1, если данных мало.
+        """
+        samples = [(e, p) for e, p, c in self.history if 0 < p < 1.0 and c <= self.max_clipped]
+        if len(samples) >= 2:
+            (e1, p1), (e2, p2) = samples[-2], samples[-1]
+            if e1 != e2 and p1 != p2:
+                slope = math.log(p2 / p1) / math.log(e2 / e1)
+                return min(2.0, max(0.2, slope))
+        return 1.0
+
+    def _next_exposure(self, exposure, peak, over):
+        if 0 < peak < 1.0:
+            # Прогноз к середине допустимого диапазона по измеренному наклону (шаг ограничен max_step)
+            aim  = self.target_fraction * (1.0 - self.tolerance / 2)
+            step = (aim / peak) ** (1.0 / self._response_slope())
+            predicted = exposure * min(self.max_step, max(1.0 / self.max_step, step))
+        else:
+            # Насыщенный кадр не говорит, насколько превышен уровень; темный - насколько мало света
+            predicted = exposure / 4.0 if over else exposure * self.max_step
+
+        # При известных обеих границах прогноз вне интервала заменяется серединой (лог)
+        if self.lower is not None and self.upper is not None and \
+           not self.lower < predicted < self.upper:
+            predicted = math.sqrt(self.lower * self.upper)
+        return self._clamp(predicted)
+
+    def result(self):
+        """Итог поиска: выдержка, пик, число итераций и затраченное время"""
+        exposure = self.lower if self.lower is not None else self.min_exposure
+        return {
+            'exposure':   exposure,
+            'peak':       self.best_peak,
+            'iterations': self.iterations,
+            'elapsed':    time.monotonic() - self.started if self.started else 0.0,
+            'saturated':  self.lower is None,   # даже минимальная выдержка насыщает
+            'history':    list(self.history)
+        }
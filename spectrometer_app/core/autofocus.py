@@ -0,0 +1,166 @@
+# spectrometer_app/core/autofocus.py
+
+import math
+import time
+import numpy as np
+
+
+FOCUS_RANGE_MM = (10, 10000)   # допустимый фокус, мм (как у поля фокуса)
+GOLDEN_RATIO   = (math.sqrt(5) - 1) / 2
+
+
+def focus_to_lens_position(distance_mm):
+    """Фокус в мм -> LensPosition (диоптрии)"""
+    return 1.0 / (distance_mm / 1000.0)
+
+
+def lens_position_to_focus(lens_position):
+    """LensPosition (диоптрии) -> фокус в мм в пределах FOCUS_RANGE_MM"""
+    distance_mm = 1000.0 / max(lens_position, 1e-6)
+    return int(round(min(FOCUS_RANGE_MM[1], max(FOCUS_RANGE_MM[0], distance_mm))))
+
+
+def sharpness_score(band, downsample=1):
+    """
+    Резкость спектральных линий в полосе ROI: энергия градиента вдоль оси
+    дисперсии (столбцы), нормированная на квадрат средней яркости - так
+    оценка не зависит от выдержки.
+    downsample > 1 - полоса предварительно бинируется (строки и столбцы),
+    для грубого прохода; оценки с разным downsample не сравниваются.
+    """
+    band = np.asarray(band)
+    profile = band.sum(axis=2, dtype=np.float32) if band.ndim == 3 else band.astype(np.float32)
+
+    if downsample > 1:
+        rows = profile.shape[0] // downsample * downsample or profile.shape[0]
+        cols = profile.shape[1] // downsample * downsample
+        profile = profile[:rows, :cols]
+        if rows >= downsample:
+            profile = profile.reshape(rows // downsample, downsample, -1).mean(axis=1)
+        profile = profile.reshape(profile.shape[0], -1, downsample).mean(axis=2)
+
+    gradient = np.diff(profile, axis=1)
+    mean_level = float(profile.mean())
+    if mean_level <= 0:
+        return 0.0
+    return float(np.mean(gradient * gradient)) / (mean_level * mean_level)
+
+
+class FocusSweep:
+    """
+    Поиск LensPosition с наибольшей резкостью линий спектра.
+
+    1. Грубый проход: coarse_steps равномерных позиций по всему диапазону,
+       резкость по бинированной полосе (downsample).
+    2. Точный проход: золотое сечение в интервале между соседями лучшей
+       грубой позиции, резкость по полной полосе.
+    3. Итог - вершина параболы по трем лучшим точкам точного прохода
+       (без дополнительного кадра).
+
+    Число кадров ограничено: coarse_steps + fine_steps.
+    Каждая итерация - один кадр после перемещения линзы.
+    """
+
+    def __init__(self, lens_range, coarse_steps=7, fine_steps=6, downsample=4):
+        self.lens_min, self.lens_max = sorted(lens_range)
+        self.coarse_steps = max(3, int(coarse_steps))
+        self.fine_steps   = max(1, int(fine_steps))
+        self.coarse_downsample = max(1, int(downsample))
+
+        self.coarse_positions = list(np.linspace(self.lens_min, self.lens_max, self.coarse_steps))
+        self.coarse_scores    = []
+        self.fine_samples     = {}   # позиция -> резкость (точный проход)
+        self.interval = None         # [a, b] золотого сечения
+        self.probes   = None         # внутренние точки (c, d)
+        self.iterations = 0
+        self.history    = []         # (позиция, резкость, проход)
+        self.started    = None
+        self.best_position = None
+
+    @property
+    def coarse(self):
+        return len(self.coarse_scores) < self.coarse_steps
+
+    @property
+    def downsample(self):
+        """Коэффициент бинирования для очередного кадра"""
+        return self.coarse_downsample if self.coarse else 1
+
+    def start(self):
+        """Начало поиска, возвращает LensPosition первого кадра"""
+        self.started = time.monotonic()
+        return self.coarse_positions[0]
+
+    def update(self, position, score):
+        """
+        Резкость кадра, снятого при position. Возвращает следующую позицию
+        или None, если поиск закончен (итог - result()).
+        """
+        self.iterations += 1
+        self.history.append((position, score, 'coarse' if self.coarse else 'fine'))
+
+        if self.coarse:
+            self.coarse_scores.append(score)
+            if self.coarse:
+                return self.coarse_positions[len(self.coarse_scores)]
+            return self._start_fine()
+
+        self.fine_samples[position] = score
+        return self._next_fine()
+
+    def _start_fine(self):
+        best = int(np.argmax(self.coarse_scores))
+        lower = self.coarse_positions[max(0, best - 1)]
+        upper = self.coarse_positions[min(self.coarse_steps - 1, best + 1)]
+        self.interval = [lower, upper]
+        width = upper - lower
+        self.probes = (upper - GOLDEN_RATIO * width, lower + GOLDEN_RATIO * width)
+        self.best_position = self.coarse_positions[best]
+        return self.probes[0]
+
+    def _next_fine(self):
+        c, d = self.probes
+        if d not in self.fine_samples:
+            return d
+        if len(self.fine_samples) >= self.fine_steps:
+            return self._finish()
+
+        # Сужение интервала: максимум лежит со стороны лучшей точки
+        a, b = self.interval
+        if self.fine_samples[c] >= self.fine_samples[d]:
+            b, d = d, c
+            c = b - GOLDEN_RATIO * (b - a)
+            probe = c
+        else:
+            a, c = c, d
+            d = a + GOLDEN_RATIO * (b - a)
+            probe = d
+        self.interval, self.probes = [a, b], (c, d)
+        return probe
+
+    def _finish(self):
+        """Вершина параболы по лучшей точке и её соседям по позиции"""
+        positions = sorted(self.fine_samples)
+        scores    = [self.fine_samples[p] for p in positions]
+        best = int(np.argmax(scores))
+        self.best_position = positions[best]
+
+        if 0 < best < len(positions) - 1:
+            x = np.array(positions[best - 1:best + 2])
+            y = np.array(scores[best - 1:best + 2])
+            a, b, _ = np.polyfit(x, y, 2)
+            if a < 0:
+                vertex = -b / (2 * a)
+                if x[0] < vertex < x[2]:
+                    self.best_position = float(vertex)
+        return None
+
+    def result(self):
+        """Итог поиска: позиция линзы, фокус в мм, число кадров и время"""
+        return {
+            'lens_position': self.best_position,
+            'focus':         lens_position_to_focus(self.best_position),
+            'iterations':    self.iterations,
+            'elapsed':       time.monotonic() - self.started if self.started else 0.0,
+            'history':       list(self.history)
+        }
@@ -0,0 +1,153 @@
+# spectrometer_app/core/calibration.py
+
+import json
+import numpy as np
+
+
+class WavelengthCalibration:
+    """
+    Калибровка пиксель -> длина волны (нм) по опорным линиям.
+
+    Полином степени degree подбирается по парам (пиксель, нм) методом
+    наименьших квадратов. Для заданной ширины спектра один раз строится
+    таблица: длина волны каждого пикселя, равномерная сетка в нм и индексы
+    с весами линейной интерполяции. После этого перевод живого спектра
+    на сетку нм - одна векторная выборка (np.take) и взвешенная сумма,
+    полином на каждом кадре не вычисляется.
+    """
+
+    def __init__(self, pixels, wavelengths, degree=2, step_nm=None):
+        pixels      = np.asarray(pixels, dtype=np.float64)
+        wavelengths = np.asarray(wavelengths, dtype=np.float64)
+
+        if pixels.shape != wavelengths.shape or pixels.ndim != 1:
+            raise ValueError("Pixels and wavelengths must be 1D arrays of the same length")
+        if len(pixels) < degree + 1:
+            raise ValueError(f"Need at least {degree + 1} reference lines for degree {degree}")
+
+        self.pixels       = pixels
+        self.wavelengths  = wavelengths
+        self.degree       = int(degree)
+        self.step_nm      = float(step_nm) if step_nm else None   # шаг сетки, None - по дисперсии
+        self.coefficients = np.polyfit(pixels, wavelengths, self.degree)
+
+        # Таблица пересчета, строится prepare() под ширину спектра
+        self.width             = None
+        self.pixel_wavelengths = None   # длина волны каждого пикселя
+        self.wavelength_grid   = None   # равномерная сетка, нм
+        self._gather_index     = None   # (N, 2) соседние пиксели для каждой точки сетки
+        self._gather_weights   = None   # (N, 2) веса линейной интерполяции
+
+    # --- Сериализация (QSettings хранит калибровку строкой JSON) ---
+    def to_dict(self):
+        return {'pixels':       self.pixels.tolist(),
+                'wavelengths':  self.wavelengths.tolist(),
+                'degree':       self.degree,
+                'step_nm':      self.step_nm,
+                'coefficients': self.coefficients.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['pixels'], data['wavelengths'],
+                   degree=data.get('degree', 2), step_nm=data.get('step_nm'))
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, text):
+        """Калибровка из строки настроек, None если строка пустая или повреждена"""
+        if not text:
+            return None
+        try:
+            return cls.from_dict(json.loads(text))
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Invalid wavelength calibration in settings: {e}")
+            return None
+
+    # --- Пересчет ---
+    def pixel_to_nm(self, pixels):
+        return np.polyval(self.coefficients, pixels)
+
+    def residuals(self):
+        """Отклонения опорных линий от полинома, нм"""
+        return self.pixel_to_nm(self.pixels) - self.wavelengths
+
+    def rms_error(self):
+        return float(np.sqrt(np.mean(self.residuals() ** 2)))
+
+    def prepare(self, width):
+        """Построение таблицы пересчета для спектра шириной width пикселей (один раз)"""
+        if self.width == width:
+            return
+
+        pixel_wavelengths = self.pixel_to_nm(np.arange(width, dtype=np.float64))
+        steps = np.diff(pixel_wavelengths)
+        if not (np.all(steps > 0) or np.all(steps < 0)):
+            raise ValueError("Calibration polynomial is not monotonic over the frame width")
+
+        # Пиксели в порядке возрастания длины волны (спектр может идти справа налево)
+        order = np.arange(width) if steps[0] > 0 else np.arange(width)[::-1]
+        sorted_nm = pixel_wavelengths[order]
+
+        step = self.step_nm or (sorted_nm[-1] - sorted_nm[0]) / (width - 1)
+        grid = np.arange(sorted_nm[0], sorted_nm[-1] + step * 0.5, step)
+        grid = grid[grid <= sorted_nm[-1]]
+
+        # Для каждой точки сетки - левый соседний пиксель и доля расстояния до правого
+        left = np.clip(np.searchsorted(sorted_nm, grid, side='right') - 1, 0, width - 2)
+        fraction = (grid - sorted_nm[left]) / (sorted_nm[left + 1] - sorted_nm[left])
+
+        self._gather_index   = np.stack([order[left], order[left + 1]], axis=1)
+        self._gather_weights = np.stack([1.0 - fraction, fraction], axis=1).astype(np.float32)
+        self.pixel_wavelengths = pixel_wavelengths
+        self.wavelength_grid   = grid
+        self.width             = width
+
+    def wavelength_range(self):
+        if self.wavelength_grid is None:
+            return None
+        return float(self.wavelength_grid[0]), float(self.wavelength_grid[-1])
+
+    def resample(self, spectrum):
+        """Спектр по пикселям -> спектр на равномерной сетке нм (float32)"""
+        if self.width != len(spectrum):
+            self.prepare(len(spectrum))
+        gathered = np.take(spectrum, self._gather_index)
+        return np.einsum('ij,ij->i', gathered, self._gather_weights)
+
+
+def detect_lines(spectrum, count=8, min_distance=5, min_prominence=0.05):
+    """
+    Поиск ярких линий в спектре для калибровки.
+    Локальные максимумы находятся векторно, затем отбираются count самых ярких
+    (не ближе min_distance пикселей друг к другу), положение уточняется
+    параболой по трем точкам вокруг максимума. Возвращает отсортированные
+    субпиксельные положения линий.
+    """
+    spectrum = np.asarray(spectrum, dtype=np.float64)
+    if len(spectrum) < 3:
+        return np.empty(0)
+
+    baseline = np.median(spectrum)
+    threshold = baseline + min_prominence * (spectrum.max() - baseline)
+
+    center = spectrum[1:-1]
+    peaks = np.flatnonzero((center > spectrum[:-2]) & (center >= spectrum[2:]) & (center > threshold)) + 1
+
+    # Самые яркие пики, с подавлением близких соседей
+    selected = []
+    for peak in peaks[np.argsort(spectrum[peaks])[::-1]]:
+        if all(abs(peak - other) >= min_distance for other in selected):
+            selected.append(peak)
+            if len(selected) == count:
+                break
+    selected = np.sort(np.array(selected, dtype=np.intp))
+    if len(selected) == 0:
+        return np.empty(0)
+
+    # Вершина параболы через три точки вокруг максимума
+    left, center, right = spectrum[selected - 1], spectrum[selected], spectrum[selected + 1]
+    curvature = left - 2 * center + right
+    offsets = np.divide(0.5 * (left - right), curvature, out=np.zeros_like(curvature), where=curvature < 0)
+    return selected + np.clip(offsets, -0.5, 0.5)
@@ -0,0 +1,287 @@
+# spectrometer_app/core/calibration_frames.py
+
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+
+FRAME_KINDS = ('dark', 'flat')
+
+# Настройки ISP, от которых зависит изображение (входят в ключ мастер-кадра)
+IMAGE_SETTINGS_KEYS = ('brightness', 'contrast', 'saturation', 'sharpness', 'awb_mode')
+
+
+def calibration_frame_key(kind, metadata, stream_config, image_settings):
+    """
+    Ключ мастер-кадра: режим потока (размер, формат) и настройки изображения.
+    Темновой кадр зависит ещё от выдержки и усиления, плоский - нет
+    (он нормируется и описывает только неравномерность чувствительности).
+    """
+    key = {
+        'kind':   kind,
+        'size':   list(stream_config['size']),
+        'format': stream_config.get('format'),
+    }
+    for name in IMAGE_SETTINGS_KEYS:
+        value = image_settings.get(name)
+        key[name] = round(value, 3) if isinstance(value, float) else value
+
+    if kind == 'dark':
+        exposure = int(metadata.get('ExposureTime', 0))
+        key['exposure_us'] = int(float(f"{exposure:.3g}"))   # 3 значащие цифры
+        key['analogue_gain'] = round(float(metadata.get('AnalogueGain', 1.0)), 1)
+    return key
+
+
+def key_id(key):
+    """Короткий идентификатор ключа для имени файла"""
+    text = json.dumps(key, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+class MasterFrameBuilder:
+    """
+    Потоковое построение мастер-кадра: среднее по count кадрам без хранения
+    стопки кадров - в памяти только один накопитель float32 размером с кадр.
+    Сумма целых значений до 16 бит в float32 точна до 256 кадров и более
+    (для 8-бит - до 65 тысяч кадров).
+    """
+
+    def __init__(self, kind, count, key):
+        if kind not in FRAME_KINDS:
+            raise ValueError(f"Unknown calibration frame kind: {kind}")
+        self.kind   = kind
+        self.count  = max(1, int(count))
+        self.key    = key
+        self.added  = 0
+        self._sum   = None
+
+    def add(self, frame):
+        """Добавляет кадр, возвращает True, когда набрано count кадров"""
+        if self._sum is None:
+            self._sum = np.zeros(frame.shape, dtype=np.float32)
+        elif self._sum.shape != frame.shape:
+            raise ValueError("Calibration frame size changed during recording")
+
+        np.add(self._sum, frame, out=self._sum)
+        self.added += 1
+        return self.added >= self.count
+
+    @property
+    def done(self):
+        return self.added >= self.count
+
+    def result(self):
+        """Мастер-кадр (среднее), накопитель переиспользуется под результат"""
+        self._sum *= 1.0 / self.added
+        return self._sum
+
+
+class FrameCorrector:
+    """
+    Коррекция кадра: (кадр - темновой) * усиление плоского поля.
+    Усиление mean(flat - dark) / (flat - dark) считается один раз при создании,
+    поэтому на кадр приходится одно вычитание и одно умножение.
+    Для потоков другого размера мастер-кадры пересчитываются выборкой
+    ближайшего пикселя: для кадров не больше мастер-кадра (lores) - один раз
+    с кэшем, для больших (снимок) - по полосам при коррекции, чтобы не держать
+    в памяти мастер-кадры float32 в полном разрешении снимка.
+    """
+
+    MIN_FLAT_FRACTION = 0.05   # пиксели плоского кадра темнее 5% среднего не усиливаются
+
+    def __init__(self, dark=None, flat=None, dark_id=None, flat_id=None):
+        self.dark    = None if dark is None else np.asarray(dark, dtype=np.float32)
+        self.gain    = None
+        self.dark_id = dark_id
+        self.flat_id = flat_id
+
+        if flat is not None:
+            response = np.asarray(flat, dtype=np.float32)
+            if self.dark is not None and self.dark.shape == response.shape:
+                response = response - self.dark
+            mean_level = float(response.mean())
+            floor = max(mean_level * self.MIN_FLAT_FRACTION, 1e-6)
+            self.gain = (mean_level / np.maximum(response, floor)).astype(np.float32)
+
+        self._resized = {}   # (h, w, reverse_channels) -> FrameCorrector
+        self._source  = None # исходный корректор, если выборка выполняется по полосам
+        self._row_map = None # строка исходного мастер-кадра для каждой строки кадра
+        self._col_map = None # столбец исходного мастер-кадра для каждого столбца кадра
+        self._reverse = False
+        self._size    = None # (h, w) кадра для выборки по полосам
+        self._work    = None # буфер float32 для коррекции на месте
+        self._lock    = threading.Lock()
+
+    @property
+    def shape(self):
+        if self._source is not None:
+            return self._size + self._source.shape[2:]
+        reference = self.dark if self.dark is not None else self.gain
+        return None if reference is None else reference.shape
+
+    def is_empty(self):
+        if self._source is not None:
+            return self._source.is_empty()
+        return self.dark is None and self.gain is None
+
+    def describe(self):
+        """Идентификаторы примененных мастер-кадров (для метаданных снимка)"""
+        return {'dark': self.dark_id, 'flat': self.flat_id}
+
+    def resized(self, height, width, reverse_channels=False):
+        """
+        Корректор для кадра другого размера (по ближайшему пикселю, с кэшем).
+        reverse_channels - обратный порядок каналов (RGB888 снимка против BGR888 видео).
+        Для кадра больше мастер-кадра кэшируются только таблицы выборки,
+        мастер-кадры пересчитываются по полосам в correct().
+        """
+        shape = self.shape
+        if shape is None or (shape[:2] == (height, width) and not reverse_channels):
+            return self
+
+        with self._lock:
+            corrector = self._resized.get((height, width, reverse_channels))
+            if corrector is None:
+                corrector = FrameCorrector(dark_id=self.dark_id, flat_id=self.flat_id)
+                corrector._source  = self
+                corrector._row_map = np.arange(height) * shape[0] // height
+                corrector._col_map = np.arange(width) * shape[1] // width
+                corrector._reverse = reverse_channels
+                corrector._size    = (height, width)
+                if height * width <= shape[0] * shape[1]:
+                    # Кадр не больше мастер-кадра - пересчет один раз
+                    corrector.dark, corrector.gain = (None if master is None else np.ascontiguousarray(master)
+                                                      for master in corrector._band_masters(slice(0, height)))
+                    corrector._source = None
+                self._resized[(height, width, reverse_channels)] = corrector
+        return corrector
+
+    def _band_masters(self, rows):
+        """Темновой кадр и усиление для полосы строк rows (выборка из исходных мастер-кадров)"""
+        if self._source is None:
+            return (None if self.dark is None else self.dark[rows],
+                    None if self.gain is None else self.gain[rows])
+
+        source_rows = self._row_map[rows]
+
+        def remap(master):
+            if master is None:
+                return None
+            band = np.take(np.take(master, source_rows, axis=0), self._col_map, axis=1)
+            if self._reverse and band.ndim == 3:
+                band = band[..., ::-1]
+            return band
+
+        return remap(self._source.dark), remap(self._source.gain)
+
+    def correct(self, frame, row_start=0, out=None):
+        """
+        Скорректированный кадр (или полоса строк начиная с row_start) в float32.
+        Отрицательные значения после вычитания темнового кадра обрезаются до 0.
+        """
+        dark, gain = self._band_masters(slice(row_start, row_start + frame.shape[0]))
+        if out is None:
+            out = np.empty(frame.shape, dtype=np.float32)
+
+        if dark is not None:
+            np.subtract(frame, dark, out=out, dtype=np.float32)
+            np.maximum(out, 0, out=out)
+        else:
+            out[...] = frame
+        if gain is not None:
+            np.multiply(out, gain, out=out)
+        return out
+
+    def correct_into(self, array, chunk_rows=None):
+        """
+        Коррекция 8-битного кадра на месте.
+        Без chunk_rows используется буфер корректора (только из потока камеры,
+        кадр превью); с chunk_rows кадр обрабатывается полосами через локальный
+        буфер - так большие снимки не требуют копии float32 во весь кадр.
+        """
+        height = array.shape[0]
+        if chunk_rows is None:
+            if self._work is None or self._work.shape != array.shape:
+                self._work = np.empty(array.shape, dtype=np.float32)
+            work, chunk_rows = self._work, height
+        else:
+            work = np.empty((min(chunk_rows, height),) + array.shape[1:], dtype=np.float32)
+
+        for start in range(0, height, chunk_rows):
+            band = array[start:start + chunk_rows]
+            out = work[:band.shape[0]]
+            self.correct(band, row_start=start, out=out)
+            np.clip(out, 0, 255, out=out)
+            np.copyto(band, out, casting='unsafe')
+        return array
+
+
+class CalibrationFrameStore:
+    """
+    Кэш мастер-кадров на диске (.npy + .json с ключом) и в памяти.
+    Повторный запрос того же ключа не читает диск; отсутствие мастер-кадра
+    тоже запоминается, пока не будет сохранен новый.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._masters    = {}   # id ключа -> массив или None
+        self._correctors = {}   # (id темнового, id плоского) -> FrameCorrector
+        self._lock = threading.Lock()
+
+    def _paths(self, identifier):
+        base = os.path.join(self.directory, identifier)
+        return f"{base}.npy", f"{base}.json"
+
+    def save(self, key, master):
+        identifier = f"{key['kind']}_{key_id(key)}"
+        os.makedirs(self.directory, exist_ok=True)
+        array_path, key_path = self._paths(identifier)
+        np.save(array_path, master.astype(np.float32, copy=False))
+        with open(key_path, 'w', encoding='utf-8') as f:
+            json.dump(key, f, ensure_ascii=False, indent=2)
+
+        with self._lock:
+            self._masters[identifier] = master
+            self._correctors.clear()   # корректоры с этим мастер-кадром устарели
+        print(f"Master {key['kind']} frame saved: {array_path}")
+        return array_path
+
+    def load(self, key):
+        """Мастер-кадр по ключу или None (с кэшем в памяти)"""
+        identifier = f"{key['kind']}_{key_id(key)}"
+        with self._lock:
+            if identifier in self._masters:
+                return identifier, self._masters[identifier]
+
+        array_path, _ = self._paths(identifier)
+        master = None
+        if os.path.exists(array_path):
+            try:
+                master = np.load(array_path)
+                print(f"Master {key['kind']} frame loaded: {array_path}")
+            except (OSError, ValueError) as e:
+                print(f"Error loading master frame {array_path}: {e}")
+
+        with self._lock:
+            self._masters[identifier] = master
+        return identifier, master
+
+    def corrector(self, dark_key, flat_key):
+        """Корректор для пары ключей, None если нет ни одного мастер-кадра"""
+        dark_id, dark = self.load(dark_key)
+        flat_id, flat = self.load(flat_key)
+        if dark is None and flat is None:
+            return None
+
+        cache_key = (dark_id if dark is not None else None, flat_id if flat is not None else None)
+        with self._lock:
+            corrector = self._correctors.get(cache_key)
+        if corrector is None:
+            corrector = FrameCorrector(dark, flat, *cache_key)
+            with self._lock:
+                self._correctors[cache_key] = corrector
+        return corrector
@@ -2,13 +2,17 @@
 
 import os
 import time
+import queue
+import traceback
+from concurrent.futures import Future
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QImage
-from picamera2 import Picamera2
-import numpy as np
+from picamera2 import Picamera2, MappedArray
+from libcamera import controls
 
 try:
-    from spectrometer_app.utils.config import DEFAULT_SETTINGS
+    from spectrometer_app.utils.config import (DEFAULT_SETTINGS, MAIN_STREAM_SIZE, ANALYSIS_SOURCES,
+                                              CALIBRATION_FRAMES_DIR, SENSOR_MODES_CACHE, FRAME_MARGIN_US)
     from utils.camera_settings_utils import (
         restore_camera_settings_from_qsettings,
         apply_full_ui_settings_to_camera,
@@ -17,10 +21,27 @@ try:
         save_camera_metadata,
         restore_last_camera_settings
     )
+    from core.snapshot_capture import select_still_resolution, create_snapshot_configuration
+    from core.snapshot_io import extract_snapshot_job, write_snapshot_job, write_stack_job
+    from core.stacking import FrameStacker
+    from core.hdr import HdrMerger, exposure_series
+    from core.auto_exposure import SpectralAutoExposure, measure_band
+    from core.raw_bayer import RawBayerConverter
+    from core.sensor_strip import plan_strip_mode, field_crop, FrameRateMeter
+    from core.sensor_modes import SensorModeStore, find_sensor_mode
+    from core.autofocus import FocusSweep, sharpness_score, focus_to_lens_position, FOCUS_RANGE_MM
+    from core.frame_mailbox import FrameMailbox
+    from utils.control_settle import ControlSettleWatcher
+    from core.frame_pool import FramePool, copy_into_frame, stream_view
+    from core.spectrum import SpectrumExtractor
+    from core.calibration import WavelengthCalibration
+    from core.calibration_frames import (CalibrationFrameStore, MasterFrameBuilder,
+                                         calibration_frame_key, IMAGE_SETTINGS_KEYS)
 
 # Резервный вариант для непосредственного запуска скрипта
 except ImportError: 
-    from spectrometer_app.utils.config import DEFAULT_SETTINGS
+    from spectrometer_app.utils.config import (DEFAULT_SETTINGS, MAIN_STREAM_SIZE, ANALYSIS_SOURCES,
+                                              CALIBRATION_FRAMES_DIR, SENSOR_MODES_CACHE, FRAME_MARGIN_US)
     from spectrometer_app.utils.camera_settings_utils import (
         restore_camera_settings_from_qsettings,
         apply_full_ui_settings_to_camera,
@@ -29,18 +50,56 @@ except ImportError:
         save_camera_metadata,
         restore_last_camera_settings
     )
+    from spectrometer_app.core.snapshot_capture import select_still_resolution, create_snapshot_configuration
+    from spectrometer_app.core.snapshot_io import extract_snapshot_job, write_snapshot_job, write_stack_job
+    from spectrometer_app.core.stacking import FrameStacker
+    from spectrometer_app.core.hdr import HdrMerger, exposure_series
+    from spectrometer_app.core.auto_exposure import SpectralAutoExposure, measure_band
+    from spectrometer_app.core.raw_bayer import RawBayerConverter
+    from spectrometer_app.core.sensor_strip import plan_strip_mode, field_crop, FrameRateMeter
+    from spectrometer_app.core.sensor_modes import SensorModeStore, find_sensor_mode
+    from spectrometer_app.core.autofocus import (FocusSweep, sharpness_score,
+                                                 focus_to_lens_position, FOCUS_RANGE_MM)
+    from spectrometer_app.core.frame_mailbox import FrameMailbox
+    from spectrometer_app.utils.control_settle import ControlSettleWatcher
+    from spectrometer_app.core.frame_pool import FramePool, copy_into_frame, stream_view
+    from spectrometer_app.core.spectrum import SpectrumExtractor
+    from spectrometer_app.core.calibration import WavelengthCalibration
+    from spectrometer_app.core.calibration_frames import (CalibrationFrameStore, MasterFrameBuilder,
+                                                          calibration_frame_key, IMAGE_SETTINGS_KEYS)
+
+
+AE_MAX_SETTLE_FRAMES   = 6      # кадров ожидания новой выдержки в метаданных (автоэкспозиция)
+AF_MAX_SETTLE_FRAMES   = 4      # кадров ожидания перемещения линзы (автофокус)
 
 
 class CameraThread(QThread):
 
     # Сигналы для передачи изменений в основной поток
-    change_pixmap    = pyqtSignal(QImage) # для обновления изображения
+    change_pixmap    = pyqtSignal()       # в почтовом ящике появился новый кадр
     camera_error     = pyqtSignal()       # для уведомления об ошибке камеры
     settings_updated = pyqtSignal(dict)   # для уведомления об обновлении настроек
+    snapshot_captured = pyqtSignal(dict)  # кадр снимка захвачен (время цикла)
+    snapshot_failed   = pyqtSignal(str)   # ошибка при создании снимка
+    snapshot_exposure_started = pyqtSignal(dict)  # режим фото включен, идет экспозиция (выдержка, тайм-аут)
+    snapshot_cancelled        = pyqtSignal()      # снимок отменен, видео возобновлено
+    spectrum_ready    = pyqtSignal(object)  # одномерный спектр кадра (np.ndarray float32),
+                                            # при наличии калибровки - на сетке нм
+    calibration_frames_progress = pyqtSignal(str, int, int)  # вид, записано кадров, всего
+    calibration_frames_ready    = pyqtSignal(dict)           # мастер-кадр построен и сохранен
+    stack_progress = pyqtSignal(int, int)   # накоплено кадров, всего
+    stack_finished = pyqtSignal(dict)       # результат накопления (спектр, время, частота кадров)
+    hdr_progress   = pyqtSignal(int, int)   # снято кадров HDR-серии, всего
+    hdr_finished   = pyqtSignal(dict)       # результат HDR-серии (спектр, выдержки, доля насыщенных)
+    auto_exposure_finished = pyqtSignal(dict)  # итог автоэкспозиции по спектру
+    autofocus_finished     = pyqtSignal(dict)  # итог автофокуса по резкости линий
+    frame_rate_measured    = pyqtSignal(dict)  # фактическая частота кадров режима (полный кадр/полоса)
 
-    def __init__(self, settings_manager):
+    def __init__(self, settings_manager, camera_factory=None, snapshot_writer=None):
         super().__init__()
         self.camera           = None             # переменная потока камеры
+        self.camera_factory   = camera_factory or Picamera2  # конструктор камеры
+        self.snapshot_writer  = snapshot_writer  # фоновая очередь записи снимков
         self.running          = True             # флаг работы потока (работает/нет)
         self.settings_manager = settings_manager # настройки
         self.no_camera_image  = self._load_no_camera_image()  
@@ -57,6 +116,97 @@ class CameraThread(QThread):
         # Переменная для сохранения настроек при смене режима камеры
         self.last_metadata_settings = {} 
 
+        # Ограничение частоты кадров превью (0 - без ограничения)
+        self.target_fps           = self.settings_manager.value('target_fps', DEFAULT_SETTINGS['target_fps'], type=int)
+        self.last_frame_timestamp = None   # SensorTimestamp последнего обработанного кадра, нс
+        self.source_dropped       = 0      # кадров, пропущенных из-за target_fps
+
+        # Извлечение спектра из полосы строк (ROI) каждого кадра; ROI задается
+        # в долях кадра обычного видеорежима (в режиме полосы пересчитывается)
+        self.spectrum_settings = {
+            'roi_center':         self.settings_manager.value('roi_center', DEFAULT_SETTINGS['roi_center'], type=float),
+            'roi_height':         self.settings_manager.value('roi_height', DEFAULT_SETTINGS['roi_height'], type=float),
+            'spectrum_mode':      self.settings_manager.value('spectrum_mode', DEFAULT_SETTINGS['spectrum_mode']),
+            'spectrum_weighting': self.settings_manager.value('spectrum_weighting',
+                                                              DEFAULT_SETTINGS['spectrum_weighting'])
+        }
+        self.spectrum_extractor = SpectrumExtractor.from_settings(self.spectrum_settings)
+        self.last_spectrum = None   # последний спектр по пикселям (для поиска опорных линий)
+
+        # Режим полосы спектра: ScalerCrop только на полосу ROI и режим сенсора
+        # с наибольшей частотой кадров, покрывающий ее
+        self.strip_mode   = self.settings_manager.value('strip_mode', DEFAULT_SETTINGS['strip_mode'], type=bool)
+        self.strip_plan   = None   # текущая конфигурация полосы (plan_strip_mode) или None
+        self.sensor_modes = None   # режимы сенсора текущей камеры (из кэша SensorModeStore)
+        self.sensor_mode_store = SensorModeStore(os.path.abspath(SENSOR_MODES_CACHE))
+        self.field_crop   = None   # ScalerCrop обычного видеорежима - система координат ROI
+
+        # Фактическая частота кадров, измеряется после каждой перенастройки
+        self.fps_meter   = FrameRateMeter()
+        self.measure_fps = False
+        self.mode_fps    = {}      # 'full' / 'strip' -> кадр/с
+
+        # Источник данных для спектра: поток main после ISP или сырой поток сенсора (линейный)
+        self.analysis_source = self.settings_manager.value('analysis_source', DEFAULT_SETTINGS['analysis_source'])
+        self.raw_converter   = None   # RawBayerConverter для текущей конфигурации (сырой источник)
+
+        # Калибровка пиксель -> нм (None - спектр выводится по пикселям)
+        self.wavelength_calibration = WavelengthCalibration.from_json(
+            self.settings_manager.value('calibration', DEFAULT_SETTINGS['calibration']))
+
+        # Коррекция темновым/плоским кадрами, мастер-кадры кэшируются на диске
+        self.frame_store      = CalibrationFrameStore(os.path.abspath(CALIBRATION_FRAMES_DIR))
+        self.frame_correction = self.settings_manager.value('frame_correction',
+                                                            DEFAULT_SETTINGS['frame_correction'], type=bool)
+        self.image_settings   = {key: self.settings_manager.value(key, DEFAULT_SETTINGS[key],
+                                                                  type=type(DEFAULT_SETTINGS[key]))
+                                 for key in IMAGE_SETTINGS_KEYS}
+        self.master_builder   = None   # запись темновых/плоских кадров (kind, count) или MasterFrameBuilder
+        self.master_watcher   = None   # ожидание ручной выдержки перед записью мастер-кадра
+        self.master_manual    = False  # длительность кадра поднята под выдержку записи
+        self.last_frame_metadata = {}  # метаданные последнего обработанного кадра
+
+        # Режим накопления кадров (None - не активен)
+        self.frame_stacker  = None
+        self.stack_settings = None   # настройки на момент запуска накопления
+        self.stack_started  = None   # время запуска, с
+
+        # HDR-серия выдержек (None - не активна)
+        self.hdr_merger    = None
+        self.hdr_settings  = None   # настройки на момент запуска серии
+        self.hdr_started   = None   # время запуска, с
+        self.hdr_watcher   = None   # ожидание выдержки текущего кадра серии
+        self.hdr_converter = None   # сырой поток для серии (None - кадр main после ISP)
+
+        # Автоэкспозиция по спектру (None - не активна)
+        self.auto_exposure        = None
+        self.ae_exposure          = None   # запрошенная выдержка текущей итерации, с
+        self.ae_settings          = None   # настройки на момент запуска поиска
+        self.ae_settle_frames     = 0      # кадров, прошедших с запроса выдержки
+
+        # Автофокус по резкости линий спектра (None - не активен)
+        self.autofocus            = None
+        self.af_position          = None   # запрошенная LensPosition текущей итерации
+        self.af_settle_frames     = 0      # кадров, прошедших с перемещения линзы
+
+        # Запросы копии кадра (сканирование): [(не раньше SensorTimestamp, нс; Future)]
+        self.frame_requests = []
+
+        # Наблюдатели применения настроек камеры (ControlSettleWatcher), по кадрам
+        self.settle_watchers = []
+        self.last_settle     = None   # итог последнего ожидания применения настроек
+
+        self.video_config     = None            # конфигурация режима видео
+        self.still_resolution = None            # кэш максимального разрешения для снимков
+        self.snapshot         = None            # текущий снимок (режим фото) или None
+        self._snapshot_generation = 0           # номер снимка (для отмены)
+        self._events          = queue.Queue()   # события и команды, выполняемые в потоке камеры
+        self.frame_pool       = None            # переиспользуемые кадры превью
+        self.preview_size     = None            # размер потока lores под виджет видео
+        self._capture_generation = 0            # номер серии запросов кадров (для отмены)
+        # последний кадр для интерфейса, отброшенные кадры возвращаются в пул
+        self.frame_mailbox    = FrameMailbox(on_drop=lambda frame: frame.release())
+
     def _load_no_camera_image(self):        
         """Загрузка изображения-заглушки для случая отсутствия камеры"""
 
@@ -83,25 +233,29 @@ class CameraThread(QThread):
             # Отключение логирования для компонентов QPA
             os.environ["QT_LOGGING_RULES"] = "qt.qpa.*=false"
 
-            self.camera = Picamera2()   # экземпляр камеры
-
-            config = self.camera.create_video_configuration(
-                main   = {"size": (1280, 720), "format": "RGB888"},
-                encode = "main",         # указание основного кодирования
-                queue  = False           # отключение очереди (для оптимизации)
-            )
+            self.camera = self.camera_factory()   # экземпляр камеры
+            self._load_sensor_modes()             # до запуска: опрос требует остановленной камеры
 
-            self.camera.configure(config)   # применение конфигурации к камере
+            config = self._configure_video(self.preview_size)
+            self.video_config = config      # сохраняется для возврата после снимка
+            self._create_frame_pool(config)
 
             # Восстановление базовых настроек камеры из QSettings
-            restore_camera_settings_from_qsettings(self.camera, self.settings_manager)
+            restore_camera_settings_from_qsettings(self.camera, self.settings_manager, self.watch_settle)
 
             self.camera.start()
 
-            # Захват изображения каждые 30 мс (~33 к/c)
+            # Цикл управляется событиями камеры: каждый завершенный запрос
+            # приходит в очередь событий, поэтому частота кадров равна
+            # фактической длительности кадра, а команды обрабатываются
+            # даже во время длинной экспозиции
+            self._arm_capture()
             while self.running:
-                self._capture_frame()
-                QThread.msleep(30)
+                try:
+                    handler, args = self._events.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                handler(*args)
 
         except Exception as e:
             print(f"Failed to initialize camera: {e}")
@@ -110,6 +264,9 @@ class CameraThread(QThread):
 
             # Проверка, инициализирована ли камера
             if hasattr(self, 'camera') and self.camera is not None:
+                self._cancel_capture()  # отмена ожидающего запроса кадра
+                self._cancel_stacking()
+                self._cancel_hdr(restore=False)
                 if self.camera.started:
                     try: 
                         self.camera.stop()
@@ -121,44 +278,1177 @@ class CameraThread(QThread):
                     print(f"Error closing camera in run finally: {e_close}")
 
             self.camera = None  # Обнуление ссылки на камеру
+            print(f"Preview frames: {self.frame_metrics()}")
 
-    def _capture_frame(self):
-        """Захватывает кадр в rgb формате"""
+    def _create_video_configuration(self, preview_size):
+        """
+        Конфигурация видео: main 1280x720 для анализа и снимков,
+        lores - превью размером с виджет (масштабирование на стороне ISP).
+        BGR888 в picamera2 - это байты в порядке R, G, B, т.е. ровно
+        QImage.Format_RGB888: перестановка каналов не нужна.
+        """
+        lores = None
+        if preview_size is not None:
+            lores = {"size": preview_size, "format": "BGR888"}
+
+        # Сырой поток для анализа без ISP - в формате сенсора (упакованный CSI2P)
+        streams = {}
+        if self.analysis_source != 'isp':
+            sensor_format = getattr(self.camera, 'sensor_format', None)
+            streams['raw'] = {"format": sensor_format} if sensor_format else {}
+
+        # Режим полосы: режим сенсора выбирается размером raw, ScalerCrop - на полосу,
+        # main - полоса на всю ширину (превью тоже берется из main)
+        main_size = MAIN_STREAM_SIZE
+        plan = self.strip_plan
+        if plan is not None:
+            main_size = plan['size']
+            lores = None
+            streams['raw'] = {"size": plan['sensor_mode']['size']}
+            streams['controls'] = {'ScalerCrop': plan['crop']}
+
+        return self.camera.create_video_configuration(
+            main   = {"size": main_size, "format": "BGR888"},
+            lores  = lores,
+            encode = "main",         # указание основного кодирования
+            queue  = False,          # отключение очереди (для оптимизации)
+            **streams
+        )
+
+    def _configure_video(self, preview_size):
+        """
+        Применяет конфигурацию видео. Если ISP не поддерживает RGB в lores
+        (например, Pi 4 допускает только YUV420), превью берется из main.
+        """
+        self.strip_plan = self._plan_strip() if self.strip_mode else None
+        self._update_extractor()
+        self.fps_meter.reset()
+        self.measure_fps = True
+
+        if preview_size is not None and self.strip_plan is None:
+            try:
+                config = self._create_video_configuration(preview_size)
+                self.camera.configure(config)
+                self._create_raw_converter(config)
+                return config
+            except Exception as e:
+                print(f"Lores preview stream {preview_size} not available, using main: {e}")
+                self.preview_size = None
 
+        config = self._create_video_configuration(None)
+        self.camera.configure(config)   # применение конфигурации к камере
+        self._create_raw_converter(config)
+        return config
+
+    def _create_raw_converter(self, config):
+        """Преобразователь сырого потока под фактический формат (или None - анализ по main)"""
+        self.raw_converter = None
+        if self.analysis_source == 'isp':
+            return
+        if self.strip_plan is not None:
+            # Сырой кадр ScalerCrop не обрезает - в режиме полосы анализ по main
+            print("Raw analysis is not used in the spectrum strip mode")
+            return
+        raw_config = (getattr(self.camera, 'camera_config', None) or config).get('raw')
+        try:
+            if not raw_config:
+                raise ValueError("raw stream is not configured")
+            output = 'mono' if self.analysis_source == 'raw_mono' else 'rgb'
+            self.raw_converter = RawBayerConverter(raw_config['format'], raw_config['size'], output)
+            print(f"Raw analysis: {raw_config['format']} {raw_config['size']}, {output}")
+        except (KeyError, ValueError) as e:
+            print(f"Raw analysis not available, using processed stream: {e}")
+
+    def _load_sensor_modes(self, refresh=False):
+        """
+        Режимы сенсора из кэша на диске (камера опрашивается только при первом
+        подключении модели или после invalidate/refresh). Общий список для
+        снимков, видео и режима полосы.
+        """
+        try:
+            self.sensor_modes = self.sensor_mode_store.modes(self.camera, refresh=refresh)
+        except Exception as e:
+            print(f"Could not determine sensor modes: {e}")
+            self.sensor_modes = []
+        self.still_resolution = None   # выбирается заново по новому списку
+        return self.sensor_modes
+
+    def refresh_sensor_modes(self, ui_settings):
+        """Повторный опрос режимов сенсора с обновлением кэша (из основного потока)"""
+        self._post(self._refresh_sensor_modes, ui_settings)
+
+    def _refresh_sensor_modes(self, ui_settings):
+        if not self.camera:
+            return
+        try:
+            started = self.camera.started
+            if started:
+                self._cancel_capture()
+                self.camera.stop()
+            self._load_sensor_modes(refresh=True)
+            if started:
+                self._restart_video(ui_settings)
+        except Exception as e:
+            print(f"Error refreshing sensor modes: {e}")
+            self.camera_error.emit()
+            self.running = False
+
+    def _plan_strip(self):
+        """Конфигурация полосы под текущий ROI или None (режим недоступен - обычный кадр)"""
+        try:
+            if self.sensor_modes is None:
+                self._load_sensor_modes()
+            field = self.field_crop or field_crop(
+                (0, 0) + tuple(self.camera.camera_properties['PixelArraySize']), MAIN_STREAM_SIZE)
+            plan = plan_strip_mode(self.sensor_modes, field,
+                                   self.spectrum_settings['roi_center'], self.spectrum_settings['roi_height'],
+                                   MAIN_STREAM_SIZE[0])
+            print(f"Spectrum strip: crop {plan['crop']}, main {plan['size']}, "
+                  f"sensor mode {plan['sensor_mode']['size']} up to {plan['max_fps']:.1f} fps")
+            return plan
+        except (KeyError, ValueError) as e:
+            print(f"Spectrum strip mode not available, using full frame: {e}")
+            return None
+
+    def _update_extractor(self):
+        """Извлекатель спектра для текущего режима (в режиме полосы - ROI внутри полосы)"""
+        settings = dict(self.spectrum_settings)
+        if self.strip_plan is not None:
+            settings.update(roi_center=self.strip_plan['roi_center'], roi_height=self.strip_plan['roi_height'])
+        self.spectrum_extractor = SpectrumExtractor.from_settings(settings)
+
+    def set_strip_mode(self, enabled, ui_settings):
+        """Включает/выключает режим полосы спектра (вызывается из основного потока)"""
+        self._post(self._set_strip_mode, bool(enabled), ui_settings)
+
+    def _set_strip_mode(self, enabled, ui_settings):
+        if enabled == self.strip_mode:
+            return
+        self.strip_mode = enabled
         if not self.camera or not self.camera.started:
             return
-        
         try:
-            # Захват кадра с камеры и сохранение его в массиве.
-            array = self.camera.capture_array("main")
+            self._restart_video(ui_settings)
+        except Exception as e:
+            print(f"Error switching spectrum strip mode: {e}")
+            self.camera_error.emit()
+            self.running = False
+
+    def _update_strip(self, ui_settings):
+        """
+        Пересчет полосы после изменения ROI. Если режим сенсора и размер
+        потока прежние, меняется только ScalerCrop (без остановки камеры).
+        """
+        if not self.strip_mode or not self.camera or not self.camera.started:
+            return
+        previous = self.strip_plan
+        plan = self._plan_strip() if previous is not None else None
+        try:
+            if plan is None or plan['sensor_mode'] != previous['sensor_mode'] or plan['size'] != previous['size']:
+                self._restart_video(ui_settings)
+                return
+            self.camera.set_controls({'ScalerCrop': plan['crop']})
+            self.video_config.setdefault('controls', {})['ScalerCrop'] = plan['crop']
+            self.strip_plan = plan
+            self._update_extractor()
+        except Exception as e:
+            print(f"Error updating spectrum strip: {e}")
+            self.camera_error.emit()
+            self.running = False
 
-            """
-            Если захваченный кадр имеет 3 канала (RGB), то
-            нужно поменять местами каналы B и R для правильного отображения.
-            """
-            if array.shape[2] == 3:
-                array[:, :, [0, 2]] = array[:, :, [2, 0]]   # BGR -> RGB
+    def _measure_frame_rate(self, metadata):
+        """Фактическая частота кадров режима после перенастройки (до ограничения target_fps)"""
+        if self.strip_plan is None and 'ScalerCrop' in metadata:
+            self.field_crop = tuple(metadata['ScalerCrop'])
+        fps = self.fps_meter.update(metadata.get('SensorTimestamp'))
+        if fps is None:
+            return
+        self.measure_fps = False
+
+        plan = self.strip_plan
+        mode = 'full' if plan is None else 'strip'
+        self.mode_fps[mode] = fps
+        report = {'mode':     mode,
+                  'fps':      fps,
+                  'size':     tuple(self.video_config['main']['size']),
+                  'exposure': metadata.get('ExposureTime', 0) / 1e6,
+                  'modes':    dict(self.mode_fps)}
+        sensor_mode = plan['sensor_mode'] if plan is not None else self._video_sensor_mode()
+        if sensor_mode is not None:
+            report.update(sensor_mode=tuple(sensor_mode['size']), max_fps=float(sensor_mode.get('fps', 0.0)))
+        if plan is not None:
+            report['crop'] = tuple(plan['crop'])
+        print(f"Frame rate ({mode}, main {report['size']}): {fps:.1f} fps")
+        self.frame_rate_measured.emit(report)
 
-            # Получение высоты (h), ширины (w) и кол-ва каналов (ch) из массива
-            h, w, ch = array.shape
+    def _video_sensor_mode(self):
+        """Режим сенсора, выбранный libcamera для текущей конфигурации видео (по размеру raw)"""
+        raw_config = (getattr(self.camera, 'camera_config', None) or self.video_config or {}).get('raw')
+        if not raw_config or not self.sensor_modes:
+            return None
+        return find_sensor_mode(self.sensor_modes, raw_config['size'])
 
-            # Создание изображения QImage из массива данных
-            qt_image = QImage(array.data, w, h, ch * w, QImage.Format_RGB888)
+    def _create_frame_pool(self, config):
+        """Пул кадров под размер потока, из которого берется превью"""
+        stream = "lores" if config.get("lores") else "main"
+        self.frame_pool = FramePool(*config[stream]["size"])
+
+    @staticmethod
+    def fit_preview_size(width, height):
+        """
+        Размер превью, вписанный в виджет с сохранением пропорций main.
+        Размеры четные и не больше main (требование ISP к потоку lores).
+        """
+        main_w, main_h = MAIN_STREAM_SIZE
+        scale = min(width / main_w, height / main_h, 1.0)
+        return (max(2, int(main_w * scale) & ~1), max(2, int(main_h * scale) & ~1))
+
+    def set_preview_size(self, width, height, ui_settings):
+        """Перенастраивает поток превью под размер виджета (вызывается из основного потока)"""
+        self._post(self._reconfigure_preview, self.fit_preview_size(width, height), ui_settings)
+
+    def _reconfigure_preview(self, preview_size, ui_settings):
+        if not self.camera or not self.camera.started or preview_size == self.preview_size:
+            return
+
+        try:
+            self.preview_size = preview_size
+            self._restart_video(ui_settings)
+            print(f"Preview stream: {self.preview_size or 'main'}")
+
+        except Exception as e:
+            print(f"Error reconfiguring preview stream: {e}")
+            self.camera_error.emit()
+            self.running = False
+
+    def _restart_video(self, ui_settings):
+        """
+        Перенастройка без переоткрытия камеры: отмена ожидающего кадра,
+        остановка, новая конфигурация видео и запуск.
+        Во время снимка перенастройка откладывается до возврата в видео.
+        """
+        if self.snapshot is not None:
+            self.snapshot['restart'] = ui_settings
+            return
+        if self.hdr_merger is not None:
+            self._cancel_hdr(restore=False)   # настройки применяются после перенастройки
+            self.hdr_finished.emit({'error': "камера перенастроена во время серии"})
+        self._cancel_capture()
+        self.camera.stop()
+        self.settle_watchers = []   # настройки применяются заново после запуска
+        config = self._configure_video(self.preview_size)
+        self.video_config = config
+        self._create_frame_pool(config)
+        self.camera.start()
+        self._arm_capture()
+
+        # Конфигурация сбрасывает настройки, применяем их заново
+        self.apply_full_ui_settings(ui_settings)
+
+    def set_analysis_source(self, source, ui_settings):
+        """Источник кадра для спектра: 'isp', 'raw_rgb' или 'raw_mono' (из основного потока)"""
+        self._post(self._set_analysis_source, source, ui_settings)
+
+    def _set_analysis_source(self, source, ui_settings):
+        if source not in ANALYSIS_SOURCES or source == self.analysis_source:
+            return
+        self.analysis_source = source
+        if not self.camera or not self.camera.started:
+            return
+        try:
+            self._restart_video(ui_settings)
+        except Exception as e:
+            print(f"Error switching analysis source: {e}")
+            self.camera_error.emit()
+            self.running = False
+
+    def _post(self, handler, *args):
+        """Ставит вызов в очередь событий потока камеры (из любого потока)"""
+        self._events.put((handler, args))
+
+    def _arm_capture(self):
+        """Запрашивает следующий завершенный кадр без блокировки потока"""
+        generation = self._capture_generation
+
+        def on_request_completed(job):
+            # Вызывается из потока событий picamera2 - только передача в очередь
+            self._post(self._handle_completed_request, job, generation)
+
+        self.camera.capture_request(wait=False, signal_function=on_request_completed)
+
+    def _cancel_capture(self):
+        """Отменяет ожидающий запрос кадра; его результат будет проигнорирован"""
+        self._capture_generation += 1
+        try:
+            self.camera.cancel_all_and_flush()
+        except Exception as e:
+            print(f"Error cancelling camera requests: {e}")
+
+    def _handle_completed_request(self, job, generation):
+        """Обработка завершенного запроса камеры"""
+
+        # Запрос отменен (перенастройка камеры) или камера остановлена
+        if generation != self._capture_generation or not self.camera or not self.camera.started:
+            return
+
+        try:
+            request = self.camera.wait(job)
+            self._arm_capture()   # следующий кадр запрашивается до обработки текущего
+
+            try:
+                # Ограничение частоты: лишние кадры отбрасываются у источника
+                metadata = request.get_metadata()
+                if self.measure_fps:
+                    self._measure_frame_rate(metadata)
+                if self.settle_watchers:
+                    self._update_settle_watchers(metadata)
+                if self.frame_requests:
+                    self._serve_frame_requests(request, metadata)
+                if self._skip_by_target_fps(metadata):
+                    self.source_dropped += 1
+                    return
+
+                self._process_request(request, metadata)
+            finally:
+                request.release()
 
-            self.change_pixmap.emit(qt_image)   # обновляет изображение в UI
-        
         except Exception as e:
             print(f"Camera capture error: {e}")
             self.camera_error.emit()    # сигнал ошибки каамеры
             self.running = False        # завершение работы
 
+    def watch_settle(self, watcher):
+        """Наблюдение за применением настроек по метаданным кадров (из любого потока)"""
+        self._post(self._add_settle_watcher, watcher)
+
+    def _add_settle_watcher(self, watcher):
+        # Настройки интерфейса действуют в пределах длительности кадра видеорежима
+        # (HDR, автоэкспозиция и запись мастер-кадров поднимают ее сами)
+        watcher.limit_exposure(self._video_frame_duration_limits()[1])
+        self.settle_watchers.append(watcher)
+
+    def _update_settle_watchers(self, metadata):
+        """Передача метаданных кадра наблюдателям; завершенные (применено или тайм-аут) удаляются"""
+        remaining = []
+        for watcher in self.settle_watchers:
+            result = watcher.update(metadata)
+            if result is None:
+                remaining.append(watcher)
+            else:
+                self.last_settle = result
+        self.settle_watchers = remaining
+
+    def _skip_by_target_fps(self, metadata):
+        """True, если кадр пришел раньше интервала, заданного target_fps"""
+        timestamp = metadata.get('SensorTimestamp')
+        if not self.target_fps or timestamp is None:
+            self.last_frame_timestamp = timestamp
+            return False
+
+        # Допуск 5%, чтобы не терять кадры из-за дрожания времени
+        min_interval_ns = 0.95e9 / self.target_fps
+        if self.last_frame_timestamp is not None and \
+           timestamp - self.last_frame_timestamp < min_interval_ns:
+            return True
+
+        self.last_frame_timestamp = timestamp
+        return False
+
+    def set_spectrum_settings(self, settings):
+        """
+        Новые параметры ROI/взвешивания (объект заменяется целиком, поэтому безопасно из любого потока).
+        В режиме полосы изменение ROI пересчитывает полосу в потоке камеры.
+        """
+        previous = self.spectrum_settings
+        self.spectrum_settings = {key: settings.get(key, previous[key]) for key in previous}
+        roi_changed = any(self.spectrum_settings[key] != previous[key] for key in ('roi_center', 'roi_height'))
+        self._update_extractor()
+        if self.strip_mode and roi_changed:
+            self._post(self._update_strip, dict(settings))
+
+    def set_calibration(self, calibration):
+        """Новая калибровка длин волн или None (объект заменяется целиком)"""
+        self.wavelength_calibration = calibration
+
+    def set_target_fps(self, fps):
+        """Устанавливает ограничение частоты кадров превью (0 - без ограничения)"""
+        self.target_fps = max(0, int(fps))
+
+    def _process_request(self, request, metadata):
+        """Анализ кадра из main и передача превью в интерфейс"""
+        self.last_frame_metadata = metadata
+        main_config = request.config["main"]
+
+        # Спектр извлекается прямо из буфера main, без копирования кадра
+        width, height = main_config["size"]
+        with MappedArray(request, "main") as mapped:
+            main_array = stream_view(mapped.array, width, height)
+            if self.master_builder is not None:
+                self._record_calibration_frame(main_array, metadata, main_config)
+            if self.frame_stacker is not None:
+                self._stack_frame(main_array, main_config)
+            if self.hdr_merger is not None:
+                self._hdr_frame(request, main_array, metadata, main_config)
+            if self.auto_exposure is not None:
+                self._auto_exposure_frame(main_array, metadata)
+            if self.autofocus is not None:
+                self._autofocus_frame(main_array, metadata)
+            corrector = self._frame_corrector(metadata, main_config)
+            if self.raw_converter is None:
+                self._analyze_frame(main_array, corrector)
+        if self.raw_converter is not None:
+            self._analyze_raw(request, metadata)
+
+        frame = self._copy_preview(request)
+        if frame is not None:
+            if corrector is not None:
+                corrector.resized(*frame.array.shape[:2]).correct_into(frame.array)
+            self._process_frame(frame)
+
+    def _analyze_frame(self, main_array, corrector=None):
+        """Обработка кадра main (RGB, 1280x720): извлечение спектра"""
+
+        # Коррекция только полосы ROI - остальной кадр для спектра не нужен
+        extractor = self.spectrum_extractor
+        start, stop = extractor.roi_rows(main_array.shape[0])
+        band = main_array[start:stop]
+        if corrector is not None:
+            band = corrector.correct(band, row_start=start)
+
+        self._publish_spectrum(extractor.extract_band(band))
+
+    def _analyze_raw(self, request, metadata):
+        """
+        Спектр по сырому потоку: распаковываются и разделяются на каналы
+        только строки полосы ROI, уровень черного вычитается по метаданным.
+        Темновой/плоский кадры записаны после ISP и здесь не применяются.
+        """
+        converter = self.raw_converter
+        extractor = self.spectrum_extractor
+        start, stop = extractor.roi_rows(converter.output_height)
+        with MappedArray(request, "raw") as mapped:
+            band = converter.convert_rows(mapped.array, start, stop, metadata.get('SensorBlackLevels'))
+            spectrum = extractor.extract_band(band)
+        self._publish_spectrum(converter.resample_to_width(spectrum, MAIN_STREAM_SIZE[0]))
+
+    def _publish_spectrum(self, spectrum):
+        """Последний спектр по пикселям, пересчет в нм и передача в интерфейс"""
+        self.last_spectrum = spectrum
+
+        # Пересчет на сетку нм по заранее построенной таблице
+        calibration = self.wavelength_calibration
+        if calibration is not None:
+            try:
+                spectrum = calibration.resample(spectrum)
+            except ValueError as e:
+                print(f"Wavelength calibration disabled: {e}")
+                self.wavelength_calibration = None
+        self.spectrum_ready.emit(spectrum)
+
+    def _frame_corrector(self, metadata, stream_config):
+        """Корректор для текущей выдержки/режима/настроек или None (мастер-кадры из кэша)"""
+        if not self.frame_correction:
+            return None
+        dark_key = calibration_frame_key('dark', metadata, stream_config, self.image_settings)
+        flat_key = calibration_frame_key('flat', metadata, stream_config, self.image_settings)
+        return self.frame_store.corrector(dark_key, flat_key)
+
+    def set_frame_correction(self, enabled):
+        """Включает/выключает коррекцию темновым и плоским кадрами"""
+        self.frame_correction = bool(enabled)
+
+    def record_calibration_frames(self, kind, count, ui_settings=None):
+        """Запись count темновых ('dark') или плоских ('flat') кадров (из основного потока)"""
+        self._post(self._start_calibration_recording, kind, count, ui_settings or {})
+
+    def _start_calibration_recording(self, kind, count, ui_settings):
+        # Построитель создается с первым кадром, когда известны метаданные
+        self.master_builder = (kind, count)
+        self.master_watcher = None
+        # Ручная выдержка длиннее кадра видео: длительность кадра поднимается
+        # на время записи, иначе темновой кадр запишется с ограниченной выдержкой
+        # и не подойдет снимкам с этой выдержкой
+        self.master_manual = str(ui_settings.get('exposure_mode')).strip().lower() == 'custom'
+        if self.master_manual and self.camera is not None:
+            exposure_us = self._set_manual_exposure(ui_settings.get('exposure', DEFAULT_SETTINGS['exposure']))
+            self.master_watcher = ControlSettleWatcher({'ExposureTime': exposure_us}, "calibration",
+                                                       reference=self.last_frame_metadata, min_frames=1)
+
+    def _finish_calibration_recording(self):
+        self.master_builder = None
+        self.master_watcher = None
+        if self.master_manual:
+            self.master_manual = False
+            self._restore_frame_duration_limits()
+
+    def _record_calibration_frame(self, main_array, metadata, stream_config):
+        """Добавление кадра в мастер-кадр (потоковое среднее)"""
+        builder = self.master_builder
+        if self.master_watcher is not None:
+            if self.master_watcher.update(metadata) is None:
+                return
+            self.master_watcher = None
+        try:
+            if isinstance(builder, tuple):
+                kind, count = builder
+                key = calibration_frame_key(kind, metadata, stream_config, self.image_settings)
+                builder = self.master_builder = MasterFrameBuilder(kind, count, key)
+
+            done = builder.add(main_array)
+            self.calibration_frames_progress.emit(builder.kind, builder.added, builder.count)
+            if not done:
+                return
+
+            self._finish_calibration_recording()
+            path = self.frame_store.save(builder.key, builder.result())
+            self.calibration_frames_ready.emit({'kind': builder.kind, 'count': builder.added,
+                                                'path': path, 'key': builder.key})
+        except Exception as e:
+            print(f"Error recording calibration frames: {e}")
+            self._finish_calibration_recording()
+            self.calibration_frames_ready.emit({'kind': builder.kind if not isinstance(builder, tuple) else builder[0],
+                                                'count': 0, 'path': None, 'error': str(e)})
+
+    def start_stacking(self, count, mode, ui_settings):
+        """Накопление count следующих кадров main в режиме mode (из основного потока)"""
+        self._post(self._start_stacking, count, mode, ui_settings)
+
+    def cancel_stacking(self):
+        self._post(self._cancel_stacking)
+
+    def _start_stacking(self, count, mode, ui_settings):
+        self._cancel_stacking()
+        try:
+            self.frame_stacker = FrameStacker(count, mode)
+        except ValueError as e:
+            self.stack_finished.emit({'error': str(e)})
+            return
+        self.stack_settings = dict(ui_settings)
+        self.stack_started  = time.monotonic()
+        print(f"Stacking started: {count} frames, mode {mode}")
+
+    def _cancel_stacking(self):
+        if self.frame_stacker is not None:
+            self.frame_stacker.cancel()
+            self.frame_stacker = None
+
+    def _stack_frame(self, main_array, main_config):
+        """Добавление кадра в накопитель (кадр копируется/суммируется, буфер камеры не удерживается)"""
+        stacker = self.frame_stacker
+        try:
+            done = stacker.add(main_array)
+            self.stack_progress.emit(stacker.added, stacker.count)
+            if done:
+                self.frame_stacker = None
+                self._finish_stacking(stacker, main_config)
+        except Exception as e:
+            print(f"Stacking error: {traceback.format_exc()}")
+            self._cancel_stacking()
+            self.stack_finished.emit({'error': str(e)})
+
+    def _finish_stacking(self, stacker, main_config):
+        """Результат накопления: коррекция, спектр и запись в фоновой очереди"""
+        elapsed = time.monotonic() - self.stack_started
+        stack = stacker.result()
+
+        # Коррекция линейна, поэтому применяется один раз к результату
+        # (для суммы - к среднему кадру с последующим умножением на число кадров)
+        corrector = self._frame_corrector(self.last_frame_metadata, main_config)
+        if corrector is not None:
+            scale = stacker.added if stacker.mode == 'sum' else 1
+            if scale != 1:
+                stack *= 1.0 / scale
+            corrector.correct(stack, out=stack)
+            if scale != 1:
+                stack *= scale
+
+        spectrum = self.spectrum_extractor.extract(stack)
+        wavelengths = None
+        calibration = self.wavelength_calibration
+        if calibration is not None:
+            try:
+                spectrum = calibration.resample(spectrum)
+                wavelengths = calibration.wavelength_grid
+            except ValueError as e:
+                print(f"Wavelength calibration not applied to stack: {e}")
+
+        info = {'count': stacker.added, 'mode': stacker.mode, 'elapsed': elapsed,
+                'fps': stacker.added / elapsed if elapsed > 0 else 0.0}
+        print(f"Stacking finished: {info}")
+
+        settings = dict(self.stack_settings or {})
+        settings['stack'] = info
+        if corrector is not None:
+            settings['frame_correction_masters'] = corrector.describe()
+        job = {'timestamp':      time.strftime("%Y-%m-%d_%H-%M-%S"),
+               'settings':       settings,
+               'metadata':       dict(self.last_frame_metadata),
+               'stack':          stack,
+               'spectrum':       spectrum,
+               'wavelengths':    wavelengths,
+               'nbytes':         stack.nbytes,
+               'write_function': write_stack_job}
+
+        self.stack_finished.emit(dict(info, spectrum=spectrum))
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.submit(job, None)
+        else:
+            write_stack_job(job, None, os.path.abspath("./results"))
+
+    def start_hdr(self, ui_settings):
+        """
+        Серия кадров с выдержками от hdr_min_exposure до hdr_max_exposure
+        с шагом hdr_factor и объединение в линейный спектр высокого
+        динамического диапазона (вызывается из основного потока)
+        """
+        self._post(self._start_hdr, ui_settings)
+
+    def cancel_hdr(self):
+        self._post(self._cancel_hdr)
+
+    def _start_hdr(self, ui_settings):
+        self._cancel_hdr()
+        if not self.camera or not self.camera.started:
+            self.hdr_finished.emit({'error': "камера не запущена"})
+            return
+        try:
+            series = exposure_series(ui_settings.get('hdr_min_exposure', DEFAULT_SETTINGS['hdr_min_exposure']),
+                                     ui_settings.get('hdr_max_exposure', DEFAULT_SETTINGS['hdr_max_exposure']),
+                                     ui_settings.get('hdr_factor', DEFAULT_SETTINGS['hdr_factor']))
+            self.hdr_converter = self._hdr_raw_converter()
+            self.hdr_merger = HdrMerger(series)
+        except ValueError as e:
+            self.hdr_finished.emit({'error': str(e)})
+            return
+        self.hdr_settings = dict(ui_settings)
+        self.hdr_started  = time.monotonic()
+        print(f"HDR series started: {', '.join(f'{t:g}' for t in series)} s, "
+              f"{'raw' if self.hdr_converter is not None else 'processed'} stream")
+        self._request_hdr_exposure(series[0])
+
+    def _hdr_raw_converter(self):
+        """
+        Сырой поток для серии: слияние по выдержке верно только для линейных
+        данных, поток ISP (гамма, тональная кривая) используется, если сырой
+        недоступен (режим полосы или raw не сконфигурирован)
+        """
+        if self.raw_converter is not None:
+            return self.raw_converter
+        if self.strip_plan is not None:
+            return None
+        raw_config = (getattr(self.camera, 'camera_config', None) or self.video_config).get('raw')
+        try:
+            return RawBayerConverter(raw_config['format'], raw_config['size'], 'rgb')
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"HDR series uses the processed stream (not linear): {e}")
+            return None
+
+    def _video_frame_duration_limits(self):
+        """FrameDurationLimits видеорежима (восстанавливаются после серии и автоэкспозиции)"""
+        limits = (self.video_config or {}).get('controls', {}).get('FrameDurationLimits')
+        if limits is None:
+            limits = getattr(self.camera, 'camera_controls', {}).get('FrameDurationLimits', (None, None))[:2]
+        return tuple(limits)
+
+    def _set_manual_exposure(self, exposure):
+        """
+        Ручная выдержка в видеорежиме: верхний предел длительности кадра
+        поднимается до выдержки с запасом, иначе сенсор ограничит ее
+        длительностью кадра видеорежима (~33 мс). Возвращает выдержку, мкс.
+        """
+        exposure_us = int(exposure * 1000000)
+        requested = {'AeEnable': False, 'ExposureTime': exposure_us}
+        min_frame, max_frame = self._video_frame_duration_limits()
+        if min_frame is not None:
+            requested['FrameDurationLimits'] = (int(min_frame),
+                                                max(int(max_frame), exposure_us + FRAME_MARGIN_US))
+        self.camera.set_controls(requested)
+        return exposure_us
+
+    def _restore_frame_duration_limits(self):
+        """Возврат длительности кадра видеорежима после ручной выдержки"""
+        min_frame, max_frame = self._video_frame_duration_limits()
+        if min_frame is not None:
+            self.camera.set_controls({'FrameDurationLimits': (int(min_frame), int(max_frame))})
+
+    def _request_hdr_exposure(self, exposure):
+        """Ручная выдержка кадра серии; длительность кадра допускает выдержку"""
+        exposure_us = self._set_manual_exposure(exposure)
+        # Кадр серии - первый, в метаданных которого выдержка применена
+        self.hdr_watcher = ControlSettleWatcher({'ExposureTime': exposure_us}, "hdr",
+                                                reference=self.last_frame_metadata, min_frames=1)
+
+    def _cancel_hdr(self, restore=True):
+        if self.hdr_merger is None:
+            return
+        self.hdr_merger.cancel()
+        self.hdr_merger  = None
+        self.hdr_watcher = None
+        if restore:
+            self._restore_after_hdr()
+
+    def _restore_after_hdr(self):
+        """Возврат длительности кадра и выдержки видеорежима"""
+        self._restore_frame_duration_limits()
+        self.apply_full_ui_settings(self.hdr_settings)
+
+    def _hdr_frame(self, request, main_array, metadata, main_config):
+        """
+        Кадр HDR-серии: как только выдержка применена, копируется полоса ROI,
+        сразу запрашивается следующая выдержка, а слияние выполняется в фоне,
+        пока экспонируется следующий кадр
+        """
+        if self.hdr_watcher.update(metadata) is None:
+            return
+        merger = self.hdr_merger
+        try:
+            converter = self.hdr_converter
+            extractor = self.spectrum_extractor
+            if converter is not None:
+                start, stop = extractor.roi_rows(converter.output_height)
+                with MappedArray(request, "raw") as mapped:
+                    band = converter.convert_rows(mapped.array, start, stop,
+                                                  metadata.get('SensorBlackLevels')).copy()
+            else:
+                start, stop = extractor.roi_rows(main_array.shape[0])
+                band = main_array[start:stop].copy()
+
+            exposure = metadata.get('ExposureTime', merger.next_exposure * 1000000) / 1000000
+            gain = metadata.get('AnalogueGain', 1.0)
+            index = merger.added
+            if index + 1 < merger.count:
+                self._request_hdr_exposure(merger.exposures[index + 1])
+            done = merger.add(band, exposure, gain)
+            self.hdr_progress.emit(merger.added, merger.count)
+            if done:
+                self.hdr_merger  = None
+                self.hdr_watcher = None
+                self._finish_hdr(merger, metadata, main_config)
+        except Exception as e:
+            print(f"HDR error: {traceback.format_exc()}")
+            self._cancel_hdr()
+            self.hdr_finished.emit({'error': str(e)})
+
+    def _finish_hdr(self, merger, metadata, main_config):
+        """Спектр объединенной полосы и запись в фоновой очереди"""
+        elapsed = time.monotonic() - self.hdr_started
+        self._restore_after_hdr()
+        merged, clipped = merger.result()
+
+        # Темновые кадры записаны для одной выдержки и к серии не применяются
+        spectrum = self.spectrum_extractor.extract_band(merged)
+        if self.hdr_converter is not None:
+            spectrum = self.hdr_converter.resample_to_width(spectrum, MAIN_STREAM_SIZE[0])
+        wavelengths = None
+        calibration = self.wavelength_calibration
+        if calibration is not None:
+            try:
+                spectrum = calibration.resample(spectrum)
+                wavelengths = calibration.wavelength_grid
+            except ValueError as e:
+                print(f"Wavelength calibration not applied to HDR spectrum: {e}")
+
+        info = {'count': merger.added, 'exposures': merger.actual, 'clipped': clipped,
+                'source': 'raw' if self.hdr_converter is not None else 'isp', 'elapsed': elapsed}
+        print(f"HDR series finished: {info}")
+
+        settings = dict(self.hdr_settings or {})
+        settings['hdr'] = info
+        job = {'timestamp':      time.strftime("%Y-%m-%d_%H-%M-%S"),
+               'kind':           'hdr',
+               'settings':       settings,
+               'metadata':       dict(metadata),
+               'stack':          merged,
+               'spectrum':       spectrum,
+               'wavelengths':    wavelengths,
+               'nbytes':         merged.nbytes,
+               'write_function': write_stack_job}
+
+        self.hdr_finished.emit(dict(info, spectrum=spectrum))
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.submit(job, None)
+        else:
+            write_stack_job(job, None, os.path.abspath("./results"))
+
+    def request_frame(self, not_before_ns=0):
+        """
+        Копия первого кадра main, экспонирование которого началось не раньше
+        not_before_ns (time.monotonic_ns, как SensorTimestamp). Возвращает Future
+        с кадром, метаданными и текущими корректором, экстрактором и калибровкой -
+        обработка выполняется вызывающей стороной (из любого потока).
+        """
+        future = Future()
+        self._post(self._add_frame_request, not_before_ns, future)
+        return future
+
+    def _add_frame_request(self, not_before_ns, future):
+        self.frame_requests.append((not_before_ns, future))
+
+    def _serve_frame_requests(self, request, metadata):
+        timestamp = metadata.get('SensorTimestamp', 0)
+        ready = [item for item in self.frame_requests if timestamp >= item[0]]
+        if not ready:
+            return
+        self.frame_requests = [item for item in self.frame_requests if timestamp < item[0]]
+
+        main_config = request.config["main"]
+        width, height = main_config["size"]
+        with MappedArray(request, "main") as mapped:
+            frame = stream_view(mapped.array, width, height).copy()
+        capture = {'frame':       frame,
+                   'metadata':    dict(metadata),
+                   'corrector':   self._frame_corrector(metadata, main_config),
+                   'extractor':   self.spectrum_extractor,
+                   'calibration': self.wavelength_calibration}
+        for _, future in ready:
+            if future.set_running_or_notify_cancel():
+                future.set_result(capture)
+
+    def start_auto_exposure(self, ui_settings):
+        """Поиск выдержки по пику спектра в ROI (вызывается из основного потока)"""
+        self._post(self._start_auto_exposure, ui_settings)
+
+    def _start_auto_exposure(self, ui_settings):
+        if not self.camera or not self.camera.started:
+            return
+        self.auto_exposure = SpectralAutoExposure(
+            target_fraction=ui_settings.get('ae_target', DEFAULT_SETTINGS['ae_target']))
+        self.ae_settings = dict(ui_settings)
+        self._request_ae_exposure(self.auto_exposure.start(self.current_settings_state['exposure']))
+
+    def _request_ae_exposure(self, exposure):
+        self.ae_exposure      = exposure
+        self.ae_settle_frames = 0
+        self._set_manual_exposure(exposure)
+
+    def _fail_auto_exposure(self, message):
+        """Прерывание поиска: возврат длительности кадра и прежней выдержки"""
+        print(f"Auto exposure error: {message}")
+        self.auto_exposure = None
+        self._restore_frame_duration_limits()
+        self.apply_full_ui_settings(self.ae_settings)
+        self.auto_exposure_finished.emit({'error': message})
+
+    def _auto_exposure_frame(self, main_array, metadata):
+        """Итерация автоэкспозиции по кадру, снятому с запрошенной выдержкой"""
+        requested_us = self.ae_exposure * 1000000
+        actual_us = metadata.get('ExposureTime')
+
+        # Новая выдержка применяется с задержкой в несколько кадров
+        self.ae_settle_frames += 1
+        settled = actual_us is not None and abs(actual_us - requested_us) <= 0.05 * requested_us
+        if not settled and self.ae_settle_frames < AE_MAX_SETTLE_FRAMES:
+            return
+        # Сенсор не дал запрошенную выдержку (ограничение сенсора или длительности
+        # кадра): найденная по такому кадру выдержка была бы неверной
+        if not settled and actual_us is not None:
+            self._fail_auto_exposure(f"сенсор ограничил выдержку: запрошено {requested_us / 1000000:g} с, "
+                                     f"получено {actual_us / 1000000:g} с")
+            return
+
+        try:
+            start, stop = self.spectrum_extractor.roi_rows(main_array.shape[0])
+            peak, clipped = measure_band(main_array[start:stop])
+            next_exposure = self.auto_exposure.update(self.ae_exposure if actual_us is None else actual_us / 1000000,
+                                                      peak, clipped)
+        except Exception as e:
+            self._fail_auto_exposure(str(e))
+            return
+
+        if next_exposure is not None:
+            self._request_ae_exposure(next_exposure)
+            return
+
+        result = self.auto_exposure.result()
+        self.auto_exposure = None
+        print(f"Auto exposure: {result['exposure']:.4f} s, peak {result['peak']}, "
+              f"{result['iterations']} iterations in {result['elapsed']:.2f} s")
+
+        # Найденная выдержка применяется как ручная и передается в интерфейс
+        self._restore_frame_duration_limits()
+        self.update_settings({'exposure': result['exposure']})
+        self.auto_exposure_finished.emit(result)
+
+    def start_autofocus(self):
+        """Поиск фокуса по резкости линий в ROI (вызывается из основного потока)"""
+        self._post(self._start_autofocus)
+
+    def _lens_range(self):
+        """Диапазон LensPosition: пределы поля фокуса, суженные пределами линзы"""
+        lens_min = focus_to_lens_position(FOCUS_RANGE_MM[1])
+        lens_max = focus_to_lens_position(FOCUS_RANGE_MM[0])
+        limits = getattr(self.camera, 'camera_controls', {}).get('LensPosition')
+        if limits:
+            lens_min = max(lens_min, limits[0])
+            lens_max = min(lens_max, limits[1])
+        return lens_min, lens_max
+
+    def _start_autofocus(self):
+        if not self.camera or not self.camera.started:
+            return
+        self.autofocus = FocusSweep(self._lens_range())
+        self._request_focus_position(self.autofocus.start())
+
+    def _request_focus_position(self, lens_position):
+        self.af_position      = lens_position
+        self.af_settle_frames = 0
+        self.camera.set_controls({'AfMode': controls.AfModeEnum.Manual, 'LensPosition': lens_position})
+
+    def _autofocus_frame(self, main_array, metadata):
+        """Итерация автофокуса по кадру, снятому после перемещения линзы"""
+        # Пропуск кадров, пока линза не дошла до запрошенной позиции
+        self.af_settle_frames += 1
+        actual = metadata.get('LensPosition')
+        moving = actual is None or abs(actual - self.af_position) > 0.01 * max(self.af_position, 1.0)
+        if self.af_settle_frames < 2 or (moving and self.af_settle_frames < AF_MAX_SETTLE_FRAMES):
+            return
+
+        try:
+            start, stop = self.spectrum_extractor.roi_rows(main_array.shape[0])
+            score = sharpness_score(main_array[start:stop], self.autofocus.downsample)
+            next_position = self.autofocus.update(self.af_position, score)
+        except Exception as e:
+            print(f"Autofocus error: {e}")
+            self.autofocus = None
+            self.autofocus_finished.emit({'error': str(e)})
+            return
+
+        if next_position is not None:
+            self._request_focus_position(next_position)
+            return
+
+        result = self.autofocus.result()
+        self.autofocus = None
+        print(f"Autofocus: LensPosition {result['lens_position']:.3f} ({result['focus']} mm), "
+              f"{result['iterations']} frames in {result['elapsed']:.2f} s")
+
+        # Найденный фокус применяется как ручной и передается в интерфейс
+        self.update_settings({'focus': result['focus']})
+        self.autofocus_finished.emit(result)
+
+    def _copy_preview(self, request):
+        """Копирует кадр превью в пул, None если кадр нужно пропустить"""
+
+        # Превью берется из lores, если он есть; кадр, снятый до смены
+        # конфигурации (другой размер), пропускается
+        stream = "lores" if request.config.get("lores") else "main"
+        if not self.frame_pool.matches(*request.config[stream]["size"]):
+            return None
+
+        # Все кадры пула заняты интерфейсом - кадр пропускается
+        frame = self.frame_pool.acquire()
+        if frame is None:
+            return None
+
+        # Единственное копирование: из буфера камеры в кадр пула
+        with MappedArray(request, stream) as mapped:
+            copy_into_frame(mapped.array, frame)
+        return frame
+
+    def _process_frame(self, frame):
+        """Передает кадр (RGB, буфер из пула) в интерфейс"""
+
+        # Интерфейс уведомляется только если предыдущий кадр уже забран
+        if self.frame_mailbox.put(frame):
+            self.change_pixmap.emit()
+
+    def frame_metrics(self):
+        """
+        Число кадров, доставленных в интерфейс и отброшенных как устаревшие,
+        а также пропущенных у источника из-за target_fps и нехватки кадров пула
+        """
+        metrics = self.frame_mailbox.metrics()
+        metrics['source_dropped'] = self.source_dropped
+        metrics['pool_exhausted'] = self.frame_pool.exhausted if self.frame_pool else 0
+        return metrics
+
+    def request_snapshot(self, snapshot_settings):
+        """Ставит снимок в очередь потока камеры (вызывается из основного потока)"""
+        self._post(self._take_snapshot, snapshot_settings)
+
+    def _take_snapshot(self, snapshot_settings):
+        """
+        Снимок на той же камере, что и видео: режим переключается на месте,
+        после снимка видео продолжается без переоткрытия камеры.
+        Кадр запрашивается без блокировки потока: во время длинной выдержки
+        цикл событий работает, и снимок можно отменить (cancel_snapshot).
+        """
+        if not self.camera or not self.camera.started:
+            self.snapshot_failed.emit("Камера не запущена")
+            return
+        if self.snapshot is not None:
+            self.snapshot_failed.emit("Предыдущий снимок еще не завершен")
+            return
+
+        start_time = time.monotonic()
+        switched   = False
+
+        try:
+            # Метаданные видео (нужны для режима шумоподавления)
+            video_controls = self.save_current_settings()
+
+            # Режимы сенсора берутся из кэша, камера не опрашивается
+            if self.still_resolution is None:
+                if self.sensor_modes is None:
+                    self._load_sensor_modes()
+                self.still_resolution = select_still_resolution(self.sensor_modes)
+
+            still_config, snapshot_controls = create_snapshot_configuration(
+                self.camera, self.video_config, self.still_resolution, snapshot_settings, video_controls)
+
+            # Кадры в режиме фото снимаются, пока метаданные не покажут примененные
+            # выдержку, положение линзы и сошедшийся AWB (или до тайм-аута,
+            # зависящего от выдержки); обычно подходит первый же кадр
+            self._cancel_capture()
+            switched = True
+            self.camera.switch_mode(still_config)
+            watcher = ControlSettleWatcher(snapshot_controls, "snapshot",
+                                           reference=self.last_frame_metadata, min_frames=1)
+        except Exception as e:
+            print(f"Snapshot Error details: {traceback.format_exc()}")
+            self.snapshot_failed.emit(str(e))
+            if switched:
+                self._resume_video()
+            return
+
+        self._snapshot_generation += 1
+        self.snapshot = {'settings':   snapshot_settings,
+                         'watcher':    watcher,
+                         'started':    start_time,
+                         'restart':    None}   # отложенная перенастройка видео
+
+        # Выдержка: запрошенная вручную или текущая автоэкспозиции
+        exposure = snapshot_controls.get('ExposureTime') or self.last_frame_metadata.get('ExposureTime', 0)
+        self.snapshot_exposure_started.emit({'exposure': exposure / 1e6,
+                                             'timeout':  watcher.deadline - watcher.started})
+        self._arm_snapshot_capture()
+
+    def _arm_snapshot_capture(self):
+        """Запрашивает кадр режима фото без блокировки потока"""
+        generation = self._snapshot_generation
+
+        def on_request_completed(job):
+            self._post(self._handle_snapshot_request, job, generation)
+
+        self.camera.capture_request(wait=False, signal_function=on_request_completed)
+
+    def _handle_snapshot_request(self, job, generation):
+        """Кадр режима фото: проверка применения настроек, возврат в видео и передача на запись"""
+
+        # Снимок отменен: задание все равно завершается, а захваченный им
+        # запрос освобождается, иначе его буферы не вернутся в очередь камеры
+        if generation != self._snapshot_generation or self.snapshot is None:
+            try:
+                request = self.camera.wait(job)
+            except Exception as e:
+                print(f"Cancelled snapshot request finished with error: {e}")
+                return
+            if request is not None:
+                request.release()
+            return
+
+        snapshot = self.snapshot
+        request = None
+        try:
+            request = self.camera.wait(job)
+            if snapshot['watcher'].update(request.get_metadata()) is None:
+                request.release()
+                request = None
+                self._arm_snapshot_capture()
+                return
+
+            # Камера возвращается в режим видео сразу после захвата,
+            # запрос остается действительным до release()
+            self._resume_video()
+            snapshot_settings = snapshot['settings']
+
+            # Копирование буферов, кодирование выполняется позже в фоне
+            job = extract_snapshot_job(request, snapshot_settings)
+            job['settings']['settle'] = snapshot['watcher'].result   # сохраняется в метаданных снимка
+            request.release()
+            request = None
+
+            # Коррекция выполняется при записи; мастер-кадры режима видео
+            # пересчитываются под размер и порядок каналов снимка. Темновой
+            # кадр ищется по выдержке и усилению самого снимка, а не кадра видео
+            # Мастер-кадры полосы к полному кадру снимка не подходят
+            corrector = None if self.strip_plan is not None else \
+                self._frame_corrector(job['metadata'], self.video_config["main"])
+            if self.frame_correction and (corrector is None or corrector.dark is None):
+                print(f"No dark master for snapshot exposure "
+                      f"{job['metadata'].get('ExposureTime', 0) / 1e6:g} s: dark subtraction skipped")
+            if corrector is not None:
+                job['frame_corrector'] = corrector
+                job['frame_corrector_reverse'] = \
+                    {job['main_config'].get('format'), self.video_config["main"].get('format')} == {'RGB888', 'BGR888'}
+
+            # Конфигурация видео сбрасывает настройки, применяем их заново
+            self.apply_full_ui_settings(snapshot_settings)
+
+            round_trip = time.monotonic() - snapshot['started']
+            print(f"Snapshot round trip: {round_trip:.3f} s")
+            self.snapshot_captured.emit({'timestamp': job['timestamp'], 'round_trip': round_trip})
+
+            # Кодирование и запись - в фоновой очереди (при переполнении ждем место)
+            if self.snapshot_writer is not None:
+                self.snapshot_writer.submit(job, self.camera.helpers)
+            else:
+                write_snapshot_job(job, self.camera.helpers, os.path.abspath("./results"))
+
+        except Exception as e:
+            print(f"Snapshot Error details: {traceback.format_exc()}")
+            if request is not None:
+                request.release()
+            self.snapshot_failed.emit(str(e))
+            if self.snapshot is not None:
+                self._resume_video()
+
+    def cancel_snapshot(self):
+        """Отмена текущего снимка (вызывается из основного потока)"""
+        self._post(self._cancel_snapshot)
+
+    def _cancel_snapshot(self):
+        """
+        Прерывает запрос кадра режима фото и сразу возвращает камеру в видео;
+        камера не переоткрывается.
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return
+        self._snapshot_generation += 1   # завершенный запрос снимка будет проигнорирован
+        try:
+            self.camera.cancel_all_and_flush()
+            self._resume_video()
+            self.apply_full_ui_settings(snapshot['settings'])
+            print(f"Snapshot cancelled after {time.monotonic() - snapshot['started']:.2f} s")
+            self.snapshot_cancelled.emit()
+        except Exception as e:
+            print(f"Error cancelling snapshot: {e}")
+            self.camera_error.emit()
+            self.running = False
+
+    def _resume_video(self):
+        """Возврат из режима фото в видео и выполнение отложенной перенастройки"""
+        snapshot, self.snapshot = self.snapshot, None
+        self.camera.switch_mode(self.video_config)
+        self._arm_capture()
+        if snapshot is not None and snapshot['restart'] is not None:
+            self._restart_video(snapshot['restart'])
+
     """
     ----------------------------------------------------
     --- Обертки методов для вызова утилитных функций ---
     ----------------------------------------------------
     """
     def apply_full_ui_settings(self, ui_settings):
-        applied_state = apply_full_ui_settings_to_camera(self.camera, ui_settings)
+        if 'target_fps' in ui_settings:
+            self.set_target_fps(ui_settings['target_fps'])
+        self.set_spectrum_settings(ui_settings)
+        self.image_settings = {key: ui_settings.get(key, DEFAULT_SETTINGS[key]) for key in IMAGE_SETTINGS_KEYS}
+        if 'frame_correction' in ui_settings:
+            self.set_frame_correction(ui_settings['frame_correction'])
+
+        applied_state = apply_full_ui_settings_to_camera(self.camera, ui_settings, self.watch_settle)
 
         # Если настройки были применены
         if applied_state:
@@ -171,7 +1461,7 @@ class CameraThread(QThread):
             self.settings_updated.emit(self.current_settings_state.copy())
 
     def set_focus(self, distance_mm):
-        success = set_camera_focus(self.camera, distance_mm)
+        success = set_camera_focus(self.camera, distance_mm, self.watch_settle)
         if success:
             # Обновление внутреннего состояния фокуса
             self.current_settings_state['focus'] = distance_mm
@@ -180,7 +1470,7 @@ class CameraThread(QThread):
         return success
 
     def update_settings(self, settings_dict):
-        applied_state = update_specific_camera_settings(self.camera, settings_dict)
+        applied_state = update_specific_camera_settings(self.camera, settings_dict, self.watch_settle)
         if applied_state:
             # Обновление внутреннего состояния фокуса и экспозиции
             if 'focus' in applied_state:
@@ -197,7 +1487,7 @@ class CameraThread(QThread):
 
     def restore_last_settings(self):
         # Восстановление последних сохраненных настроек камеры.  
-        restore_last_camera_settings(self.camera, self.last_metadata_settings)
+        restore_last_camera_settings(self.camera, self.last_metadata_settings, self.watch_settle)
 
     ''' 
     ---------------------------
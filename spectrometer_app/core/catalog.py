@@ -0,0 +1,332 @@
+# spectrometer_app/core/catalog.py
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from core.spectrum import SpectrumExtractor
+except ImportError: # Fallback for running script directly
+    from spectrometer_app.core.spectrum import SpectrumExtractor
+
+
+CATALOG_FILENAME = "catalog.sqlite"   # каталог в папке результатов
+CATALOG_VERSION  = 1                  # версия схемы; при изменении каталог перестраивается
+
+TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S"   # формат времени в именах файлов (time.strftime)
+DATA_EXTENSIONS  = ('.jpg', '.dng', '.npy', '.csv')
+
+# Имя файла снимка: время, вид результата (накопление, HDR), суффикс уникальности
+_BASENAME_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})(?:_(stack|hdr))?(?:_\d+)?$")
+_SCAN_PATTERN     = re.compile(r"^scan_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})")
+
+# Столбцы для поиска (все индексируются), остальное - в JSON
+INDEXED_COLUMNS = ('kind', 'captured_at', 'exposure', 'analogue_gain', 'lens_position', 'focus',
+                   'lens1_pos', 'lens2_pos', 'spectrum_peak', 'spectrum_peak_wavelength')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id                       INTEGER PRIMARY KEY,
+    sidecar                  TEXT UNIQUE NOT NULL,   -- JSON с настройками, путь от папки результатов
+    kind                     TEXT NOT NULL,          -- snapshot / stack / hdr / scan
+    timestamp                TEXT,
+    captured_at              REAL,                   -- время съемки, с от эпохи
+    exposure                 REAL,                   -- выдержка, с
+    analogue_gain            REAL,
+    lens_position            REAL,                   -- LensPosition камеры, диоптрии
+    focus                    REAL,                   -- фокус из настроек, мм
+    lens1_pos                REAL,                   -- оси перемещения линз
+    lens2_pos                REAL,
+    exposure_mode            TEXT,
+    awb_mode                 TEXT,
+    colour_temperature       REAL,
+    spectrum_peak            REAL,
+    spectrum_peak_index      INTEGER,
+    spectrum_peak_wavelength REAL,
+    spectrum_mean            REAL,
+    spectrum_total           REAL,
+    files                    TEXT,                   -- JSON: файлы данных (пути от папки результатов)
+    settings                 TEXT,                   -- JSON: полные настройки
+    metadata                 TEXT                    -- JSON: метаданные камеры
+);
+"""
+
+_COLUMNS = ('sidecar', 'kind', 'timestamp', 'captured_at', 'exposure', 'analogue_gain', 'lens_position',
+            'focus', 'lens1_pos', 'lens2_pos', 'exposure_mode', 'awb_mode', 'colour_temperature',
+            'spectrum_peak', 'spectrum_peak_index', 'spectrum_peak_wavelength', 'spectrum_mean',
+            'spectrum_total', 'files', 'settings', 'metadata')
+
+
+def spectrum_summary(spectrum, wavelengths=None):
+    """Сводка спектра для каталога: пик (значение, пиксель, длина волны), среднее и сумма"""
+    spectrum = np.asarray(spectrum, dtype=np.float64)
+    if spectrum.size == 0:
+        return None
+    peak_index = int(np.argmax(spectrum))
+    return {'peak':            float(spectrum[peak_index]),
+            'peak_index':      peak_index,
+            'peak_wavelength': float(wavelengths[peak_index]) if wavelengths is not None else None,
+            'mean':            float(spectrum.mean()),
+            'total':           float(spectrum.sum())}
+
+
+def snapshot_spectrum_summary(image, settings):
+    """Сводка спектра снимка: спектр полосы ROI из настроек снимка"""
+    return spectrum_summary(SpectrumExtractor.from_settings(settings).extract(image))
+
+
+def _parse_time(text):
+    try:
+        return time.mktime(time.strptime(text, TIMESTAMP_FORMAT))
+    except (TypeError, ValueError):
+        return None
+
+
+def _number(value, scale=1.0):
+    try:
+        return float(value) * scale
+    except (TypeError, ValueError):
+        return None
+
+
+def _summary_from_disk(path, kind, settings):
+    """Сводка спектра для результатов, записанных до появления каталога"""
+    base, _ = os.path.splitext(path)
+    if kind in ('stack', 'hdr') and os.path.exists(f"{base}.csv"):
+        with open(f"{base}.csv", encoding='utf-8') as f:
+            has_wavelengths = f.readline().startswith("wavelength")
+        data = np.loadtxt(f"{base}.csv", delimiter=',', skiprows=1, ndmin=2)
+        return spectrum_summary(data[:, 1], data[:, 0] if has_wavelengths else None)
+    if kind == 'snapshot' and os.path.exists(f"{base}.jpg"):
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+        with Image.open(f"{base}.jpg") as image:
+            return snapshot_spectrum_summary(np.asarray(image.convert('RGB')), settings)
+    if kind == 'scan' and os.path.exists(os.path.join(os.path.dirname(path), "spectra.npy")):
+        spectra = np.load(os.path.join(os.path.dirname(path), "spectra.npy"), mmap_mode='r')
+        wavelengths_path = os.path.join(os.path.dirname(path), "wavelengths.npy")
+        wavelengths = np.load(wavelengths_path) if os.path.exists(wavelengths_path) else None
+        return spectrum_summary(np.max(spectra, axis=0), wavelengths) if len(spectra) else None
+    return None
+
+
+def read_entry(path, results_dir):
+    """
+    Строка каталога по JSON-файлу результата (снимок, накопление, HDR или
+    scan.json сканирования). None, если файл не является результатом.
+    Выполняется и в рабочих процессах при перестроении каталога.
+    """
+    relative = os.path.relpath(path, results_dir)
+    name = os.path.splitext(os.path.basename(path))[0]
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        return None
+
+    if name == "scan":
+        match = _SCAN_PATTERN.match(os.path.basename(os.path.dirname(path)))
+        if match is None:
+            return None
+        kind, timestamp = 'scan', match.group(1)
+        settings = data.get('settings') or {}
+        metadata = {}
+        directory = os.path.dirname(path)
+        files = [os.path.relpath(os.path.join(directory, file), results_dir)
+                 for file in sorted(os.listdir(directory)) if file != "scan.json"]
+    else:
+        match = _BASENAME_PATTERN.match(name)
+        if match is None or 'settings' not in data:
+            return None
+        kind, timestamp = match.group(2) or 'snapshot', match.group(1)
+        settings = data.get('settings') or {}
+        metadata = data.get('metadata') or {}
+        base = os.path.splitext(path)[0]
+        files = [os.path.relpath(f"{base}{extension}", results_dir)
+                 for extension in DATA_EXTENSIONS if os.path.exists(f"{base}{extension}")]
+
+    summary = settings.get('spectrum_summary')
+    if summary is None:
+        try:
+            summary = _summary_from_disk(path, kind, settings)
+        except Exception as e:
+            print(f"Catalog: no spectrum summary for {relative}: {e}")
+    summary = summary or {}
+
+    # Выдержка по метаданным кадра (фактическая), иначе по настройкам
+    exposure = _number(metadata.get('ExposureTime'), 1e-6)
+    if exposure is None:
+        exposure = _number(settings.get('exposure'))
+
+    return {'sidecar':                  relative,
+            'kind':                     kind,
+            'timestamp':                timestamp,
+            'captured_at':              _parse_time(timestamp),
+            'exposure':                 exposure,
+            'analogue_gain':            _number(metadata.get('AnalogueGain')),
+            'lens_position':            _number(metadata.get('LensPosition')),
+            'focus':                    _number(settings.get('focus')),
+            'lens1_pos':                _number(settings.get('lens1_pos')),
+            'lens2_pos':                _number(settings.get('lens2_pos')),
+            'exposure_mode':            settings.get('exposure_mode'),
+            'awb_mode':                 settings.get('awb_mode'),
+            'colour_temperature':       _number(metadata.get('ColourTemperature')),
+            'spectrum_peak':            summary.get('peak'),
+            'spectrum_peak_index':      summary.get('peak_index'),
+            'spectrum_peak_wavelength': summary.get('peak_wavelength'),
+            'spectrum_mean':            summary.get('mean'),
+            'spectrum_total':           summary.get('total'),
+            'files':                    json.dumps(files, ensure_ascii=False),
+            'settings':                 json.dumps(settings, ensure_ascii=False, default=str),
+            'metadata':                 json.dumps(metadata, ensure_ascii=False, default=str)}
+
+
+def _read_entry_safe(path, results_dir):
+    try:
+        return read_entry(path, results_dir)
+    except Exception as e:
+        print(f"Catalog: skipping {path}: {e}")
+        return None
+
+
+def find_sidecars(results_dir):
+    """JSON-файлы результатов в папке результатов (снимки и каталоги сканирований)"""
+    paths = []
+    with os.scandir(results_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith('.json'):
+                paths.append(entry.path)
+            elif entry.is_dir() and _SCAN_PATTERN.match(entry.name):
+                scan_json = os.path.join(entry.path, "scan.json")
+                if os.path.exists(scan_json):
+                    paths.append(scan_json)
+    return sorted(paths)
+
+
+class ResultsCatalog:
+    """
+    Каталог SQLite всего, что записано в папку результатов: одна строка на
+    снимок, накопление, HDR-серию или сканирование. Полные настройки и
+    метаданные хранятся в JSON, а часто используемые для поиска поля
+    (время, вид, выдержка, усиление, положения линз, сводка спектра) -
+    в отдельных индексированных столбцах.
+
+    Строка добавляется по JSON-файлу результата сразу после его записи
+    (add_sidecar), поэтому каталог и перестроение с диска (rebuild) дают
+    одинаковые строки. Соединение общее для потоков записи, доступ под
+    блокировкой; журнал WAL не блокирует чтение во время записи.
+    """
+
+    def __init__(self, results_dir, filename=CATALOG_FILENAME):
+        self.results_dir = os.path.abspath(results_dir)
+        self.path = os.path.join(self.results_dir, filename)
+        self._lock = threading.Lock()
+        os.makedirs(self.results_dir, exist_ok=True)
+
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version not in (0, CATALOG_VERSION):
+                print(f"Catalog schema {version} is outdated, recreating")
+                self._connection.execute("DROP TABLE IF EXISTS captures")
+            self._connection.executescript(_SCHEMA)
+            for column in INDEXED_COLUMNS:
+                self._connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS captures_{column} ON captures ({column})")
+            self._connection.execute(f"PRAGMA user_version={CATALOG_VERSION}")
+
+    def _insert(self, entries):
+        placeholders = ", ".join("?" for _ in _COLUMNS)
+        self._connection.executemany(
+            f"INSERT OR REPLACE INTO captures ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+            [tuple(entry[column] for column in _COLUMNS) for entry in entries])
+
+    def add_sidecar(self, path):
+        """Добавляет (или обновляет) результат по его JSON-файлу; True, если добавлен"""
+        entry = read_entry(os.path.abspath(path), self.results_dir)
+        if entry is None:
+            return False
+        with self._lock, self._connection:
+            self._insert([entry])
+        return True
+
+    def rebuild(self, max_workers=None):
+        """
+        Перестроение каталога по файлам на диске: JSON-файлы читаются (и для
+        старых результатов вычисляется сводка спектра) в пуле процессов,
+        строки обновляются одной транзакцией. Строки, добавленные add_sidecar
+        во время перестроения, сохраняются; удаляются только строки, JSON-файл
+        которых больше не существует. Возвращает число строк и время.
+        """
+        started = time.monotonic()
+        paths = find_sidecars(self.results_dir)
+        entries = []
+        if paths:
+            workers = max_workers or os.cpu_count() or 1
+            chunksize = max(1, len(paths) // (4 * workers))
+            # spawn: перестроение запускается из процесса с потоками Qt и камеры,
+            # fork скопировал бы их блокировки в рабочие процессы
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                entries = [entry for entry in executor.map(_read_entry_safe, paths,
+                                                           [self.results_dir] * len(paths),
+                                                           chunksize=chunksize)
+                           if entry is not None]
+
+        with self._lock, self._connection:
+            self._insert(entries)
+            missing = [(row[0],) for row in self._connection.execute("SELECT sidecar FROM captures")
+                       if not os.path.exists(os.path.join(self.results_dir, row[0]))]
+            self._connection.executemany("DELETE FROM captures WHERE sidecar = ?", missing)
+        elapsed = time.monotonic() - started
+        print(f"Catalog rebuilt: {len(entries)} of {len(paths)} files in {elapsed:.2f} s")
+        return {'count': len(entries), 'files': len(paths), 'elapsed': elapsed}
+
+    def find(self, kind=None, since=None, until=None, tolerance=0.01, limit=None, **values):
+        """
+        Поиск результатов, новые первыми. kind - вид результата; since/until -
+        время съемки (с от эпохи); values - значения индексированных столбцов
+        (exposure=5, lens1_pos=120, ...), совпадение с относительным допуском
+        tolerance. Возвращает список словарей.
+        """
+        conditions, parameters = [], []
+        if kind is not None:
+            conditions.append("kind = ?")
+            parameters.append(kind)
+        if since is not None:
+            conditions.append("captured_at >= ?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append("captured_at < ?")
+            parameters.append(until)
+        for column, value in values.items():
+            if column not in INDEXED_COLUMNS:
+                raise ValueError(f"Unknown catalog column: {column}")
+            delta = abs(value) * tolerance
+            conditions.append(f"{column} BETWEEN ? AND ?")
+            parameters.extend((value - delta, value + delta))
+
+        query = "SELECT * FROM captures"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY captured_at DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(int(limit))
+
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
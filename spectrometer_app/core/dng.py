@@ -0,0 +1,178 @@
+# spectrometer_app/core/dng.py
+
+import struct
+import numpy as np
+
+
+# Теги TIFF/DNG, нужные для чтения мозаики Байера
+_TAG_NEW_SUBFILE_TYPE = 254
+_TAG_WIDTH            = 256
+_TAG_HEIGHT           = 257
+_TAG_BITS_PER_SAMPLE  = 258
+_TAG_COMPRESSION      = 259
+_TAG_PHOTOMETRIC      = 262
+_TAG_STRIP_OFFSETS    = 273
+_TAG_ROWS_PER_STRIP   = 278
+_TAG_STRIP_COUNTS     = 279
+_TAG_TILE_WIDTH       = 322
+_TAG_TILE_LENGTH      = 323
+_TAG_TILE_OFFSETS     = 324
+_TAG_TILE_COUNTS      = 325
+_TAG_SUB_IFDS         = 330
+_TAG_CFA_PATTERN      = 33422
+_TAG_BLACK_LEVEL      = 50714
+_TAG_WHITE_LEVEL      = 50717
+
+_PHOTOMETRIC_CFA = 32803
+
+# Тип поля TIFF -> (формат struct, размер)
+_TYPES = {1: ('B', 1), 2: ('c', 1), 3: ('H', 2), 4: ('I', 4), 5: ('II', 8), 6: ('b', 1),
+          7: ('B', 1), 8: ('h', 2), 9: ('i', 4), 10: ('ii', 8), 11: ('f', 4), 12: ('d', 8), 13: ('I', 4)}
+
+_CFA_COLOURS = {0: 'R', 1: 'G', 2: 'B'}
+
+
+def _read_ifd(data, offset, byte_order):
+    """Поля IFD: тег -> список значений (рациональные - как float)"""
+    count, = struct.unpack_from(f"{byte_order}H", data, offset)
+    fields = {}
+    for index in range(count):
+        tag, kind, number, value_offset = struct.unpack_from(f"{byte_order}HHI4s", data, offset + 2 + 12 * index)
+        if kind not in _TYPES:
+            continue
+        code, size = _TYPES[kind]
+        total = size * number
+        raw = value_offset if total <= 4 else \
+            data[struct.unpack(f"{byte_order}I", value_offset)[0]:][:total]
+        if kind in (5, 10):
+            pairs = struct.unpack_from(f"{byte_order}{2 * number}{code[0]}", raw)
+            fields[tag] = [numerator / denominator if denominator else 0.0
+                           for numerator, denominator in zip(pairs[0::2], pairs[1::2])]
+        elif kind == 2:
+            fields[tag] = [bytes(raw[:number]).rstrip(b'\0').decode('latin-1')]
+        else:
+            fields[tag] = list(struct.unpack_from(f"{byte_order}{number}{code}", raw))
+    return fields
+
+
+def _find_raw_ifd(data, offset, byte_order, depth=0):
+    """IFD мозаики Байера: основное изображение (NewSubfileType 0) с CFA, в том числе в SubIFD"""
+    fields = _read_ifd(data, offset, byte_order)
+    if fields.get(_TAG_PHOTOMETRIC, [None])[0] == _PHOTOMETRIC_CFA and \
+       fields.get(_TAG_NEW_SUBFILE_TYPE, [0])[0] == 0:
+        return fields
+    if depth < 2:
+        for sub_offset in fields.get(_TAG_SUB_IFDS, []):
+            found = _find_raw_ifd(data, sub_offset, byte_order, depth + 1)
+            if found is not None:
+                return found
+    return None
+
+
+def _unpack_rows(rows, width, bits, byte_order):
+    """
+    Строки данных (h, байт на строку) в uint16. Упаковка DNG - непрерывный
+    поток битов от старшего к младшему, каждая строка с границы байта.
+    """
+    height = rows.shape[0]
+    if bits == 8:
+        return rows[:, :width].astype(np.uint16)
+    if bits == 16:
+        return rows[:, :2 * width].copy().view(f"{byte_order}u2").astype(np.uint16)
+    if bits == 12 and width % 2 == 0:
+        groups = rows[:, :width * 3 // 2].reshape(height, width // 2, 3).astype(np.uint16)
+        image = np.empty((height, width // 2, 2), dtype=np.uint16)
+        image[..., 0] = (groups[..., 0] << 4) | (groups[..., 1] >> 4)
+        image[..., 1] = ((groups[..., 1] & 0xF) << 8) | groups[..., 2]
+        return image.reshape(height, width)
+    if bits == 10 and width % 4 == 0:
+        groups = rows[:, :width * 5 // 4].reshape(height, width // 4, 5).astype(np.uint16)
+        image = np.empty((height, width // 4, 4), dtype=np.uint16)
+        image[..., 0] = (groups[..., 0] << 2) | (groups[..., 1] >> 6)
+        image[..., 1] = ((groups[..., 1] & 0x3F) << 4) | (groups[..., 2] >> 4)
+        image[..., 2] = ((groups[..., 2] & 0xF) << 6) | (groups[..., 3] >> 2)
+        image[..., 3] = ((groups[..., 3] & 0x3) << 8) | groups[..., 4]
+        return image.reshape(height, width)
+
+    # Прочие разрядности - через поток битов (медленнее, больше памяти)
+    bitstream = np.unpackbits(rows, axis=1)[:, :width * bits].reshape(height, width, bits)
+    weights = (1 << np.arange(bits - 1, -1, -1)).astype(np.uint32)
+    return (bitstream @ weights).astype(np.uint16)
+
+
+def read_dng(path):
+    """
+    Мозаика Байера из несжатого DNG (как записывает picamera2/PiDNG).
+    Возвращает словарь:
+        image       - uint16 (высота, ширина), значения в младших bit_depth битах;
+        pattern     - порядок Байера ('RGGB', 'BGGR', ...);
+        bit_depth   - разрядность по уровню белого;
+        black_level - уровень черного (среднее по ячейке), единицы данных;
+        white_level - уровень белого.
+    Для сжатых DNG нужен rawpy (LibRaw): используется, если установлен.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 8 or data[:2] not in (b'II', b'MM'):
+        raise ValueError(f"{path} is not a TIFF/DNG file")
+    byte_order = '<' if data[:2] == b'II' else '>'
+    magic, offset = struct.unpack_from(f"{byte_order}HI", data, 2)
+    if magic != 42:
+        raise ValueError(f"{path}: unsupported TIFF variant {magic}")
+
+    # Обрезанный или поврежденный файл: смещения и размеры выходят за данные
+    try:
+        fields = _find_raw_ifd(data, offset, byte_order)
+        if fields is None:
+            raise ValueError(f"{path}: no CFA image found")
+        if fields.get(_TAG_COMPRESSION, [1])[0] != 1:
+            return _read_dng_rawpy(path)
+
+        width, height = fields[_TAG_WIDTH][0], fields[_TAG_HEIGHT][0]
+        bits = fields[_TAG_BITS_PER_SAMPLE][0]
+        row_bytes = (width * bits + 7) // 8
+
+        if _TAG_TILE_OFFSETS in fields:
+            tile_width, tile_length = fields[_TAG_TILE_WIDTH][0], fields[_TAG_TILE_LENGTH][0]
+            tile_row_bytes = (tile_width * bits + 7) // 8
+            tiles_across = (width + tile_width - 1) // tile_width
+            image = np.empty((height, width), dtype=np.uint16)
+            for index, (tile_offset, count) in enumerate(zip(fields[_TAG_TILE_OFFSETS], fields[_TAG_TILE_COUNTS])):
+                top, left = (index // tiles_across) * tile_length, (index % tiles_across) * tile_width
+                tile = np.frombuffer(data, np.uint8, tile_row_bytes * tile_length, tile_offset)
+                pixels = _unpack_rows(tile.reshape(tile_length, tile_row_bytes), tile_width, bits, byte_order)
+                rows, columns = min(tile_length, height - top), min(tile_width, width - left)
+                image[top:top + rows, left:left + columns] = pixels[:rows, :columns]
+        else:
+            strips = [np.frombuffer(data, np.uint8, count, strip_offset)
+                      for strip_offset, count in zip(fields[_TAG_STRIP_OFFSETS], fields[_TAG_STRIP_COUNTS])]
+            buffer = strips[0] if len(strips) == 1 else np.concatenate(strips)
+            image = _unpack_rows(buffer[:row_bytes * height].reshape(height, row_bytes), width, bits, byte_order)
+    except (struct.error, IndexError, KeyError) as e:
+        raise ValueError(f"{path}: truncated or corrupt DNG ({type(e).__name__}: {e})") from e
+
+    pattern = "".join(_CFA_COLOURS.get(colour, '?') for colour in fields.get(_TAG_CFA_PATTERN, [0, 1, 1, 2])[:4])
+    white_level = int(fields.get(_TAG_WHITE_LEVEL, [(1 << bits) - 1])[0])
+    return {'image':       image,
+            'pattern':     pattern,
+            'bit_depth':   max(1, int(white_level).bit_length()),
+            'black_level': float(np.mean(fields.get(_TAG_BLACK_LEVEL, [0]))),
+            'white_level': white_level}
+
+
+def _read_dng_rawpy(path):
+    """Сжатый или нестандартный DNG - через rawpy (LibRaw)"""
+    try:
+        import rawpy
+    except ImportError as e:
+        raise RuntimeError(f"{path}: compressed DNG requires rawpy") from e
+
+    with rawpy.imread(path) as raw:
+        colours = raw.color_desc.decode()
+        pattern = "".join(colours[index] for index in raw.raw_pattern.flatten())
+        white_level = int(raw.white_level)
+        return {'image':       raw.raw_image_visible.astype(np.uint16),
+                'pattern':     pattern,
+                'bit_depth':   max(1, white_level.bit_length()),
+                'black_level': float(np.mean(raw.black_level_per_channel)),
+                'white_level': white_level}
@@ -0,0 +1,54 @@
+# spectrometer_app/core/frame_mailbox.py
+
+import threading
+
+
+class FrameMailbox:
+    """
+    Почтовый ящик на один кадр между потоком камеры и интерфейсом.
+    Поток камеры всегда кладет самый новый кадр; если интерфейс не успел
+    забрать предыдущий, тот отбрасывается и учитывается в счетчике dropped.
+    on_drop вызывается для отброшенного кадра (например, чтобы вернуть его в пул).
+    """
+
+    def __init__(self, on_drop=None):
+        self._lock      = threading.Lock()
+        self._frame     = None  # непрочитанный кадр
+        self.on_drop    = on_drop
+        self.delivered  = 0     # кадров, забранных интерфейсом
+        self.dropped    = 0     # кадров, замененных более новыми
+
+    def put(self, frame):
+        """
+        Кладет кадр в ящик (вызывается из потока камеры).
+        Возвращает True, если ящик был пуст, т.е. интерфейс нужно уведомить;
+        иначе уведомление уже отправлено и ещё не обработано.
+        """
+        with self._lock:
+            dropped_frame, self._frame = self._frame, frame
+            if dropped_frame is not None:
+                self.dropped += 1
+
+        if dropped_frame is not None and self.on_drop is not None:
+            self.on_drop(dropped_frame)
+        return dropped_frame is None
+
+    def take(self):
+        """Забирает самый новый кадр (вызывается из интерфейса), None если кадра нет"""
+        with self._lock:
+            frame, self._frame = self._frame, None
+            if frame is not None:
+                self.delivered += 1
+        return frame
+
+    def clear(self):
+        with self._lock:
+            frame, self._frame = self._frame, None
+
+        if frame is not None and self.on_drop is not None:
+            self.on_drop(frame)
+
+    def metrics(self):
+        """Счетчики доставленных и отброшенных кадров"""
+        with self._lock:
+            return {'delivered': self.delivered, 'dropped': self.dropped}
@@ -0,0 +1,75 @@
+# spectrometer_app/core/frame_pool.py
+
+import threading
+import numpy as np
+from PyQt5.QtGui import QImage
+
+
+class PooledFrame:
+    """
+    Кадр из пула: массив numpy и QImage, построенный на его памяти.
+    QImage не владеет буфером, поэтому кадр должен оставаться занятым,
+    пока изображение используется; release() возвращает его в пул.
+    """
+
+    def __init__(self, pool, array, image):
+        self.pool   = pool
+        self.array  = array
+        self.image  = image
+        self.in_use = False
+
+    def release(self):
+        self.pool._release(self)
+
+
+class FramePool:
+    """
+    Пул заранее выделенных кадров для превью. Кадры переиспользуются,
+    поэтому в потоке камеры нет выделения памяти и создания QImage на каждый кадр.
+    """
+
+    def __init__(self, width, height, count=4, image_format=QImage.Format_RGB888, channels=3):
+        self.width    = width
+        self.height   = height
+        self.channels = channels
+        self.exhausted = 0   # сколько раз свободного кадра не нашлось
+
+        self._lock   = threading.Lock()
+        self._frames = []
+        for _ in range(count):
+            array = np.zeros((height, width, channels), dtype=np.uint8)
+            image = QImage(array.data, width, height, width * channels, image_format)
+            self._frames.append(PooledFrame(self, array, image))
+
+    def matches(self, width, height):
+        return self.width == width and self.height == height
+
+    def acquire(self):
+        """Возвращает свободный кадр или None, если все кадры заняты"""
+        with self._lock:
+            for frame in self._frames:
+                if not frame.in_use:
+                    frame.in_use = True
+                    return frame
+            self.exhausted += 1
+        return None
+
+    def _release(self, frame):
+        with self._lock:
+            frame.in_use = False
+
+
+def stream_view(source, width, height, channels=3):
+    """
+    Представление буфера потока камеры как (h, w, ch) без копирования.
+    source может быть (h, stride) или (h, w, ch) - с учетом выравнивания строк.
+    """
+    if source.ndim == 2:
+        source = source[:height, :width * channels].reshape(height, width, channels)
+    return source[:height, :width, :channels]
+
+
+def copy_into_frame(source, frame):
+    """Копирует изображение потока камеры в кадр пула без промежуточных массивов"""
+    h, w, ch = frame.array.shape
+    np.copyto(frame.array, stream_view(source, w, h, ch))
@@ -0,0 +1,129 @@
+# spectrometer_app/core/hdr.py
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+HDR_SATURATION = 0.98   # доля полной шкалы, с которой пиксель считается насыщенным
+HDR_MAX_FRAMES = 255    # предел серии: число ненасыщенных кадров хранится в uint8
+
+
+def exposure_series(min_exposure, max_exposure, factor):
+    """
+    Серия выдержек (с) от min_exposure с шагом factor по возрастанию;
+    последняя - ровно max_exposure (например, 0.01..30 с с шагом 4:
+    0.01, 0.04, 0.16, 0.64, 2.56, 10.24, 30).
+    """
+    if min_exposure <= 0 or max_exposure < min_exposure:
+        raise ValueError(f"Invalid exposure range: {min_exposure}..{max_exposure} s")
+    if factor <= 1:
+        raise ValueError(f"Exposure factor must be greater than 1: {factor}")
+
+    series = []
+    exposure = float(min_exposure)
+    while exposure < max_exposure * (1 - 1e-6):
+        series.append(exposure)
+        exposure *= factor
+    series.append(float(max_exposure))
+    if len(series) > HDR_MAX_FRAMES:
+        raise ValueError(f"Exposure series is too long: {len(series)} frames")
+    return series
+
+
+class HdrMerger:
+    """
+    Объединение серии кадров с разной выдержкой в линейный кадр высокого
+    динамического диапазона (единицы полной шкалы в секунду при усилении 1).
+
+    Кадры подаются по возрастанию выдержки. Для каждого пикселя учитываются
+    ненасыщенные кадры с весом, равным выдержке (оценка максимального
+    правдоподобия для дробового шума): результат - сумма значений, деленная
+    на сумму выдержек. Насыщение монотонно по выдержке, поэтому ненасыщенные
+    кадры пикселя образуют начало серии, и вместо накопителя весов хранится
+    только их число (uint8): память - один накопитель float32 и счетчик.
+    Пиксель, насыщенный уже при первой выдержке, получает нижнюю оценку
+    по первому кадру.
+
+    Слияние кадра выполняется в фоновом потоке (NumPy отпускает GIL), пока
+    сенсор экспонирует следующий кадр серии; в обработке не больше одного кадра.
+    """
+
+    def __init__(self, exposures, full_scale=255.0, saturation=HDR_SATURATION):
+        self.exposures = [float(exposure) for exposure in exposures]
+        if not self.exposures or len(self.exposures) > HDR_MAX_FRAMES:
+            raise ValueError(f"Unsupported exposure series length: {len(self.exposures)}")
+        self.threshold = saturation * full_scale
+        self.added     = 0
+        self.actual    = []     # фактические выдержки кадров (из метаданных), с
+
+        self._sum   = None   # сумма ненасыщенных значений (в пересчете на усиление 1)
+        self._count = None   # число ненасыщенных кадров в начале серии
+        self._pending  = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hdr-merger")
+
+    @property
+    def count(self):
+        return len(self.exposures)
+
+    @property
+    def next_exposure(self):
+        """Выдержка следующего кадра серии или None, если серия снята"""
+        return self.exposures[self.added] if self.added < self.count else None
+
+    def add(self, frame, exposure, gain=1.0):
+        """
+        Кадр серии с фактической выдержкой exposure (с) и усилением gain.
+        Кадр должен оставаться неизменным до завершения слияния, поэтому
+        передается копия буфера камеры. Возвращает True, когда серия снята.
+        """
+        if self._sum is not None and self._sum.shape != frame.shape:
+            raise ValueError("Frame size changed during HDR capture")
+        if self.actual and exposure < self.actual[-1]:
+            raise ValueError(f"HDR frames must be added by increasing exposure: {exposure} s")
+
+        self._wait_pending()   # предыдущий кадр еще мог сливаться
+        self.actual.append(float(exposure))
+        self._pending = self._executor.submit(self._merge, frame, self.added, 1.0 / gain)
+        self.added += 1
+        return self.added >= self.count
+
+    def _wait_pending(self):
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def _merge(self, frame, index, inverse_gain):
+        """Слияние кадра с накопителем (в фоновом потоке)"""
+        unsaturated = frame < self.threshold
+        if index == 0:
+            # Первый кадр учитывается целиком - для пикселей, насыщенных
+            # на всей серии, остается нижняя оценка
+            self._sum = np.multiply(frame, inverse_gain, dtype=np.float32)
+            self._count = unsaturated.astype(np.uint8)
+            return
+
+        # Кадр учитывается, только если все более короткие кадры пикселя не насыщены
+        mask = self._count == index
+        mask &= unsaturated
+        np.add(self._sum, np.multiply(frame, inverse_gain, dtype=np.float32), out=self._sum, where=mask)
+        np.add(self._count, mask, out=self._count, casting='unsafe')
+
+    def result(self):
+        """
+        Объединенный кадр float32 (полная шкала в секунду) и доля пикселей,
+        насыщенных даже при самой короткой выдержке.
+        """
+        if not self.added:
+            raise ValueError("No frames merged")
+        self._wait_pending()
+        self._executor.shutdown(wait=False)
+
+        # Сумма выдержек ненасыщенных кадров по их числу: [t0, t0, t0+t1, ...]
+        exposure_sums = np.concatenate(([self.actual[0]], np.cumsum(self.actual))).astype(np.float32)
+        merged = np.divide(self._sum, exposure_sums[self._count], out=self._sum)
+        clipped = float(np.count_nonzero(self._count == 0)) / self._count.size
+        return merged, clipped
+
+    def cancel(self):
+        """Освобождает фоновый поток без вычисления результата"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,496 @@
+# spectrometer_app/core/headless.py
+#
+# Съемка без интерфейса (например, по SSH): серии снимков, накопление кадров
+# и сканирование по файлу задания. Используются только камера (picamera2),
+# логика core/ и utils/ - без PyQt5, окна и цикла событий Qt.
+#
+#     python headless.py run.json
+#
+# Файл задания (JSON):
+#     {
+#       "results_dir": "./results",
+#       "settings":  {"exposure_mode": "custom", "exposure": 0.5, "roi_center": 0.45},
+#       "positions": {"lens1": 0.0, "lens2": 0.0},
+#       "tasks": [
+#         {"type": "snapshot", "repeat": 10, "interval": 60},
+#         {"type": "stack", "count": 64, "mode": "median", "settings": {"exposure": 2.0}},
+#         {"type": "scan", "axes": {"lens1": {"start": 0, "stop": 20, "step": 2}},
+#          "settle": 0.2, "save_frames": false}
+#       ]
+#     }
+# settings - ключи DEFAULT_SETTINGS (у задачи - поверх общих); positions -
+# текущие положения осей, мм; repeat/interval - число повторов задачи и
+# период их запуска, с.
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from picamera2 import Picamera2
+
+try:
+    from utils.config import (DEFAULT_SETTINGS, MOTION_CONFIG, MAIN_STREAM_SIZE,
+                              CALIBRATION_FRAMES_DIR, SENSOR_MODES_CACHE, FRAME_MARGIN_US)
+    from utils.camera_settings_utils import apply_full_ui_settings_to_camera, save_camera_metadata
+    from core.snapshot_capture import select_still_resolution, capture_snapshot_in_place
+    from core.snapshot_io import write_snapshot_job, write_stack_job
+    from core.sensor_modes import SensorModeStore
+    from core.spectrum import SpectrumExtractor
+    from core.calibration import WavelengthCalibration
+    from core.calibration_frames import CalibrationFrameStore, calibration_frame_key, IMAGE_SETTINGS_KEYS
+    from core.stacking import FrameStacker, STACK_MODES
+    from core.scan_dataset import ScanDataset, scan_points, scan_axis_positions
+    from core.motion import MotionProfile, create_axis_driver
+    from core.catalog import ResultsCatalog
+except ImportError: # Fallback for running script directly
+    from spectrometer_app.utils.config import (DEFAULT_SETTINGS, MOTION_CONFIG, MAIN_STREAM_SIZE,
+                                               CALIBRATION_FRAMES_DIR, SENSOR_MODES_CACHE, FRAME_MARGIN_US)
+    from spectrometer_app.utils.camera_settings_utils import apply_full_ui_settings_to_camera, save_camera_metadata
+    from spectrometer_app.core.snapshot_capture import select_still_resolution, capture_snapshot_in_place
+    from spectrometer_app.core.snapshot_io import write_snapshot_job, write_stack_job
+    from spectrometer_app.core.sensor_modes import SensorModeStore
+    from spectrometer_app.core.spectrum import SpectrumExtractor
+    from spectrometer_app.core.calibration import WavelengthCalibration
+    from spectrometer_app.core.calibration_frames import (CalibrationFrameStore, calibration_frame_key,
+                                                          IMAGE_SETTINGS_KEYS)
+    from spectrometer_app.core.stacking import FrameStacker, STACK_MODES
+    from spectrometer_app.core.scan_dataset import ScanDataset, scan_points, scan_axis_positions
+    from spectrometer_app.core.motion import MotionProfile, create_axis_driver
+    from spectrometer_app.core.catalog import ResultsCatalog
+
+
+TASK_TYPES         = ('snapshot', 'stack', 'scan')
+VIDEO_BUFFER_COUNT = 3      # буферов видеопотока: кадры забираются по одному, очередь не нужна
+FRAME_TIMEOUT      = 5.0    # запас ожидания кадра сверх выдержки, с
+MOVE_TIMEOUT       = 10.0   # запас ожидания перемещения сверх времени по профилю, с
+
+
+def load_run_config(path):
+    """Файл задания: проверка задач и ключей настроек (ошибки - до открытия камеры)"""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    tasks = config.get('tasks')
+    if not isinstance(tasks, list) or not tasks:
+        raise ValueError("Run config has no tasks")
+    unknown = set(config.get('settings', {})) - set(DEFAULT_SETTINGS)
+    for index, task in enumerate(tasks):
+        if task.get('type') not in TASK_TYPES:
+            raise ValueError(f"Task {index}: unknown type {task.get('type')!r}, expected one of {TASK_TYPES}")
+        unknown |= set(task.get('settings', {})) - set(DEFAULT_SETTINGS)
+        if task['type'] == 'stack' and task.get('mode', DEFAULT_SETTINGS['stack_mode']) not in STACK_MODES:
+            raise ValueError(f"Task {index}: unknown stacking mode {task.get('mode')!r}")
+        if task['type'] == 'scan':
+            scan_task_points(task)   # ошибки описания осей
+    if unknown:
+        raise ValueError(f"Unknown settings in run config: {sorted(unknown)}")
+    return config
+
+
+def scan_task_points(task):
+    """
+    Точки сканирования задачи: оси {ось: {"start", "stop", "step"}} или
+    {ось: {"positions": [...]}}, режим "grid" / "paired" (см. scan_points)
+    """
+    axes = task.get('axes') or {}
+    unknown = set(axes) - set(MOTION_CONFIG)
+    if not axes or unknown:
+        raise ValueError(f"Scan axes must be some of {sorted(MOTION_CONFIG)}, got {sorted(axes)}")
+    positions = {}
+    for axis, spec in axes.items():
+        if 'positions' in spec:
+            positions[axis] = [float(value) for value in spec['positions']]
+        else:
+            positions[axis] = scan_axis_positions(spec['start'], spec['stop'], spec.get('step', 0))
+    return scan_points(positions, task.get('mode', 'grid'))
+
+
+class HeadlessRunner:
+    """
+    Выполнение задач файла задания на камере без интерфейса.
+
+    Камера работает в режиме видео (поток main 1280x720, как в приложении);
+    кадры забираются синхронно (capture_request), поэтому нет потока камеры,
+    очереди событий и превью. Снимки, накопления и сканирования пишутся
+    в тех же форматах и в той же папке результатов, что и из приложения;
+    запись идет в фоновом потоке параллельно со следующей съемкой.
+    Прерывание (Ctrl+C, SIGTERM) останавливает съемку после текущего кадра.
+    """
+
+    def __init__(self, config):
+        self.config      = config
+        self.results_dir = os.path.abspath(config.get('results_dir', "./results"))
+        self.settings    = dict(DEFAULT_SETTINGS)
+        self.settings.update(config.get('settings', {}))
+
+        self.camera           = None
+        self.video_config     = None
+        self.still_resolution = None
+        self.applied          = None   # настройки, примененные к камере
+        self.last_metadata    = {}
+
+        self.frame_store = CalibrationFrameStore(os.path.abspath(CALIBRATION_FRAMES_DIR))
+        self.catalog     = ResultsCatalog(self.results_dir)
+        self.drivers     = {}          # оси создаются только для сканирования
+        self.positions   = dict(config.get('positions', {}))
+
+        self._stop        = threading.Event()
+        self._motion_stop = threading.Event()   # прерывает текущие перемещения осей
+        self._writer      = ThreadPoolExecutor(max_workers=1, thread_name_prefix="headless-writer")
+        self._pending     = None   # запись предыдущего результата (не больше одной в очереди)
+        self._extractors   = {}
+        self._calibrations = {}
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def stop(self):
+        """Прерывание съемки и перемещений (из обработчика сигнала)"""
+        self._stop.set()
+        self._motion_stop.set()
+
+    # --- Камера ---
+    def _open_camera(self):
+        started = time.monotonic()
+        self.camera = Picamera2()
+        sensor_modes = SensorModeStore(os.path.abspath(SENSOR_MODES_CACHE)).modes(self.camera)
+        self.still_resolution = select_still_resolution(sensor_modes)
+        self.video_config = self.camera.create_video_configuration(
+            main         = {"size": MAIN_STREAM_SIZE, "format": "BGR888"},
+            buffer_count = VIDEO_BUFFER_COUNT,
+            queue        = False)
+        self.camera.configure(self.video_config)
+        self.camera.start()
+        print(f"Camera started in {time.monotonic() - started:.2f} s")
+
+    def _frame_duration_limits(self, settings):
+        """
+        FrameDurationLimits видеорежима; для ручной выдержки верхний предел
+        поднимается до выдержки с запасом (как для HDR-серии в приложении),
+        иначе сенсор ограничит ее длительностью кадра видео (~33 мс)
+        """
+        limits = self.video_config.get('controls', {}).get('FrameDurationLimits')
+        if limits is None:
+            limits = getattr(self.camera, 'camera_controls', {}).get('FrameDurationLimits', (None, None))[:2]
+        min_frame, max_frame = limits
+        if min_frame is None:
+            return None
+        if str(settings.get('exposure_mode')).strip().lower() == 'custom':
+            max_frame = max(int(max_frame), int(settings['exposure'] * 1000000) + FRAME_MARGIN_US)
+        return int(min_frame), int(max_frame)
+
+    def _apply_settings(self, settings):
+        """Настройки камеры, если они изменились (ожидание применения по метаданным)"""
+        if settings == self.applied:
+            return
+        # Длительность кадра задается до выдержки: иначе ожидание применения
+        # не дождется выдержки, а кадры будут сняты с ограниченной
+        limits = self._frame_duration_limits(settings)
+        if limits is not None:
+            self.camera.set_controls({'FrameDurationLimits': limits})
+        apply_full_ui_settings_to_camera(self.camera, settings)
+        self.applied = dict(settings)
+
+    def _capture(self, not_before_ns=0, timeout=None):
+        """
+        Копия кадра main и метаданные первого кадра, экспонирование которого
+        началось не раньше not_before_ns (time.monotonic_ns, как SensorTimestamp)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._stop.is_set():
+            request = self.camera.capture_request()
+            try:
+                metadata = request.get_metadata()
+                if metadata.get('SensorTimestamp', not_before_ns) >= not_before_ns:
+                    self.last_metadata = metadata
+                    return request.make_array("main"), metadata
+            finally:
+                request.release()
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("No frame after the requested time")
+        return None, None
+
+    def _frame_time(self, settings):
+        if 'FrameDuration' in self.last_metadata:
+            return self.last_metadata['FrameDuration'] / 1e6
+        return float(settings['exposure'])
+
+    # --- Спектр ---
+    def _extractor(self, settings):
+        key = tuple(settings[name] for name in ('roi_center', 'roi_height', 'spectrum_mode', 'spectrum_weighting'))
+        if key not in self._extractors:
+            self._extractors[key] = SpectrumExtractor.from_settings(settings)
+        return self._extractors[key]
+
+    def _calibration(self, settings):
+        text = settings['calibration']
+        if text not in self._calibrations:
+            calibration = WavelengthCalibration.from_json(text)
+            if calibration is not None:
+                try:
+                    calibration.prepare(MAIN_STREAM_SIZE[0])
+                except ValueError as e:
+                    print(f"Wavelength calibration not applied: {e}")
+                    calibration = None
+            self._calibrations[text] = calibration
+        return self._calibrations[text]
+
+    def _corrector(self, settings, metadata):
+        """Корректор темновым/плоским кадрами режима видео или None"""
+        if not settings['frame_correction']:
+            return None
+        image_settings = {key: settings[key] for key in IMAGE_SETTINGS_KEYS}
+        stream_config = self.video_config['main']
+        return self.frame_store.corrector(calibration_frame_key('dark', metadata, stream_config, image_settings),
+                                          calibration_frame_key('flat', metadata, stream_config, image_settings))
+
+    def _spectrum(self, settings, frame, corrector=None):
+        """Спектр полосы ROI (с коррекцией) и ось длин волн или None"""
+        extractor = self._extractor(settings)
+        start, stop = extractor.roi_rows(frame.shape[0])
+        band = frame[start:stop]
+        if corrector is not None:
+            band = corrector.correct(band, row_start=start)
+        spectrum = extractor.extract_band(band)
+
+        calibration = self._calibration(settings)
+        if calibration is None:
+            return spectrum, None
+        return calibration.resample(spectrum), calibration.wavelength_grid
+
+    # --- Запись ---
+    def _submit(self, function, *args):
+        """Фоновая запись; следующая ждет предыдущую - в памяти не больше двух результатов"""
+        self._wait_written()
+        self._pending = self._writer.submit(function, *args)
+
+    def _wait_written(self):
+        if self._pending is not None:
+            try:
+                self._pending.result()
+            except Exception:
+                print(f"Headless write error: {traceback.format_exc()}")
+            self._pending = None
+
+    def _write_job(self, write_function, job, helpers):
+        result = write_function(job, helpers, self.results_dir)
+        self.catalog.add_sidecar(result['metadata'])
+        print(f"Saved: {', '.join(os.path.basename(filename) for filename in result['files'])}")
+
+    # --- Задачи ---
+    def _snapshot(self, task, settings):
+        """Снимок в режиме фото: JPEG, DNG и JSON (как кнопка снимка приложения)"""
+        video_controls = save_camera_metadata(self.camera, settings)
+        job = capture_snapshot_in_place(self.camera, self.video_config, self.still_resolution,
+                                        settings, video_controls, self.last_metadata)
+        corrector = self._corrector(settings, job['metadata'])
+        if corrector is not None:
+            job['frame_corrector'] = corrector
+            job['frame_corrector_reverse'] = \
+                {job['main_config'].get('format'), self.video_config['main'].get('format')} == {'RGB888', 'BGR888'}
+        self.applied = None   # переключение режима сбрасывает настройки видео
+        self._apply_settings(settings)
+        self._submit(self._write_job, write_snapshot_job, job, self.camera.helpers)
+
+    def _stack(self, task, settings):
+        """Накопление count кадров видеопотока, спектр результата и запись"""
+        stacker = FrameStacker(task.get('count', settings['stack_count']),
+                               task.get('mode', settings['stack_mode']))
+        started = time.monotonic()
+        metadata = {}
+        try:
+            while not self._stop.is_set():
+                frame, metadata = self._capture()
+                if frame is None or stacker.add(frame):
+                    break
+        except BaseException:
+            stacker.cancel()
+            raise
+        if stacker.added == 0:
+            stacker.cancel()
+            return
+        elapsed = time.monotonic() - started
+        stack = stacker.result()
+
+        # Коррекция линейна - один раз к результату (сумма - через среднее)
+        corrector = self._corrector(settings, metadata)
+        if corrector is not None:
+            scale = stacker.added if stacker.mode == 'sum' else 1
+            stack *= 1.0 / scale
+            corrector.correct(stack, out=stack)
+            stack *= scale
+        spectrum, wavelengths = self._spectrum(settings, stack)
+
+        info = {'count': stacker.added, 'mode': stacker.mode, 'elapsed': elapsed,
+                'fps': stacker.added / elapsed if elapsed > 0 else 0.0}
+        print(f"Stacking finished: {info}")
+        job_settings = dict(settings, stack=info)
+        if corrector is not None:
+            job_settings['frame_correction_masters'] = corrector.describe()
+        job = {'timestamp':   time.strftime("%Y-%m-%d_%H-%M-%S"),
+               'kind':        'stack',
+               'settings':    job_settings,
+               'metadata':    dict(metadata),
+               'stack':       stack,
+               'spectrum':    spectrum,
+               'wavelengths': wavelengths}
+        self._submit(self._write_job, write_stack_job, job, None)
+
+    def _create_drivers(self, settings):
+        for axis in MOTION_CONFIG:
+            if axis not in self.drivers:
+                position = float(self.positions.get(axis, settings.get(f"{axis}_pos", 0.0)))
+                self.drivers[axis] = create_axis_driver(MOTION_CONFIG[axis], position)
+
+    def _move(self, executor, profile, point):
+        """Одновременное перемещение осей в точку: {ось: Future с достигнутым положением}"""
+        for axis, target in point.items():
+            limits = self.drivers[axis].limits
+            if limits is not None and not limits[0] <= target <= limits[1]:
+                raise ValueError(f"Position {target} mm is outside {axis} limits {limits}")
+        return {axis: executor.submit(self.drivers[axis].move, target, profile, self._motion_stop)
+                for axis, target in point.items()}
+
+    def _scan(self, task, settings):
+        """
+        Сканирование по точкам: как в приложении, оси уходят в следующую точку
+        сразу после кадра, спектр и запись точки - в фоне во время движения
+        """
+        points = scan_task_points(task)
+        settle_time = float(task.get('settle', settings['scan_settle']))
+        save_frames = bool(task.get('save_frames', settings['scan_save_frames']))
+        self._create_drivers(settings)
+        profile = MotionProfile(settings['motion_velocity'], settings['motion_acceleration'])
+
+        axes = sorted({axis for point in points for axis in point})
+        directory = os.path.join(self.results_dir, time.strftime("scan_%Y-%m-%d_%H-%M-%S"))
+        dataset = ScanDataset(directory, len(points), axes, save_frames)
+        mover = ThreadPoolExecutor(max_workers=len(axes), thread_name_prefix="headless-axis")
+
+        started  = time.monotonic()
+        captured = 0
+        minimum  = 0.0
+        previous = {axis: self.drivers[axis].position for axis in axes}
+        try:
+            moves = self._move(mover, profile, points[0])
+            for index, point in enumerate(points):
+                move_time = max(profile.duration(point[axis] - previous[axis]) for axis in point)
+                minimum += move_time + settle_time
+                previous.update(point)
+
+                _, waiting = wait_futures(moves.values(), timeout=2 * move_time + MOVE_TIMEOUT)
+                if waiting:
+                    raise TimeoutError("Scan move timed out")
+                positions = {axis: future.result() for axis, future in moves.items()}
+                if self._stop.is_set():
+                    break
+
+                not_before = time.monotonic_ns() + int(settle_time * 1e9)
+                frame, metadata = self._capture(not_before, settle_time + 3 * self._frame_time(settings)
+                                                + FRAME_TIMEOUT)
+                if frame is None:
+                    break
+                minimum += metadata.get('ExposureTime', 0) / 1e6
+
+                if index + 1 < len(points):
+                    moves = self._move(mover, profile, points[index + 1])
+                self._submit(self._write_point, dataset, settings, index, positions, frame, metadata)
+                captured += 1
+                print(f"Scan point {captured}/{len(points)}: {positions}")
+        finally:
+            mover.shutdown(wait=True)
+            self._wait_written()
+            self.positions.update({axis: float(driver.position) for axis, driver in self.drivers.items()})
+            elapsed = time.monotonic() - started
+            info = {'points': len(points), 'captured': captured, 'axes': axes,
+                    'settle_time': settle_time, 'elapsed': elapsed, 'minimum': minimum,
+                    'efficiency': minimum / elapsed if elapsed > 0 else 0.0,
+                    'cancelled': self._stop.is_set(), 'settings': settings}
+            dataset.close(info)
+            self.catalog.add_sidecar(os.path.join(directory, "scan.json"))
+            print(f"Scan finished: {captured}/{len(points)} points in {elapsed:.2f} s "
+                  f"(minimum {minimum:.2f} s)")
+
+    def _write_point(self, dataset, settings, index, positions, frame, metadata):
+        spectrum, wavelengths = self._spectrum(settings, frame, self._corrector(settings, metadata))
+        dataset.write(index, positions, spectrum, frame, metadata, wavelengths)
+
+    # --- Выполнение ---
+    def run(self):
+        """Выполняет все задачи по порядку; возвращает число выполненных запусков задач"""
+        completed = 0
+        try:
+            self._open_camera()
+            for number, task in enumerate(self.config['tasks'], start=1):
+                settings = dict(self.settings)
+                settings.update(task.get('settings', {}))
+                repeat   = int(task.get('repeat', 1))
+                interval = float(task.get('interval', 0.0))
+                handler  = getattr(self, f"_{task['type']}")
+
+                for iteration in range(repeat):
+                    if self._stop.is_set():
+                        break
+                    started = time.monotonic()
+                    print(f"Task {number} ({task['type']}), run {iteration + 1}/{repeat}")
+                    self._apply_settings(settings)
+                    handler(task, settings)
+                    completed += 1
+
+                    # Ожидание следующего запуска по периоду (прерываемое)
+                    if iteration + 1 < repeat:
+                        self._stop.wait(max(0.0, started + interval - time.monotonic()))
+        finally:
+            self.close()
+        return completed
+
+    def close(self):
+        self._wait_written()
+        self._writer.shutdown(wait=True)
+        if self.camera is not None:
+            try:
+                self.camera.stop()
+                self.camera.close()
+            except Exception as e:
+                print(f"Error closing camera: {e}")
+            self.camera = None
+        for driver in self.drivers.values():
+            driver.close()
+        if self.drivers:
+            print(f"Final axis positions: {self.positions}")
+        self.catalog.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run captures, stacking and scans without the GUI")
+    parser.add_argument('config', help="run config (JSON)")
+    args = parser.parse_args(argv)
+
+    try:
+        config = load_run_config(args.config)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Invalid run config {args.config}: {e}")
+        return 2
+
+    runner = HeadlessRunner(config)
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: (print("Stopping after the current frame..."), runner.stop()))
+
+    started = time.monotonic()
+    try:
+        completed = runner.run()
+    except Exception:
+        print(f"Headless run failed: {traceback.format_exc()}")
+        return 1
+    print(f"Headless run finished: {completed} task runs in {time.monotonic() - started:.1f} s")
+    return 130 if runner.stopped else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
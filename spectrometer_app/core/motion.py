@@ -0,0 +1,318 @@
+# spectrometer_app/core/motion.py
+
+import re
+import time
+import threading
+import numpy as np
+
+
+class MotionProfile:
+    """
+    Трапециевидный профиль скорости: разгон с ускорением acceleration (мм/с²)
+    до max_velocity (мм/с), движение с постоянной скоростью и торможение.
+    Для коротких перемещений профиль треугольный (скорость не достигается).
+    """
+
+    def __init__(self, max_velocity=5.0, acceleration=20.0):
+        if max_velocity <= 0 or acceleration <= 0:
+            raise ValueError("Velocity and acceleration must be positive")
+        self.max_velocity = float(max_velocity)
+        self.acceleration = float(acceleration)
+
+    def _phases(self, distance):
+        """Время разгона, пик скорости и длина участка разгона для перемещения distance"""
+        accel_distance = self.max_velocity ** 2 / (2 * self.acceleration)
+        if 2 * accel_distance > distance:
+            accel_distance = distance / 2
+        peak_velocity = np.sqrt(2 * self.acceleration * accel_distance)
+        return peak_velocity / self.acceleration, peak_velocity, accel_distance
+
+    def duration(self, distance):
+        """Время перемещения на distance мм, с"""
+        distance = abs(distance)
+        if distance == 0:
+            return 0.0
+        accel_time, peak_velocity, accel_distance = self._phases(distance)
+        return 2 * accel_time + (distance - 2 * accel_distance) / peak_velocity
+
+    def position_at(self, t, distance):
+        """Пройденный путь (мм) к моменту t от начала перемещения на distance мм"""
+        distance = abs(distance)
+        if distance == 0:
+            return 0.0
+        accel_time, peak_velocity, accel_distance = self._phases(distance)
+        total = self.duration(distance)
+        t = min(max(t, 0.0), total)
+        if t < accel_time:
+            return 0.5 * self.acceleration * t * t
+        if t > total - accel_time:
+            remaining = total - t
+            return distance - 0.5 * self.acceleration * remaining * remaining
+        return accel_distance + (t - accel_time) * peak_velocity
+
+    def times_at(self, positions, distance):
+        """
+        Моменты времени (с), в которые пройден путь positions (мм, массив) -
+        обратная функция position_at, для расписания шагов двигателя.
+        """
+        distance = abs(distance)
+        positions = np.asarray(positions, dtype=np.float64)
+        accel_time, peak_velocity, accel_distance = self._phases(distance)
+        total = self.duration(distance)
+
+        accel = np.sqrt(2 * positions / self.acceleration)
+        cruise = accel_time + (positions - accel_distance) / peak_velocity
+        decel = total - np.sqrt(2 * np.maximum(distance - positions, 0) / self.acceleration)
+        return np.where(positions < accel_distance, accel,
+                        np.where(positions > distance - accel_distance, decel, cruise))
+
+
+class AxisDriver:
+    """
+    Интерфейс драйвера одной оси перемещения (положение в мм).
+    move() блокирует вызывающий поток до окончания перемещения и вызывается
+    только из рабочего потока оси (MotionController); stop_event прерывает
+    движение, progress(position) сообщает промежуточное положение.
+    """
+
+    def __init__(self, position=0.0, limits=None):
+        self._position = float(position)
+        self.limits    = limits   # (мин, макс) мм или None
+
+    @property
+    def position(self):
+        return self._position
+
+    def move(self, target, profile, stop_event, progress=None):
+        """Перемещение в target (мм), возвращает достигнутое положение"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SimulatedAxisDriver(AxisDriver):
+    """
+    Симуляция оси: положение меняется по профилю в реальном времени
+    (time_scale < 1 ускоряет движение, например для отладки сканирования).
+    """
+
+    TICK = 0.02   # период обновления положения, с
+
+    def __init__(self, position=0.0, limits=None, time_scale=1.0):
+        super().__init__(position, limits)
+        self.time_scale = float(time_scale)
+
+    def move(self, target, profile, stop_event, progress=None):
+        start, distance = self._position, target - self._position
+        direction = 1.0 if distance >= 0 else -1.0
+        total = profile.duration(distance) * self.time_scale
+        started = time.monotonic()
+
+        while True:
+            elapsed = time.monotonic() - started
+            done = elapsed >= total
+            travelled = profile.position_at(elapsed / self.time_scale if self.time_scale else total, distance)
+            self._position = target if done else start + direction * travelled
+            if progress is not None:
+                progress(self._position)
+            if done or stop_event.wait(min(self.TICK, total - elapsed)):
+                break
+        return self._position
+
+
+class GpioStepperAxisDriver(AxisDriver):
+    """
+    Шаговый двигатель через драйвер STEP/DIR (A4988, DRV8825, TMC) на GPIO.
+    Расписание шагов строится по профилю заранее (векторно), в цикле
+    остается ожидание момента шага и импульс. Обратной связи нет: положение
+    считается по числу выданных шагов.
+    """
+
+    PULSE_WIDTH    = 5e-6   # длительность импульса STEP, с
+    PROGRESS_EVERY = 0.05   # период сообщений о положении, с
+
+    def __init__(self, step_pin, dir_pin, enable_pin=None, steps_per_mm=200,
+                 invert_direction=False, position=0.0, limits=None):
+        super().__init__(position, limits)
+        try:
+            from gpiozero import DigitalOutputDevice
+        except ImportError as e:
+            raise RuntimeError("gpiozero is required for the GPIO stepper driver") from e
+
+        self.steps_per_mm     = float(steps_per_mm)
+        self.invert_direction = bool(invert_direction)
+        self._step   = DigitalOutputDevice(step_pin)
+        self._dir    = DigitalOutputDevice(dir_pin)
+        # Вход ENABLE у драйверов инверсный: низкий уровень - обмотки под током
+        self._enable = DigitalOutputDevice(enable_pin, active_high=False) if enable_pin is not None else None
+
+    def move(self, target, profile, stop_event, progress=None):
+        start = self._position
+        steps = int(round((target - start) * self.steps_per_mm))
+        if steps == 0:
+            return self._position
+
+        direction = 1 if steps > 0 else -1
+        self._dir.value = (direction > 0) != self.invert_direction
+        if self._enable is not None:
+            self._enable.on()
+
+        count = abs(steps)
+        distance = count / self.steps_per_mm
+        schedule = profile.times_at(np.arange(1, count + 1) / self.steps_per_mm, distance)
+
+        started = time.perf_counter()
+        last_report = started
+        done = 0
+        try:
+            for done, moment in enumerate(schedule, start=1):
+                if stop_event.is_set():
+                    done -= 1
+                    break
+                delay = started + moment - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self._step.on()
+                time.sleep(self.PULSE_WIDTH)
+                self._step.off()
+
+                now = time.perf_counter()
+                if progress is not None and now - last_report >= self.PROGRESS_EVERY:
+                    last_report = now
+                    progress(start + direction * done / self.steps_per_mm)
+        finally:
+            self._position = start + direction * done / self.steps_per_mm
+
+        if progress is not None:
+            progress(self._position)
+        return self._position
+
+    def close(self):
+        if self._enable is not None:
+            self._enable.off()
+        for device in (self._step, self._dir, self._enable):
+            if device is not None:
+                device.close()
+
+
+class SerialStepperAxisDriver(AxisDriver):
+    """
+    Ось на контроллере с прошивкой GRBL через последовательный порт (по одному
+    контроллеру на ось, чтобы оси двигались независимо). Профиль разгона
+    выполняет прошивка: передается только скорость подачи. Положение
+    читается из отчета о состоянии ('?') в рабочих координатах (G92): WPos
+    или MPos за вычетом WCO - в зависимости от маски отчета ($10).
+    """
+
+    POLL_PERIOD  = 0.05   # период опроса состояния, с
+    MOVE_MARGIN  = 5.0    # запас ожидания окончания перемещения сверх расчетного времени, с
+    STATE_RE     = re.compile(r"<(\w+)")
+    POSITION_RE  = re.compile(r"(MPos|WPos|WCO):([-\d.]+),([-\d.]+),([-\d.]+)")
+
+    def __init__(self, port, baudrate=115200, axis='X', position=0.0, limits=None, timeout=1.0):
+        super().__init__(position, limits)
+        try:
+            import serial
+        except ImportError as e:
+            raise RuntimeError("pyserial is required for the serial stepper driver") from e
+
+        self.axis = axis.upper()
+        self._serial = serial.Serial(port, baudrate, timeout=timeout)
+        self._lock = threading.Lock()
+        self._wco  = None   # смещение рабочих координат (GRBL 1.1 сообщает его не в каждом отчете)
+
+        # Пробуждение GRBL и задание текущего положения (без датчиков нуля)
+        self._serial.write(b"\r\n\r\n")
+        time.sleep(2.0)
+        self._serial.reset_input_buffer()
+        self._command(f"G90 G92 {self.axis}{self._position:.3f}")
+
+    def _command(self, line):
+        """Отправка строки G-кода и ожидание 'ok'"""
+        with self._lock:
+            self._serial.write((line + "\n").encode('ascii'))
+            while True:
+                reply = self._serial.readline().decode('ascii', errors='replace').strip()
+                if reply == 'ok':
+                    return
+                if reply.startswith('error') or reply.startswith('ALARM'):
+                    raise RuntimeError(f"GRBL: {reply} ({line})")
+                if not reply:
+                    raise TimeoutError(f"GRBL did not answer: {line}")
+
+    def _status(self):
+        """Состояние контроллера (Idle/Run/...) и положение оси в рабочих координатах"""
+        with self._lock:
+            self._serial.write(b"?")
+            reply = self._serial.readline().decode('ascii', errors='replace')
+        state = self.STATE_RE.search(reply)
+        if state is None:
+            return None, self._position
+
+        index = 'XYZ'.index(self.axis)
+        coordinates = {match.group(1): float(match.group(2 + index))
+                       for match in self.POSITION_RE.finditer(reply)}
+        if 'WCO' in coordinates:
+            self._wco = coordinates['WCO']
+        if 'WPos' in coordinates:
+            position = coordinates['WPos']
+        elif 'MPos' in coordinates and self._wco is not None:
+            position = coordinates['MPos'] - self._wco
+        else:
+            position = self._position   # смещение еще не получено
+        return state.group(1), position
+
+    def _halt(self, profile):
+        """Остановка с торможением и сброс очереди команд"""
+        with self._lock:
+            self._serial.write(b"!")      # остановка с торможением
+        time.sleep(profile.max_velocity / profile.acceleration)
+        _, self._position = self._status()
+        with self._lock:
+            self._serial.write(b"\x18")   # сброс очереди команд
+
+    def move(self, target, profile, stop_event, progress=None):
+        deadline = time.monotonic() + profile.duration(target - self._position) + self.MOVE_MARGIN
+        self._command(f"G90 G1 {self.axis}{target:.3f} F{profile.max_velocity * 60:.1f}")
+        while True:
+            if stop_event.wait(self.POLL_PERIOD):
+                self._halt(profile)
+                break
+            if time.monotonic() > deadline:
+                self._halt(profile)
+                raise TimeoutError(f"GRBL: {self.axis} did not reach {target:.3f} mm "
+                                   f"(at {self._position:.3f} mm)")
+            state, self._position = self._status()
+            if progress is not None:
+                progress(self._position)
+            if state == 'Idle':
+                break
+        return self._position
+
+    def close(self):
+        self._serial.close()
+
+
+def create_axis_driver(axis_config, position=0.0):
+    """
+    Драйвер оси по описанию из MOTION_CONFIG. Если оборудование недоступно,
+    используется симуляция (с сообщением в консоль).
+    """
+    kind   = axis_config.get('driver', 'simulated')
+    limits = axis_config.get('limits')
+    try:
+        if kind == 'gpio':
+            return GpioStepperAxisDriver(axis_config['step_pin'], axis_config['dir_pin'],
+                                         axis_config.get('enable_pin'),
+                                         axis_config.get('steps_per_mm', 200),
+                                         axis_config.get('invert_direction', False),
+                                         position, limits)
+        if kind == 'serial':
+            return SerialStepperAxisDriver(axis_config['port'], axis_config.get('baudrate', 115200),
+                                           axis_config.get('axis', 'X'), position, limits)
+        if kind != 'simulated':
+            raise ValueError(f"Unknown motion driver: {kind}")
+    except Exception as e:
+        print(f"Motion driver '{kind}' unavailable, using simulation: {e}")
+    return SimulatedAxisDriver(position, limits, axis_config.get('time_scale', 1.0))
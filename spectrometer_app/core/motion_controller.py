@@ -0,0 +1,156 @@
+# spectrometer_app/core/motion_controller.py
+
+import queue
+import threading
+import traceback
+from concurrent.futures import Future
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class _AxisWorker:
+    """Очередь команд одной оси и рабочий поток, выполняющий их по порядку"""
+
+    def __init__(self, name, driver):
+        self.name   = name
+        self.driver = driver
+        self.target = driver.position   # положение после выполнения всех команд очереди
+        self.moving = False
+        self.commands   = queue.Queue()
+        self.stop_event = threading.Event()
+        self.generation = 0   # номер остановки: команды, поставленные до stop(), не выполняются
+        self.thread = None
+
+
+class MotionController(QObject):
+    """
+    Асинхронное управление осями перемещения (линза, камера).
+
+    У каждой оси своя очередь команд и рабочий поток, поэтому перемещения
+    не блокируют интерфейс, а разные оси движутся одновременно. Каждая
+    команда возвращает concurrent.futures.Future с достигнутым положением -
+    по нему ждут окончания движения фоновые задачи (сканирование);
+    интерфейс получает сигналы position_changed / position_reached.
+    """
+
+    # Сигналы (испускаются из рабочих потоков осей, доставляются в основной поток)
+    position_changed = pyqtSignal(str, float)   # ось, текущее положение при движении, мм
+    position_reached = pyqtSignal(str, float)   # ось, положение после окончания перемещения, мм
+    moving_changed   = pyqtSignal(str, bool)    # ось, движется ли
+    move_failed      = pyqtSignal(str, str)     # ось, текст ошибки
+
+    def __init__(self, drivers, profile):
+        super().__init__()
+        self.profile = profile
+        self._lock   = threading.Lock()
+        self._axes   = {}
+        for name, driver in drivers.items():
+            worker = _AxisWorker(name, driver)
+            worker.thread = threading.Thread(target=self._run_axis, args=(worker,),
+                                             name=f"motion-{name}", daemon=True)
+            worker.thread.start()
+            self._axes[name] = worker
+
+    @property
+    def axes(self):
+        return tuple(self._axes)
+
+    def position(self, axis):
+        return self._axes[axis].driver.position
+
+    def limits(self, axis):
+        """Допустимый диапазон оси (мин, макс) мм или None"""
+        return self._axes[axis].driver.limits
+
+    def is_moving(self, axis=None):
+        workers = self._axes.values() if axis is None else [self._axes[axis]]
+        return any(worker.moving or not worker.commands.empty() for worker in workers)
+
+    def set_profile(self, profile):
+        """Профиль скорости для следующих команд"""
+        self.profile = profile
+
+    def move_to(self, axis, position):
+        """Ставит в очередь перемещение оси в position (мм), возвращает Future"""
+        worker = self._axes[axis]
+        limits = worker.driver.limits
+        if limits is not None and not limits[0] <= position <= limits[1]:
+            raise ValueError(f"Position {position} mm is outside {axis} limits {limits}")
+
+        future = Future()
+        with self._lock:
+            worker.target = float(position)
+            worker.commands.put((float(position), self.profile, future, worker.generation))
+        return future
+
+    def move_by(self, axis, delta):
+        """Относительное перемещение от положения после уже поставленных команд"""
+        return self.move_to(axis, self._axes[axis].target + delta)
+
+    def move_axes(self, targets):
+        """
+        Одновременное перемещение нескольких осей: {ось: положение}.
+        Возвращает {ось: Future}; ждать все - concurrent.futures.wait(result.values()).
+        """
+        return {axis: self.move_to(axis, position) for axis, position in targets.items()}
+
+    def stop(self, axis=None):
+        """Останавливает текущее перемещение и отменяет команды в очереди"""
+        for worker in (self._axes.values() if axis is None else [self._axes[axis]]):
+            with self._lock:
+                while True:
+                    try:
+                        command = worker.commands.get_nowait()
+                    except queue.Empty:
+                        break
+                    if command is not None:
+                        command[2].cancel()
+                worker.target = worker.driver.position
+                worker.generation += 1
+                worker.stop_event.set()
+
+    def _run_axis(self, worker):
+        """Рабочий поток оси: команды выполняются по одной"""
+        while True:
+            command = worker.commands.get()
+            if command is None:
+                break
+            target, profile, future, generation = command
+
+            # Команда, извлеченная из очереди до stop(), отменяется; флаг
+            # остановки сбрасывается под той же блокировкой, что и в stop()
+            with self._lock:
+                if generation != worker.generation:
+                    future.cancel()
+                else:
+                    worker.stop_event.clear()
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            worker.moving = True
+            self.moving_changed.emit(worker.name, True)
+            try:
+                position = worker.driver.move(
+                    target, profile, worker.stop_event,
+                    progress=lambda value: self.position_changed.emit(worker.name, value))
+                future.set_result(position)
+                self.position_reached.emit(worker.name, position)
+            except Exception as e:
+                print(f"Motion error on {worker.name}: {e}")
+                traceback.print_exc()
+                future.set_exception(e)
+                with self._lock:
+                    worker.target = worker.driver.position
+                self.move_failed.emit(worker.name, str(e))
+            finally:
+                worker.moving = False
+                self.moving_changed.emit(worker.name, False)
+
+    def shutdown(self, wait=True):
+        """Останавливает оси, завершает рабочие потоки и освобождает драйверы"""
+        self.stop()
+        for worker in self._axes.values():
+            worker.commands.put(None)
+        for worker in self._axes.values():
+            if wait:
+                worker.thread.join()
+            worker.driver.close()
@@ -0,0 +1,192 @@
+# spectrometer_app/core/raw_bayer.py
+
+import re
+import numpy as np
+
+
+RAW_OUTPUTS = ('rgb', 'mono')
+
+# Положение канала в ячейке Байера 2x2: (строка, столбец)
+_BAYER_OFFSETS = {
+    'RGGB': {'R': (0, 0), 'G1': (0, 1), 'G2': (1, 0), 'B': (1, 1)},
+    'GRBG': {'G1': (0, 0), 'R': (0, 1), 'B': (1, 0), 'G2': (1, 1)},
+    'GBRG': {'G1': (0, 0), 'B': (0, 1), 'R': (1, 0), 'G2': (1, 1)},
+    'BGGR': {'B': (0, 0), 'G1': (0, 1), 'G2': (1, 0), 'R': (1, 1)},
+}
+
+# Младшие 2 бита четырех пикселей по пятому байту группы CSI2P 10 бит (таблица 256 x 4)
+_LOW_BITS_10 = ((np.arange(256)[:, None] >> (2 * np.arange(4))) & 0x3).astype(np.uint16)
+
+_FORMAT_RE = re.compile(r"^S?(RGGB|GRBG|GBRG|BGGR|R)(\d+)(_CSI2P)?$")
+
+
+def parse_raw_format(raw_format):
+    """
+    Разбор формата сырого потока libcamera ('SRGGB10_CSI2P', 'SBGGR12', 'R10_CSI2P'...).
+    Возвращает (порядок Байера или None для монохромного сенсора, разрядность, упакован ли).
+    Сжатые форматы (PISP_COMP) не поддерживаются.
+    """
+    match = _FORMAT_RE.match(str(raw_format))
+    if match is None:
+        raise ValueError(f"Unsupported raw format: {raw_format}")
+    order, bits, packed = match.group(1), int(match.group(2)), match.group(3) is not None
+    if packed and bits not in (10, 12):
+        raise ValueError(f"Unsupported packed raw depth: {raw_format}")
+    return (None if order == 'R' else order), bits, packed
+
+
+def unpack_raw(raw, width, bit_depth, packed, out=None):
+    """
+    Распаковка сырых строк в uint16 (значения в младших bit_depth битах).
+    raw - строки буфера (h, stride) uint8 или (h, w) uint16; все операции
+    векторные над целыми строками:
+        CSI2P 10 бит - 5 байт на 4 пикселя (старшие 8 бит + байт с младшими 2 битами);
+        CSI2P 12 бит - 3 байта на 2 пикселя (старшие 8 бит + байт с младшими 4 битами).
+    """
+    height = raw.shape[0]
+    if out is None:
+        out = np.empty((height, width), dtype=np.uint16)
+
+    if not packed:
+        if raw.dtype != np.uint16:
+            raw = raw[:, :width * 2].view('<u2') if bit_depth > 8 else raw
+        out[...] = raw[:, :width]
+        return out
+
+    if bit_depth == 10:
+        groups = raw[:, :width * 5 // 4].reshape(height, width // 4, 5)
+        pixels = out.reshape(height, width // 4, 4)
+        np.left_shift(groups[..., :4], 2, out=pixels, dtype=np.uint16)
+        np.bitwise_or(pixels, np.take(_LOW_BITS_10, groups[..., 4], axis=0), out=pixels)
+    else:
+        groups = raw[:, :width * 3 // 2].reshape(height, width // 2, 3)
+        pixels = out.reshape(height, width // 2, 2)
+        np.left_shift(groups[..., :2], 4, out=pixels, dtype=np.uint16)
+        low = groups[..., 2]
+        pixels[..., 0] |= low & 0xF
+        pixels[..., 1] |= low >> 4
+    return out
+
+
+def _resample_positions(length, width):
+    return (np.arange(width) + 0.5) * length / width - 0.5
+
+
+def resample_spectrum(spectrum, width, positions=None):
+    """
+    Спектр на другую ширину (линейная интерполяция по центрам пикселей -
+    поле зрения то же): например, спектр полного кадра снимка или сетки
+    ячеек Байера на ширину потока main, для которой строится калибровка.
+    """
+    if len(spectrum) == width:
+        return spectrum
+    if positions is None:
+        positions = _resample_positions(len(spectrum), width)
+    return np.interp(positions, np.arange(len(spectrum)), spectrum).astype(np.float32)
+
+
+class RawBayerConverter:
+    """
+    Линейное изображение из сырого потока сенсора (без ISP: без гаммы,
+    контраста, насыщенности и резкости).
+
+    output='rgb'  - каналы R, G (среднее двух зеленых), B на сетке ячеек Байера
+                    (половина разрешения по каждой оси);
+    output='mono' - среднее ячейки 2x2 (бинированный монохромный кадр),
+                    для монохромного сенсора - бинирование 2x2.
+    Результат float32 за вычетом уровня черного, в шкале 0..full_scale
+    (по умолчанию 255, как у 8-битного потока ISP), линейный по свету.
+
+    Преобразуются только запрошенные строки (например, полоса ROI), буферы
+    распаковки и результата переиспользуются между кадрами.
+    """
+
+    def __init__(self, raw_format, size, output='rgb', full_scale=255.0):
+        if output not in RAW_OUTPUTS:
+            raise ValueError(f"Unknown raw output: {output}")
+        self.order, self.bit_depth, self.packed = parse_raw_format(raw_format)
+        self.width, self.height = size
+        if self.width % 4 or self.height % 2:
+            raise ValueError(f"Unsupported raw size: {size}")
+        self.output     = output
+        self.full_scale = float(full_scale)
+        self.max_value  = (1 << self.bit_depth) - 1
+
+        self._unpacked  = None   # буфер распаковки (строки x ширина) uint16
+        self._result    = None
+        self._positions = {}     # ширина -> координаты для пересчета спектра
+
+    @property
+    def output_height(self):
+        return self.height // 2
+
+    @property
+    def output_width(self):
+        return self.width // 2
+
+    def _black_level(self, black_levels):
+        """Уровень черного в единицах сырых данных (SensorBlackLevels даны в 16-битной шкале)"""
+        if not black_levels:
+            return 0.0
+        return float(np.mean(black_levels)) / (1 << (16 - self.bit_depth))
+
+    def convert_rows(self, raw, start=0, stop=None, black_levels=None):
+        """
+        Линейное изображение для строк результата [start, stop) - это строки
+        сырого кадра [2*start, 2*stop). raw - весь буфер потока (h, stride).
+        """
+        stop = self.output_height if stop is None else stop
+        rows = stop - start
+        raw_rows = raw[2 * start:2 * stop]
+
+        if self._unpacked is None or self._unpacked.shape[0] != 2 * rows:
+            self._unpacked = np.empty((2 * rows, self.width), dtype=np.uint16)
+            shape = (rows, self.output_width, 3) if self.output == 'rgb' else (rows, self.output_width)
+            self._result = np.empty(shape, dtype=np.float32)
+        image = unpack_raw(raw_rows, self.width, self.bit_depth, self.packed, out=self._unpacked)
+
+        black = self._black_level(black_levels)
+        scale = self.full_scale / max(1.0, self.max_value - black)
+        result = self._result
+
+        if self.output == 'mono' or self.order is None:
+            cells = (image[0::2, 0::2], image[0::2, 1::2], image[1::2, 0::2], image[1::2, 1::2])
+            mono = result if result.ndim == 2 else result[..., 0]
+            np.add(cells[0], cells[1], out=mono, dtype=np.float32)
+            mono += cells[2]
+            mono += cells[3]
+            mono -= 4 * black
+            mono *= 0.25 * scale
+            if result.ndim == 3:
+                result[..., 1] = mono
+                result[..., 2] = mono
+        else:
+            offsets = _BAYER_OFFSETS[self.order]
+
+            def plane(name):
+                row, col = offsets[name]
+                return image[row::2, col::2]
+
+            np.subtract(plane('R'), black, out=result[..., 0], dtype=np.float32)
+            np.add(plane('G1'), plane('G2'), out=result[..., 1], dtype=np.float32)
+            result[..., 1] *= 0.5
+            result[..., 1] -= black
+            np.subtract(plane('B'), black, out=result[..., 2], dtype=np.float32)
+            result *= scale
+
+        np.maximum(result, 0, out=result)
+        return result
+
+    def resample_to_width(self, spectrum, width):
+        """
+        Спектр с сетки ячеек Байера на ширину потока main (линейная интерполяция
+        по центрам пикселей - поле зрения то же), чтобы калибровка длин волн
+        и график работали без изменений.
+        """
+        if len(spectrum) == width:
+            return spectrum
+        positions = self._positions.get(width)
+        if positions is None:
+            positions = _resample_positions(len(spectrum), width)
+            self._positions[width] = positions
+        return resample_spectrum(spectrum, width, positions)
@@ -0,0 +1,330 @@
+# spectrometer_app/core/reprocess.py
+#
+# Пакетная повторная обработка сохраненных снимков (DNG/JPEG) без интерфейса
+# и камеры: спектры заново извлекаются с новыми ROI/калибровкой.
+#
+#     python -m spectrometer_app.core.reprocess ./results --roi-center 0.42 --calibration cal.json
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from core.dng import read_dng
+    from core.raw_bayer import RawBayerConverter, resample_spectrum
+    from core.spectrum import SpectrumExtractor, CHANNEL_WEIGHTS, SPECTRUM_MODES
+    from core.calibration import WavelengthCalibration
+    from core.snapshot_io import save_spectrum_csv
+    from utils.config import DEFAULT_SETTINGS, MAIN_STREAM_SIZE, ANALYSIS_SOURCES
+except ImportError: # Fallback for running script directly
+    from spectrometer_app.core.dng import read_dng
+    from spectrometer_app.core.raw_bayer import RawBayerConverter, resample_spectrum
+    from spectrometer_app.core.spectrum import SpectrumExtractor, CHANNEL_WEIGHTS, SPECTRUM_MODES
+    from spectrometer_app.core.calibration import WavelengthCalibration
+    from spectrometer_app.core.snapshot_io import save_spectrum_csv
+    from spectrometer_app.utils.config import DEFAULT_SETTINGS, MAIN_STREAM_SIZE, ANALYSIS_SOURCES
+
+
+REPROCESS_DIRNAME = "reprocessed"     # папка результатов внутри папки снимков
+MANIFEST_FILENAME = "reprocess.json"  # параметры обработки (для продолжения)
+
+# Настройки приложения, влияющие на извлечение спектра
+SPECTRUM_KEYS = ('roi_center', 'roi_height', 'spectrum_mode', 'spectrum_weighting',
+                 'analysis_source', 'calibration')
+
+# Состояние процесса-обработчика: параметры запуска и кэши по настройкам
+_worker = {}
+
+
+def find_sources(results_dir):
+    """
+    Снимки в папке результатов: список (имя, {'dng': путь, 'jpg': путь, 'json': путь}),
+    отсортированный по имени. Учитываются только имена с DNG или JPEG.
+    """
+    groups = {}
+    for entry in os.scandir(results_dir):
+        base, extension = os.path.splitext(entry.name)
+        extension = extension.lower().lstrip('.')
+        if entry.is_file() and extension in ('dng', 'jpg', 'json'):
+            groups.setdefault(base, {})[extension] = entry.path
+    return sorted((name, files) for name, files in groups.items() if 'dng' in files or 'jpg' in files)
+
+
+def _read_sidecar(files):
+    """Настройки и метаданные снимка из JSON рядом с изображениями"""
+    if 'json' not in files:
+        return {}, {}
+    with open(files['json'], encoding='utf-8') as f:
+        data = json.load(f)
+    return data.get('settings') or {}, data.get('metadata') or {}
+
+
+def _choose_source(files, analysis_source):
+    """Файл для анализа: DNG для сырых источников, JPEG для ISP, иначе тот, что есть"""
+    preferred = 'jpg' if analysis_source == 'isp' else 'dng'
+    if preferred in files:
+        return preferred
+    return 'dng' if 'dng' in files else 'jpg'
+
+
+def _cached(cache, key, factory):
+    value = cache.get(key)
+    if value is None:
+        value = cache[key] = factory()
+    return value
+
+
+def _extractor(settings):
+    key = tuple(str(settings[name]) for name in SPECTRUM_KEYS[:4])
+    return _cached(_worker['extractors'], key, lambda: SpectrumExtractor.from_settings(settings))
+
+
+def _calibration(text):
+    """Калибровка из строки JSON с таблицей под ширину потока main (кэш по строке)"""
+    if not text:
+        return None
+    calibration = _worker['calibrations'].get(text, False)
+    if calibration is False:
+        calibration = WavelengthCalibration.from_json(text)
+        if calibration is not None:
+            try:
+                calibration.prepare(MAIN_STREAM_SIZE[0])
+            except ValueError as e:
+                print(f"Wavelength calibration not applied: {e}")
+                calibration = None
+        _worker['calibrations'][text] = calibration
+    return calibration
+
+
+def _raw_spectrum(path, settings, metadata):
+    """
+    Спектр по DNG тем же путем, что и живой анализ сырого потока: полоса ROI
+    на сетке ячеек Байера, вычитание уровня черного, пересчет на ширину main.
+    """
+    dng = read_dng(path)
+    image = dng['image']
+    height, width = image.shape
+    output = 'mono' if settings['analysis_source'] == 'raw_mono' else 'rgb'
+    raw_format = f"S{dng['pattern']}{dng['bit_depth']}"
+    converter = _cached(_worker['converters'], (raw_format, width, height, output),
+                        lambda: RawBayerConverter(raw_format, (width - width % 4, height - height % 2), output))
+
+    # SensorBlackLevels даны в 16-битной шкале, уровень черного DNG - в единицах данных
+    black_levels = metadata.get('SensorBlackLevels') or \
+        [dng['black_level'] * (1 << (16 - converter.bit_depth))]
+    start, stop = _extractor(settings).roi_rows(converter.output_height)
+    band = converter.convert_rows(image, start, stop, black_levels)
+    spectrum = _extractor(settings).extract_band(band)
+    return converter.resample_to_width(spectrum, MAIN_STREAM_SIZE[0])
+
+
+def _jpeg_spectrum(path, settings):
+    """Спектр по JPEG (кадр после ISP) - как у снимка, на ширине потока main"""
+    try:
+        from PIL import Image
+    except ImportError as e:
+        raise RuntimeError("Pillow is required to decode JPEG files") from e
+
+    with Image.open(path) as image:
+        frame = np.asarray(image.convert('RGB'))
+    spectrum = _extractor(settings).extract(frame)
+    return resample_spectrum(spectrum, MAIN_STREAM_SIZE[0])
+
+
+def _output_path(out_dir, name):
+    return os.path.join(out_dir, f"{name}.csv")
+
+
+def _process_source(name, files):
+    """Обработка одного снимка; спектр записывается атомарно (tmp + rename)"""
+    sidecar_settings, metadata = _read_sidecar(files)
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update({key: value for key, value in sidecar_settings.items() if key in SPECTRUM_KEYS})
+    settings.update(_worker['overrides'])
+
+    source = _choose_source(files, settings['analysis_source'])
+    if source == 'dng':
+        spectrum = _raw_spectrum(files['dng'], settings, metadata)
+    else:
+        spectrum = _jpeg_spectrum(files['jpg'], settings)
+
+    wavelengths = None
+    calibration = _calibration(settings['calibration'])
+    if calibration is not None:
+        spectrum = calibration.resample(spectrum)
+        wavelengths = calibration.wavelength_grid
+
+    filename = _output_path(_worker['out_dir'], name)
+    save_spectrum_csv(spectrum, wavelengths, f"{filename}.tmp")
+    os.replace(f"{filename}.tmp", filename)
+    return source
+
+
+def _init_worker(out_dir, overrides):
+    # Прерывание обрабатывает основной процесс: он отменяет оставшиеся пакеты
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker.update(out_dir=out_dir, overrides=overrides,
+                   extractors={}, converters={}, calibrations={})
+
+
+def _process_chunk(chunk):
+    """Пакет снимков в процессе-обработчике: список (имя, источник или None, ошибка)"""
+    results = []
+    for name, files in chunk:
+        try:
+            results.append((name, _process_source(name, files), None))
+        except Exception as e:   # поврежденный файл не должен прерывать весь пакет
+            results.append((name, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _check_manifest(out_dir, parameters, force):
+    """
+    Параметры предыдущего запуска в той же папке: продолжение возможно только
+    с теми же параметрами, иначе готовые спектры не соответствуют новым.
+    """
+    filename = os.path.join(out_dir, MANIFEST_FILENAME)
+    if os.path.exists(filename) and not force:
+        with open(filename, encoding='utf-8') as f:
+            previous = json.load(f).get('parameters')
+        if previous != parameters:
+            raise ValueError(f"{out_dir} was processed with other parameters {previous}; "
+                             f"use another output directory or --force to reprocess all files")
+    with open(f"{filename}.tmp", 'w', encoding='utf-8') as f:
+        json.dump({'parameters': parameters, 'started': time.strftime("%Y-%m-%d_%H-%M-%S")},
+                  f, ensure_ascii=False, indent=2)
+    os.replace(f"{filename}.tmp", filename)
+
+
+def reprocess_results(results_dir, out_dir=None, overrides=None, force=False,
+                      max_workers=None, chunksize=None):
+    """
+    Повторное извлечение спектров всех снимков папки results_dir в out_dir
+    (по умолчанию results_dir/reprocessed), по CSV на снимок.
+
+    overrides - настройки вместо сохраненных в JSON снимка (SPECTRUM_KEYS;
+    'calibration' - строка JSON калибровки, '' - без калибровки).
+    Снимки обрабатываются пакетами в пуле процессов (все ядра); уже
+    обработанные пропускаются, поэтому прерванный запуск продолжается
+    повторным вызовом. force - обработать заново все снимки.
+    Возвращает сводку: число снимков, обработанных, пропущенных, ошибок,
+    время и скорость (файлов/с).
+    """
+    overrides = dict(overrides or {})
+    out_dir = out_dir or os.path.join(results_dir, REPROCESS_DIRNAME)
+    os.makedirs(out_dir, exist_ok=True)
+    _check_manifest(out_dir, overrides, force)
+
+    sources = find_sources(results_dir)
+    pending = [source for source in sources
+               if force or not os.path.exists(_output_path(out_dir, source[0]))]
+    summary = {'files': len(sources), 'done': 0, 'skipped': len(sources) - len(pending),
+               'failed': 0, 'elapsed': 0.0, 'rate': 0.0, 'interrupted': False}
+    print(f"Reprocessing {len(pending)} of {len(sources)} files from {results_dir} to {out_dir}")
+    if not pending:
+        return summary
+
+    # Пакеты по несколько файлов: меньше обменов с процессами, но хватает
+    # пакетов для выравнивания нагрузки (размер файлов и источник различаются)
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(pending)))
+    chunksize = chunksize or max(1, min(32, len(pending) // (4 * workers)))
+    chunks = [pending[index:index + chunksize] for index in range(0, len(pending), chunksize)]
+
+    started = time.monotonic()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(out_dir, overrides))
+    futures = [executor.submit(_process_chunk, chunk) for chunk in chunks]
+    try:
+        for future in as_completed(futures):
+            for name, source, error in future.result():
+                if error is None:
+                    summary['done'] += 1
+                else:
+                    summary['failed'] += 1
+                    print(f"Reprocessing failed for {name}: {error}")
+            processed = summary['done'] + summary['failed']
+            elapsed = time.monotonic() - started
+            print(f"Reprocessed {processed}/{len(pending)} files, "
+                  f"{processed / elapsed if elapsed > 0 else 0.0:.1f} files/s")
+    except KeyboardInterrupt:
+        summary['interrupted'] = True
+        for future in futures:
+            future.cancel()
+        print(f"Reprocessing interrupted, run again to resume ({len(pending) - summary['done']} files left)")
+    finally:
+        executor.shutdown(wait=True)
+
+    summary['elapsed'] = time.monotonic() - started
+    summary['rate'] = summary['done'] / summary['elapsed'] if summary['elapsed'] > 0 else 0.0
+    print(f"Reprocessing finished: {summary['done']} done, {summary['skipped']} skipped, "
+          f"{summary['failed']} failed in {summary['elapsed']:.2f} s ({summary['rate']:.1f} files/s)")
+    return summary
+
+
+def _app_settings():
+    """Настройки спектра из настроек приложения (QSettings; только QtCore, без окон)"""
+    from PyQt5.QtCore import QSettings
+
+    settings = QSettings("MyCompany", "SpectrometerApp")
+    values = {}
+    for key in SPECTRUM_KEYS:
+        default = DEFAULT_SETTINGS[key]
+        values[key] = settings.value(key, default, type=type(default))
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Re-extract spectra from saved snapshots (DNG/JPEG) without the GUI and camera")
+    parser.add_argument('results_dir', nargs='?', default="./results",
+                        help="folder with snapshots (default ./results)")
+    parser.add_argument('-o', '--output', help=f"output folder (default RESULTS_DIR/{REPROCESS_DIRNAME})")
+    parser.add_argument('--app-settings', action='store_true',
+                        help="use the spectrum settings and calibration of the application")
+    parser.add_argument('--roi-center', type=float, help="ROI center, fraction of frame height")
+    parser.add_argument('--roi-height', type=float, help="ROI height, fraction of frame height")
+    parser.add_argument('--spectrum-mode', choices=SPECTRUM_MODES)
+    parser.add_argument('--weighting', choices=sorted(CHANNEL_WEIGHTS))
+    parser.add_argument('--analysis-source', choices=ANALYSIS_SOURCES,
+                        help="isp - JPEG, raw_rgb / raw_mono - DNG (default: as recorded)")
+    calibration = parser.add_mutually_exclusive_group()
+    calibration.add_argument('--calibration', metavar='FILE', help="wavelength calibration (JSON)")
+    calibration.add_argument('--pixels', action='store_true', help="no wavelength calibration")
+    parser.add_argument('-j', '--workers', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--chunksize', type=int, help="files per task (default: automatic)")
+    parser.add_argument('--force', action='store_true', help="reprocess files that are already done")
+    args = parser.parse_args(argv)
+
+    overrides = _app_settings() if args.app_settings else {}
+    for key, value in (('roi_center', args.roi_center), ('roi_height', args.roi_height),
+                       ('spectrum_mode', args.spectrum_mode), ('spectrum_weighting', args.weighting),
+                       ('analysis_source', args.analysis_source)):
+        if value is not None:
+            overrides[key] = value
+    if args.calibration:
+        with open(args.calibration, encoding='utf-8') as f:
+            text = f.read()
+        if WavelengthCalibration.from_json(text) is None:
+            parser.error(f"invalid calibration file: {args.calibration}")
+        overrides['calibration'] = json.dumps(json.loads(text))
+    elif args.pixels:
+        overrides['calibration'] = ''
+
+    try:
+        summary = reprocess_results(args.results_dir, args.output, overrides, force=args.force,
+                                    max_workers=args.workers, chunksize=args.chunksize)
+    except (OSError, ValueError) as e:
+        print(f"Reprocessing failed: {e}")
+        return 1
+    if summary['interrupted']:
+        return 130
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+# spectrometer_app/core/scan.py
+
+import os
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, CancelledError, TimeoutError as FutureTimeoutError
+from PyQt5.QtCore import QObject, pyqtSignal
+
+try:
+    from core.scan_dataset import ScanDataset
+except ImportError: # Fallback for running script directly
+    from spectrometer_app.core.scan_dataset import ScanDataset
+
+
+class ScanEngine(QObject):
+    """
+    Сканирование по точкам: перемещение осей, ожидание успокоения, кадр,
+    следующее перемещение.
+
+    Конвейер: как только кадр точки получен (экспозиция закончилась), оси
+    сразу уходят в следующую точку, а коррекция кадра, извлечение спектра и
+    запись в набор данных идут в фоновом потоке параллельно с движением.
+    Кадр берется из видеопотока камеры - первый, экспонирование которого
+    началось не раньше, чем через settle_time после остановки осей.
+
+    Итог сравнивает полное время с теоретическим минимумом: сумма времени
+    перемещений по профилю (оси движутся одновременно - берется наибольшее),
+    времени успокоения и выдержки кадров.
+    """
+
+    progress = pyqtSignal(int, int)   # точек снято, всего
+    finished = pyqtSignal(dict)       # итог (время, минимум, каталог набора данных)
+    failed   = pyqtSignal(str)        # текст ошибки
+
+    FRAME_TIMEOUT = 5.0    # запас ожидания кадра сверх выдержки, с
+    MOVE_TIMEOUT  = 10.0   # запас ожидания перемещения сверх времени по профилю, с
+
+    def __init__(self, motion_controller, camera_thread, points, results_dir,
+                 settle_time=0.2, save_frames=False, settings=None, catalog=None):
+        super().__init__()
+        self.motion        = motion_controller
+        self.camera_thread = camera_thread
+        self.points        = list(points)
+        self.settle_time   = float(settle_time)
+        self.save_frames   = bool(save_frames)
+        self.settings      = dict(settings or {})
+        self.catalog       = catalog   # ResultsCatalog (строка на сканирование) или None
+        self.directory     = os.path.join(results_dir, time.strftime("scan_%Y-%m-%d_%H-%M-%S"))
+
+        self._cancel = threading.Event()
+        self._thread = None
+        self._writer = None
+        self._write_error = None
+
+    def start(self):
+        if not self.points:
+            raise ValueError("Scan has no points")
+        self._thread = threading.Thread(target=self._run, name="scan-engine", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """Прерывает сканирование после текущей точки и останавливает оси"""
+        self._cancel.set()
+        self.motion.stop()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        """Ожидание завершения сканирования (например, при закрытии окна)"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _move_time(self, start, point):
+        """Время перемещения по профилю между точками (оси движутся одновременно)"""
+        profile = self.motion.profile
+        return max((profile.duration(point[axis] - start.get(axis, point[axis])) for axis in point),
+                   default=0.0)
+
+    def _wait(self, future, timeout):
+        """Ожидание Future с проверкой отмены сканирования"""
+        deadline = time.monotonic() + timeout
+        while not self._cancel.is_set():
+            try:
+                return future.result(timeout=min(0.1, max(0.0, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError("Scan step timed out")
+            except CancelledError:
+                return None   # команда отменена остановкой осей
+        future.cancel()
+        return None
+
+    def _run(self):
+        axes = sorted({axis for point in self.points for axis in point})
+        dataset = ScanDataset(self.directory, len(self.points), axes, self.save_frames)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scan-writer")
+
+        started  = time.monotonic()
+        minimum  = 0.0
+        captured = 0
+        error    = None
+        previous = {axis: self.motion.position(axis) for axis in axes}
+        try:
+            moves = self.motion.move_axes(self.points[0])
+            for index, point in enumerate(self.points):
+                move_time = self._move_time(previous, point)
+                minimum += move_time + self.settle_time
+                previous = point
+
+                # Оси в точке
+                reached = [self._wait(future, 2 * move_time + self.MOVE_TIMEOUT) for future in moves.values()]
+                if self._cancel.is_set() or None in reached:
+                    self._cancel.set()   # оси остановлены извне - сканирование прерывается
+                    break
+                positions = {axis: self.motion.position(axis) for axis in point}
+
+                # Кадр, экспонирование которого началось после успокоения
+                not_before = time.monotonic_ns() + int(self.settle_time * 1e9)
+                capture = self._wait(self.camera_thread.request_frame(not_before),
+                                     self.settle_time + self._frame_time() * 3 + self.FRAME_TIMEOUT)
+                if capture is None:
+                    break
+                minimum += capture['metadata'].get('ExposureTime', 0) / 1e6
+
+                # Следующее перемещение начинается до обработки и записи кадра
+                if index + 1 < len(self.points):
+                    moves = self.motion.move_axes(self.points[index + 1])
+                self._writer.submit(self._write_point, dataset, index, positions, capture)
+                if self._write_error is not None:
+                    raise self._write_error
+
+                captured += 1
+                self.progress.emit(captured, len(self.points))
+
+        except Exception as e:
+            print(f"Scan error: {traceback.format_exc()}")
+            error = e
+            self.motion.stop()
+
+        finally:
+            self._writer.shutdown(wait=True)
+            elapsed = time.monotonic() - started
+            info = {'points':      len(self.points),
+                    'captured':    captured,
+                    'axes':        axes,
+                    'settle_time': self.settle_time,
+                    'elapsed':     elapsed,
+                    'minimum':     minimum,
+                    'efficiency':  minimum / elapsed if elapsed > 0 else 0.0,
+                    'cancelled':   self._cancel.is_set(),
+                    'settings':    self.settings}
+            if error is None and self._write_error is not None:
+                error = self._write_error
+            try:
+                dataset.close(info)
+                if self.catalog is not None:
+                    self.catalog.add_sidecar(os.path.join(self.directory, "scan.json"))
+            except OSError as e:
+                error = error or e
+            except Exception as e:
+                print(f"Error adding the scan to the results catalog: {e}")
+            print(f"Scan finished: {captured}/{len(self.points)} points in {elapsed:.2f} s "
+                  f"(minimum {minimum:.2f} s)")
+
+        if error is not None:
+            self.failed.emit(str(error))
+        else:
+            self.finished.emit(dict(info, directory=self.directory))
+
+    def _frame_time(self):
+        """Длительность кадра, с (по последнему кадру или текущей выдержке)"""
+        metadata = self.camera_thread.last_frame_metadata or {}
+        if 'FrameDuration' in metadata:
+            return metadata['FrameDuration'] / 1e6
+        return float(self.camera_thread.current_settings_state.get('exposure', 0.0))
+
+    def _write_point(self, dataset, index, positions, capture):
+        """Коррекция, спектр и запись точки (в фоновом потоке записи)"""
+        try:
+            frame, extractor = capture['frame'], capture['extractor']
+            start, stop = extractor.roi_rows(frame.shape[0])
+            band = frame[start:stop]
+            corrector = capture['corrector']
+            if corrector is not None:
+                band = corrector.correct(band, row_start=start)
+            spectrum = extractor.extract_band(band)
+
+            wavelengths = None
+            calibration = capture['calibration']
+            if calibration is not None:
+                try:
+                    spectrum = calibration.resample(spectrum)
+                    wavelengths = calibration.wavelength_grid
+                except ValueError as e:
+                    print(f"Wavelength calibration not applied to scan: {e}")
+
+            dataset.write(index, positions, spectrum, frame, capture['metadata'], wavelengths)
+        except Exception as e:
+            print(f"Scan write error: {traceback.format_exc()}")
+            self._write_error = e
@@ -0,0 +1,100 @@
+# spectrometer_app/core/scan_dataset.py
+
+import os
+import json
+import numpy as np
+
+
+def scan_axis_positions(start, stop, step):
+    """Положения оси от start до stop включительно с шагом step (мм)"""
+    if step == 0 or start == stop:
+        return [float(start)]
+    step = abs(step) if stop > start else -abs(step)
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    return [float(start + i * step) for i in range(count)]
+
+
+def scan_points(axis_positions, mode='grid'):
+    """
+    Точки сканирования по положениям осей {ось: [мм, ...]}.
+    grid   - все сочетания; следующая ось проходится "змейкой" (туда-обратно),
+             чтобы между соседними точками двигалась одна ось на один шаг;
+    paired - положения осей берутся попарно (списки одной длины).
+    """
+    axes = list(axis_positions)
+    if mode == 'paired':
+        lengths = {len(axis_positions[axis]) for axis in axes}
+        if len(lengths) != 1:
+            raise ValueError("Paired scan needs position lists of equal length")
+        return [dict(zip(axes, values)) for values in zip(*(axis_positions[axis] for axis in axes))]
+    if mode != 'grid':
+        raise ValueError(f"Unknown scan mode: {mode}")
+
+    points = [{}]
+    for axis in axes:
+        expanded = []
+        for index, point in enumerate(points):
+            positions = axis_positions[axis] if index % 2 == 0 else axis_positions[axis][::-1]
+            expanded.extend(dict(point, **{axis: position}) for position in positions)
+        points = expanded
+    return points
+
+
+class ScanDataset:
+    """
+    Набор данных сканирования в одном каталоге:
+        spectra.npy     - спектры (точка x отсчет), float32;
+        frames.npy      - кадры main (точка x h x w x 3), uint8, если включено;
+        wavelengths.npy - ось длин волн (если есть калибровка);
+        index.csv       - номер точки, положения осей, время и выдержка кадра;
+        scan.json       - настройки и итог сканирования.
+    Массивы создаются как .npy с отображением в память (open_memmap) при
+    первой точке, поэтому каждая точка пишется сразу на свое место, а
+    прерванное сканирование оставляет читаемые данные.
+    """
+
+    def __init__(self, directory, count, axes, save_frames=False):
+        self.directory   = directory
+        self.count       = count
+        self.axes        = list(axes)
+        self.save_frames = save_frames
+        self.spectra = None
+        self.frames  = None
+        self.written = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._index = open(os.path.join(directory, "index.csv"), 'w', encoding='utf-8')
+        self._index.write(",".join(["index"] + self.axes + ["timestamp_ns", "exposure_us"]) + "\n")
+
+    def _allocate(self, spectrum, frame, wavelengths):
+        self.spectra = np.lib.format.open_memmap(os.path.join(self.directory, "spectra.npy"),
+                                                 mode='w+', dtype=np.float32,
+                                                 shape=(self.count, len(spectrum)))
+        if self.save_frames and frame is not None:
+            self.frames = np.lib.format.open_memmap(os.path.join(self.directory, "frames.npy"),
+                                                    mode='w+', dtype=frame.dtype,
+                                                    shape=(self.count,) + frame.shape)
+        if wavelengths is not None:
+            np.save(os.path.join(self.directory, "wavelengths.npy"), wavelengths)
+
+    def write(self, index, positions, spectrum, frame, metadata, wavelengths=None):
+        if self.spectra is None:
+            self._allocate(spectrum, frame, wavelengths)
+        self.spectra[index] = spectrum
+        if self.frames is not None:
+            self.frames[index] = frame
+
+        values = [str(index)] + [f"{positions.get(axis, float('nan')):.4f}" for axis in self.axes] + \
+                 [str(metadata.get('SensorTimestamp', '')), str(metadata.get('ExposureTime', ''))]
+        self._index.write(",".join(values) + "\n")
+        self._index.flush()
+        self.written += 1
+
+    def close(self, info):
+        """Сброс массивов на диск и запись итога в scan.json"""
+        for array in (self.spectra, self.frames):
+            if array is not None:
+                array.flush()
+        self._index.close()
+        with open(os.path.join(self.directory, "scan.json"), 'w', encoding='utf-8') as f:
+            json.dump(dict(info, written=self.written), f, ensure_ascii=False, indent=2, default=str)
@@ -0,0 +1,197 @@
+# spectrometer_app/core/sensor_modes.py
+
+import os
+import json
+import time
+import threading
+
+
+SENSOR_MODES_VERSION = 1   # версия формата кэша; при изменении кэш перестраивается
+
+# Поля режима сенсора, сохраняемые в кэше (остальные зависят от версии picamera2)
+_MODE_FIELDS = ('size', 'bit_depth', 'fps', 'format', 'unpacked', 'crop_limits', 'exposure_limits')
+_TUPLE_FIELDS = ('size', 'crop_limits', 'exposure_limits')
+
+MODE_PREFERENCES = ('resolution', 'fps')
+
+
+def _picamera2_version():
+    try:
+        from importlib.metadata import version
+        return version('picamera2')
+    except Exception:
+        return ''
+
+
+def camera_fingerprint(camera):
+    """
+    Отпечаток камеры для кэша режимов: модель, идентификатор подключения
+    libcamera (у модулей Raspberry Pi нет серийного номера), размер матрицы
+    и версия picamera2. Другой отпечаток - другая запись кэша.
+    """
+    properties = getattr(camera, 'camera_properties', None) or {}
+    libcamera_camera = getattr(camera, 'camera', None)
+    return {'version':    SENSOR_MODES_VERSION,
+            'model':      str(properties.get('Model', '')),
+            'id':         str(getattr(libcamera_camera, 'id', '') or properties.get('Id', '')),
+            'pixels':     list(properties.get('PixelArraySize', ())),
+            'picamera2':  _picamera2_version()}
+
+
+def normalize_sensor_mode(mode):
+    """Режим из camera.sensor_modes в виде, пригодном для JSON (формат - строка, кортежи - списки)"""
+    normalized = {}
+    for field in _MODE_FIELDS:
+        if field not in mode:
+            continue
+        value = mode[field]
+        if field in ('format', 'unpacked'):
+            value = str(value)
+        elif field in _TUPLE_FIELDS and value is not None:
+            value = list(value)
+        normalized[field] = value
+    return normalized
+
+
+def _restore_sensor_mode(mode):
+    mode = dict(mode)
+    for field in _TUPLE_FIELDS:
+        if mode.get(field) is not None:
+            mode[field] = tuple(mode[field])
+    return mode
+
+
+def _contains(outer, inner):
+    ox, oy, ow, oh = outer
+    ix, iy, iw, ih = inner
+    return ox <= ix and oy <= iy and ix + iw <= ox + ow and iy + ih <= oy + oh
+
+
+def select_sensor_mode(sensor_modes, size=None, min_bit_depth=None, min_fps=None, crop=None,
+                       prefer='resolution'):
+    """
+    Выбор режима сенсора по требованиям:
+        size          - не меньше (ширина, высота);
+        min_bit_depth - разрядность не ниже (например, 10 для обработки снимков);
+        min_fps       - предельная частота кадров не ниже;
+        crop          - область считывания (crop_limits) целиком содержит (x, y, w, h);
+        prefer        - 'resolution' (наибольшее разрешение, затем частота) или
+                        'fps' (наибольшая частота, затем меньший кадр - бинирование).
+    ValueError, если подходящего режима нет.
+    """
+    if prefer not in MODE_PREFERENCES:
+        raise ValueError(f"Unknown sensor mode preference: {prefer}")
+
+    suitable = []
+    for mode in sensor_modes:
+        width, height = mode['size']
+        if size is not None and (width < size[0] or height < size[1]):
+            continue
+        if min_bit_depth is not None and mode.get('bit_depth', 0) < min_bit_depth:
+            continue
+        if min_fps is not None and mode.get('fps', 0.0) < min_fps:
+            continue
+        if crop is not None and not ('crop_limits' in mode and _contains(mode['crop_limits'], crop)):
+            continue
+        suitable.append(mode)
+    if not suitable:
+        raise ValueError(f"No sensor mode matches size={size}, bit_depth>={min_bit_depth}, "
+                         f"fps>={min_fps}, crop={crop}")
+
+    if prefer == 'fps':
+        return max(suitable, key=lambda m: (m.get('fps', 0.0), -m['size'][0] * m['size'][1]))
+    return max(suitable, key=lambda m: (m['size'][0] * m['size'][1], m.get('fps', 0.0)))
+
+
+def find_sensor_mode(sensor_modes, size):
+    """Режим с заданным размером кадра сенсора (например, raw текущей конфигурации) или None"""
+    size = tuple(size)
+    return next((mode for mode in sensor_modes if tuple(mode['size']) == size), None)
+
+
+class SensorModeStore:
+    """
+    Кэш режимов сенсора на диске (один JSON на все камеры) и в памяти.
+
+    Опрос camera.sensor_modes заставляет picamera2 перебрать конфигурации
+    (сотни миллисекунд - секунды), поэтому он выполняется один раз для
+    камеры с данным отпечатком (camera_fingerprint). Запись устаревает при
+    смене модели/подключения, матрицы, версии picamera2 или формата кэша;
+    invalidate() удаляет ее явно. Опрос требует остановленной камеры.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._memory = {}   # ключ камеры -> режимы
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(fingerprint):
+        return f"{fingerprint['model']}:{fingerprint['id']}"
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Sensor mode cache {self.path} is unreadable, rebuilding: {e}")
+            return {}
+
+    def _write(self, data):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)   # атомарная замена - кэш не бывает записан наполовину
+
+    def modes(self, camera, refresh=False):
+        """Режимы сенсора камеры (список словарей, как camera.sensor_modes)"""
+        fingerprint = camera_fingerprint(camera)
+        key = self._key(fingerprint)
+
+        with self._lock:
+            if not refresh and key in self._memory:
+                return self._memory[key]
+
+            data = self._read()
+            entry = data.get(key)
+            if not refresh and entry is not None and entry.get('fingerprint') == fingerprint:
+                modes = [_restore_sensor_mode(mode) for mode in entry['modes']]
+                self._memory[key] = modes
+                return modes
+
+            started = time.monotonic()
+            normalized = [normalize_sensor_mode(mode) for mode in camera.sensor_modes]
+            print(f"Sensor modes of {fingerprint['model']} queried in {time.monotonic() - started:.2f} s")
+
+            data[key] = {'fingerprint': fingerprint, 'modes': normalized,
+                         'updated': time.strftime("%Y-%m-%d %H:%M:%S")}
+            try:
+                self._write(data)
+            except OSError as e:
+                print(f"Error writing sensor mode cache {self.path}: {e}")
+
+            modes = [_restore_sensor_mode(mode) for mode in normalized]
+            self._memory[key] = modes
+            return modes
+
+    def invalidate(self, camera=None):
+        """Удаляет записи кэша (камеры или все), следующий запрос опросит камеру заново"""
+        with self._lock:
+            if camera is None:
+                self._memory.clear()
+                data = {}
+            else:
+                key = self._key(camera_fingerprint(camera))
+                self._memory.pop(key, None)
+                data = self._read()
+                data.pop(key, None)
+            try:
+                self._write(data)
+            except OSError as e:
+                print(f"Error writing sensor mode cache {self.path}: {e}")
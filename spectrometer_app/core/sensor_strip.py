@@ -0,0 +1,110 @@
+# spectrometer_app/core/sensor_strip.py
+
+import numpy as np
+
+try:
+    from core.sensor_modes import select_sensor_mode
+except ImportError: # Fallback for running script directly
+    from spectrometer_app.core.sensor_modes import select_sensor_mode
+
+
+STRIP_MARGIN   = 0.25   # запас над и под полосой ROI, доля высоты ROI
+STRIP_MIN_ROWS = 16     # минимальная высота потока main в режиме полосы, строк
+FPS_WINDOW     = 30     # кадров для оценки фактической частоты кадров
+
+
+def field_crop(active_area, output_size):
+    """
+    Область сенсора (x, y, w, h), которую показывает обычный видеорежим:
+    наибольший прямоугольник с пропорциями потока main в центре активной
+    области - так libcamera выбирает ScalerCrop по умолчанию.
+    """
+    x, y, width, height = active_area
+    out_w, out_h = output_size
+    if width * out_h > height * out_w:
+        crop_w, crop_h = height * out_w // out_h, height
+    else:
+        crop_w, crop_h = width, width * out_h // out_w
+    return (x + (width - crop_w) // 2, y + (height - crop_h) // 2, crop_w, crop_h)
+
+
+def strip_crop(field, roi_center, roi_height, margin=STRIP_MARGIN):
+    """
+    ScalerCrop полосы (x, y, w, h) на всю ширину поля field и положение ROI
+    внутри полосы (центр, высота в долях высоты полосы) - для извлечения
+    спектра из кадра полосы. Границы выровнены на четные строки (ячейка Байера).
+    Высота полосы зависит только от высоты ROI, поэтому сдвиг ROI не меняет
+    размер потока и не требует перенастройки камеры.
+    """
+    x, y, width, height = field
+    band = max(roi_height, 1e-6) * height
+    crop_h = min(height - height % 2, max(2, int(np.ceil(band * (1 + 2 * margin) / 2)) * 2))
+    center = y + roi_center * height
+    top = int(np.floor((center - crop_h / 2) / 2)) * 2
+    top = min(max(y + y % 2, top), y + height - crop_h)
+
+    roi = ((center - top) / crop_h, min(1.0, band / crop_h))
+    return (x, top, width, crop_h), roi
+
+
+def select_strip_mode(sensor_modes, crop):
+    """
+    Режим сенсора для полосы: среди режимов, чья область считывания
+    (crop_limits) целиком содержит полосу, - с наибольшей частотой кадров,
+    при равной - с бинированием (меньший размер кадра, меньше данных).
+    None, если полосу не покрывает ни один режим.
+    """
+    try:
+        return select_sensor_mode(sensor_modes, crop=crop, prefer='fps')
+    except ValueError:
+        return None
+
+
+def plan_strip_mode(sensor_modes, field, roi_center, roi_height, output_width):
+    """
+    Конфигурация режима полосы спектра для ROI (в долях кадра обычного режима):
+        sensor_mode - режим сенсора (словарь из sensor_modes);
+        crop        - ScalerCrop полосы на сенсоре;
+        size        - размер потока main: ширина output_width (ось дисперсии и
+                      калибровка длин волн не меняются), высота по пропорциям полосы;
+        roi_center, roi_height - ROI внутри кадра полосы;
+        max_fps     - предел частоты кадров режима сенсора.
+    """
+    crop, (center, height) = strip_crop(field, roi_center, roi_height)
+    mode = select_strip_mode(sensor_modes, crop)
+    if mode is None:
+        raise ValueError(f"No sensor mode covers the spectrum strip {crop}")
+
+    rows = int(round(output_width * crop[3] / crop[2] / 2)) * 2
+    return {'sensor_mode': mode,
+            'crop':        crop,
+            'size':        (output_width, max(STRIP_MIN_ROWS, rows)),
+            'roi_center':  center,
+            'roi_height':  height,
+            'max_fps':     float(mode.get('fps', 0.0))}
+
+
+class FrameRateMeter:
+    """
+    Фактическая частота кадров по SensorTimestamp: медианный интервал за
+    окно из window кадров (устойчиво к единичным пропускам).
+    """
+
+    def __init__(self, window=FPS_WINDOW):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._timestamps = []
+
+    def update(self, timestamp):
+        """Добавляет кадр; возвращает частоту кадров, когда окно заполнено, иначе None"""
+        if timestamp is None:
+            return None
+        self._timestamps.append(timestamp)
+        if len(self._timestamps) <= self.window:
+            return None
+        intervals = np.diff(np.asarray(self._timestamps, dtype=np.int64))
+        self.reset()
+        interval = float(np.median(intervals))
+        return 1e9 / interval if interval > 0 else None
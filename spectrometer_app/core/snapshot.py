@@ -2,189 +2,163 @@
 
 import os
 import time
-import traceback
-from PyQt5.QtWidgets import QMessageBox
-from picamera2 import Picamera2
-from libcamera import controls, Transform
+from PyQt5.QtWidgets import QMessageBox, QProgressDialog
+from PyQt5.QtCore import Qt, QTimer
 
 
-try:
-    from utils.camera_settings_utils import get_awb_mode
-except ImportError: # Fallback for running script directly
-    from spectrometer_app.utils.camera_settings_utils import get_awb_mode
-
+LONG_EXPOSURE_PROGRESS = 1.0   # выдержка, с которой выводится индикатор экспозиции с отменой, с
 
 
 def take_and_save_snapshot_standalone(parent_window):
     """
-    Обрабатывает логику создания и сохранения снимков в форматах TIFF и RAW.
+    Запрашивает снимок в форматах JPEG и RAW у потока камеры.
     Принимает в качестве входного параметра главный экземпляр CameraApp.
+    Захват выполняется в потоке камеры, кодирование и запись - в фоновой очереди.
     """
     if not parent_window.camera_connected or not parent_window.camera_thread:
         QMessageBox.warning(parent_window, "Ошибка", "Камера не подключена или поток не запущен!")
         return
 
-    capture_cam = None # переменная камеры
+    if not parent_window.camera_thread.isRunning():
+        QMessageBox.warning(parent_window, "Ошибка", "Поток камеры не запущен!")
+        return
 
-    # текущее состояние камеры
-    original_running_state = parent_window.camera_thread.isRunning()
+    # Ограничение памяти очереди записи
+    if parent_window.snapshot_writer.is_full():
+        QMessageBox.warning(parent_window, "Ошибка",
+                            "Очередь записи снимков заполнена, дождитесь сохранения предыдущих.")
+        return
+
+    # Блокируем кнопку до окончания экспозиции
+    if hasattr(parent_window, 'snapshot_btn'):
+        parent_window.snapshot_btn.setEnabled(False)
 
     # текущие настройки камеры
-    snapshot_settings = parent_window.current_settings.copy()
+    parent_window.camera_thread.request_snapshot(parent_window.current_settings.copy())
 
-    video_controls = {} # Словарь для хранения параметров видео
 
-    # Если поток работает и камера доступна, сохраняем текущие настройки
-    if original_running_state and parent_window.camera_thread.camera:
-         video_controls = parent_window.camera_thread.save_current_settings()
+def handle_snapshot_exposure_started(parent_window, info):
+    """
+    Началась экспозиция снимка. Для длинной выдержки выводится немодальный
+    индикатор (прошло/осталось по запрошенной выдержке) с кнопкой отмены;
+    интерфейс и превью при этом не блокируются.
+    """
+    close_snapshot_progress(parent_window)
+    parent_window.snapshot_exposure = dict(info, started=time.monotonic())
+    if info['exposure'] < LONG_EXPOSURE_PROGRESS:
+        parent_window.statusBar().showMessage(f"Снимок: выдержка {info['exposure']:.2f} с...")
+        return
+
+    progress = QProgressDialog("", "Отменить снимок", 0, 1000, parent_window)
+    progress.setWindowTitle("Длинная выдержка")
+    progress.setWindowModality(Qt.NonModal)
+    progress.setAutoClose(False)
+    progress.setAutoReset(False)
+    progress.setMinimumDuration(0)
+    progress.canceled.connect(lambda: cancel_snapshot(parent_window))
+    parent_window.snapshot_progress = progress
+
+    timer = QTimer(parent_window)
+    timer.timeout.connect(lambda: update_snapshot_progress(parent_window))
+    timer.start(100)
+    parent_window.snapshot_timer = timer
+    update_snapshot_progress(parent_window)
+    progress.show()
+
+
+def update_snapshot_progress(parent_window):
+    """Обновление индикатора экспозиции по таймеру"""
+
+    progress = getattr(parent_window, 'snapshot_progress', None)
+    info = getattr(parent_window, 'snapshot_exposure', None)
+    if progress is None or info is None:
+        return
+    elapsed = time.monotonic() - info['started']
+    exposure = info['exposure']
+    if elapsed < exposure:
+        progress.setLabelText(f"Экспозиция: {elapsed:.1f} из {exposure:.1f} с "
+                              f"(осталось {exposure - elapsed:.1f} с)")
     else:
-         print("Warning: Could not get live camera metadata for snapshot.")
-
-    try:
-        results_dir = os.path.abspath("./results") # Директория для результатов
-        os.makedirs(results_dir, exist_ok=True)
-
-       # Получение времени экспозиции из настроек
-        exposure_time = snapshot_settings['exposure']
-
-        # Если поток камеры был запущен, останавливаем его для создания снимка
-        if original_running_state:
-            # Ожидание остановки потока (1 секунда)
-            parent_window.camera_thread.stop()
-            if not parent_window.camera_thread.wait(1000):
-                print("Warning: Camera thread did not stop gracefully for snapshot.")
-            # Отключение сигналов от потока камеры
-            try: 
-                parent_window.camera_thread.change_pixmap.disconnect(parent_window.set_image)
-            except TypeError: 
-                pass
-            try: 
-                parent_window.camera_thread.camera_error.disconnect(parent_window.handle_camera_error)
-            except TypeError: 
-                pass
-            try: 
-                parent_window.camera_thread.settings_updated.disconnect(parent_window.update_settings_from_camera_wrapper)
-            except TypeError: 
-                pass
-
-        capture_cam = Picamera2() # включаем камеру
-
-        try:
-            # доступные режимы сенсора
-            sensor_modes = capture_cam.sensor_modes
-            
-            # Фильтрация режимов с глубиной цвета >= 10 бит (нужно для обработки)
-            valid_modes = [m for m in sensor_modes if m.get('bit_depth', 0) >= 10]
-
-            # Используем все режимы, если нет подходящих
-            if not valid_modes: 
-                valid_modes = sensor_modes
-            
-            # Выбор режима с максимальным разрешением
-            best_mode = max(valid_modes, key=lambda m: m['size'][0] * m['size'][1])
-            max_res = best_mode['size']
-            print(f"Selected max resolution: {max_res} from mode: {best_mode}")
-
-        # В случае ошибки используем разрешение по умолчанию
-        except Exception as e_res:
-            print(f"Could not determine max resolution, using default (1920, 1080). Error: {e_res}")
-            max_res = (1920, 1080)
-
-        # Создание конфигурации для снимка
-        still_config = capture_cam.create_still_configuration(
-            main         = {"size": max_res, "format": "RGB888"},
-            raw          = {"size": max_res},  # RAW данные
-            buffer_count = 2,                  # Количество буферов
-            transform    = video_controls.get("Transform", Transform())
-        )
-        # Применение конфигурации
-        capture_cam.configure(still_config)
-
-        # Настройка камеры и ее запуск
-        awb_mode_enum = get_awb_mode(snapshot_settings['awb_mode'])
-
-        controls_to_set = {
-            'ExposureTime':       int(exposure_time * 1000000),
-            'AfMode':             controls.AfModeEnum.Manual,
-            'LensPosition':       1.0 / (snapshot_settings['focus'] / 1000.0),
-            'AwbMode':            awb_mode_enum, 'AeEnable': False,
-            'Brightness':         snapshot_settings['brightness'],
-            'Contrast':           snapshot_settings['contrast'],
-            'Saturation':         snapshot_settings['saturation'],
-            'Sharpness':          snapshot_settings['sharpness'],
-            'NoiseReductionMode': video_controls.get('NoiseReductionMode', controls.draft.NoiseReductionModeEnum.Off)
-        }
-
-        capture_cam.set_controls(controls_to_set)
-        capture_cam.start()
-        time.sleep(1)
-
-        # Генерация имен файлов формата YYYY-MM-DD_HH-MM-SS
-        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
-        jpg_filename = os.path.join(results_dir, f"{timestamp}.jpg") 
-        raw_filename = os.path.join(results_dir, f"{timestamp}.dng") 
-
-        request = None
-
-        try:
-            # Захват снимка
-            request = capture_cam.capture_request()
-
-            # Сохранение JPEG
-            print("Saving JPEG...")
-            rgb_image = request.make_image("main")
-            rgb_image.save(jpg_filename, format='JPEG', quality=95)  # качество сжатия с потерями от 1 до 100
-            print(f"JPEG saved: {jpg_filename}")
-
-            # Сохранение RAW в формате DNG
-            print("Saving RAW (DNG)...")
-            capture_cam.capture_file(raw_filename, name="raw")  # Используем встроенный метод
-            print(f"RAW (DNG) saved: {raw_filename}")
-
-            # Вывод сообщения об успешном сохранении
-            saved_files_msg = (f"JPEG: {os.path.basename(jpg_filename)}\n"
-                               f"RAW:  {os.path.basename(raw_filename)}")
-            QMessageBox.information(parent_window, "Успех", f"Изображения сохранены:\n{saved_files_msg}")
-
-        except Exception as save_err:
-            """
-            Отлавливание ошибки при
-                1. создании изображения;
-                2. сохранении; 
-                3. создании массива данных;
-                4. в файле.
-            """
-            print(f"ERROR during image saving: {save_err}")
-            traceback.print_exc() # Печать tb стека
-            QMessageBox.critical(parent_window, "Ошибка Сохранения", f"Не удалось сохранить файлы: {save_err}")
-
-        finally:
-             # если потребуется - освободим ресурсы
-             if request:
-                request.release()
-
-    except Exception as e:
-        # Обработка общих ошибок
-        error_details = traceback.format_exc()
-        print(f"Snapshot Error details: {error_details}")
-        QMessageBox.critical(parent_window, "Ошибка", f"Не удалось сохранить снимок: {str(e)}")
-    finally:
-        # Завершение работы с камерой
-        if capture_cam is not None:
-            if capture_cam.started:
-                try: 
-                    capture_cam.stop() # Остановка камеры
-                except Exception as e_stop: 
-                    print(f"Error stopping capture camera: {e_stop}")
-            try: 
-                capture_cam.close()    # Закрытие камеры
-            except Exception as e_close: 
-                print(f"Error closing capture camera: {e_close}")
-
-        # Восстановление исходного состояния потока камеры
-        if original_running_state:
-            print("Restarting video thread...")
-            # Перезапуск камеры через родительское окно
-            parent_window.initCamera()
-        else:
-             print("Video thread was not running, not restarting.")
+        progress.setLabelText(f"Экспозиция {exposure:.1f} с завершена, получение кадра "
+                              f"({elapsed - exposure:.1f} с)...")
+    progress.setValue(min(999, int(1000 * elapsed / max(exposure, 1e-3))))
+
+
+def close_snapshot_progress(parent_window):
+    """Закрытие индикатора экспозиции (снимок получен, отменен или не удался)"""
+
+    timer = getattr(parent_window, 'snapshot_timer', None)
+    if timer is not None:
+        timer.stop()
+        timer.deleteLater()
+    progress = getattr(parent_window, 'snapshot_progress', None)
+    if progress is not None:
+        progress.canceled.disconnect()
+        progress.close()
+        progress.deleteLater()
+    parent_window.snapshot_timer    = None
+    parent_window.snapshot_progress = None
+    parent_window.snapshot_exposure = None
+
+
+def cancel_snapshot(parent_window):
+    """Отмена текущего снимка: запрос прерывается, камера сразу возвращается в превью"""
+
+    if getattr(parent_window, 'snapshot_exposure', None) is None or not parent_window.camera_thread:
+        return
+    parent_window.statusBar().showMessage("Снимок отменяется...")
+    parent_window.camera_thread.cancel_snapshot()
+
+
+def handle_snapshot_cancelled(parent_window):
+    """Снимок отменен, видео возобновлено"""
+
+    close_snapshot_progress(parent_window)
+    if hasattr(parent_window, 'snapshot_btn'):
+        parent_window.snapshot_btn.setEnabled(True)
+    parent_window.statusBar().showMessage("Снимок отменен")
+
+
+def handle_snapshot_captured(parent_window, result):
+    """Кадр захвачен и передан в очередь записи - можно делать следующий снимок"""
+
+    close_snapshot_progress(parent_window)
+    if hasattr(parent_window, 'snapshot_btn'):
+        parent_window.snapshot_btn.setEnabled(True)
+
+    parent_window.statusBar().showMessage(
+        f"Снимок захвачен за {result['round_trip']:.2f} с, идет запись...")
+
+
+def handle_snapshot_progress(parent_window, basename, stage):
+    """Отображение этапа записи снимка"""
+
+    stages = {'correct': "коррекция темновым/плоским кадром",
+              'encode':  "кодирование JPEG", 'write': "запись файлов"}
+    parent_window.statusBar().showMessage(f"{basename}: {stages.get(stage, stage)}")
+
+
+def handle_snapshot_written(parent_window, result):
+    """Вывод сообщения об успешном сохранении снимка (без модального окна)"""
+
+    names = ", ".join(os.path.basename(filename) for filename in result['files'])
+    parent_window.statusBar().showMessage(
+        f"Сохранено: {names} "
+        f"(кодирование {result['encode_time']:.2f} с, запись {result['write_time']:.2f} с)")
+
+
+def handle_snapshot_queue_depth(parent_window, depth):
+    """Обновление индикатора длины очереди записи"""
+
+    if hasattr(parent_window, 'snapshot_queue_label'):
+        parent_window.snapshot_queue_label.setText(f"Очередь записи: {depth}")
+
+
+def handle_snapshot_failed(parent_window, error_message):
+    """Вывод сообщения об ошибке при создании снимка"""
+
+    close_snapshot_progress(parent_window)
+    if hasattr(parent_window, 'snapshot_btn'):
+        parent_window.snapshot_btn.setEnabled(True)
+
+    QMessageBox.critical(parent_window, "Ошибка", f"Не удалось сохранить снимок: {error_message}")
@@ -0,0 +1,114 @@
+# spectrometer_app/core/snapshot_capture.py
+
+from libcamera import controls, Transform
+
+try:
+    from utils.camera_settings_utils import get_awb_mode
+    from core.snapshot_io import extract_snapshot_job
+    from core.sensor_modes import select_sensor_mode
+    from utils.control_settle import ControlSettleWatcher
+except ImportError: # Fallback for running script directly
+    from spectrometer_app.utils.camera_settings_utils import get_awb_mode
+    from spectrometer_app.core.snapshot_io import extract_snapshot_job
+    from spectrometer_app.core.sensor_modes import select_sensor_mode
+    from spectrometer_app.utils.control_settle import ControlSettleWatcher
+
+
+def select_still_resolution(sensor_modes):
+    """
+    Определяет максимальное разрешение сенсора для снимка по списку режимов
+    (кэш режимов SensorModeStore - камера при этом не опрашивается).
+    """
+    try:
+        # Режим с глубиной цвета >= 10 бит (нужно для обработки), иначе любой
+        try:
+            best_mode = select_sensor_mode(sensor_modes, min_bit_depth=10)
+        except ValueError:
+            best_mode = select_sensor_mode(sensor_modes)
+        max_res = tuple(best_mode['size'])
+        print(f"Selected max resolution: {max_res} from mode: {best_mode}")
+
+    # В случае ошибки используем разрешение по умолчанию
+    except Exception as e_res:
+        print(f"Could not determine max resolution, using default (1920, 1080). Error: {e_res}")
+        max_res = (1920, 1080)
+
+    return max_res
+
+
+def build_snapshot_controls(snapshot_settings, video_controls):
+    """Формирует словарь управляющих параметров камеры для снимка"""
+
+    awb_mode_enum = get_awb_mode(snapshot_settings['awb_mode'])
+
+    return {
+        'ExposureTime':       int(snapshot_settings['exposure'] * 1000000),
+        'AfMode':             controls.AfModeEnum.Manual,
+        'LensPosition':       1.0 / (snapshot_settings['focus'] / 1000.0),
+        'AwbMode':            awb_mode_enum, 'AeEnable': False,
+        'Brightness':         snapshot_settings['brightness'],
+        'Contrast':           snapshot_settings['contrast'],
+        'Saturation':         snapshot_settings['saturation'],
+        'Sharpness':          snapshot_settings['sharpness'],
+        'NoiseReductionMode': video_controls.get('NoiseReductionMode', controls.draft.NoiseReductionModeEnum.Off)
+    }
+
+
+def create_snapshot_configuration(camera, video_config, max_res, snapshot_settings, video_controls):
+    """
+    Конфигурация режима фото (максимальное разрешение) и ее настройки.
+    Настройки передаются вместе с конфигурацией, чтобы они действовали
+    с первого кадра после переключения режима.
+    """
+    snapshot_controls = build_snapshot_controls(snapshot_settings, video_controls)
+    still_config = camera.create_still_configuration(
+        main         = {"size": max_res, "format": "RGB888"},
+        raw          = {"size": max_res},  # RAW данные
+        buffer_count = 2,                  # Количество буферов
+        transform    = video_config.get("transform", Transform()),
+        controls     = snapshot_controls
+    )
+    return still_config, snapshot_controls
+
+
+def capture_snapshot_in_place(camera, video_config, max_res, snapshot_settings, video_controls,
+                              reference_metadata=None):
+    """
+    Делает снимок на уже открытой камере: переключает её в режим фото
+    (максимальное разрешение), захватывает кадр и сразу возвращает в режим видео.
+    JPEG, DNG и метаданные строятся из одного и того же запроса (одна экспозиция).
+    Камера не закрывается и не открывается заново.
+    Блокирующий вариант (поток камеры использует неблокирующий, с отменой).
+    Возвращает задание на запись (копии буферов и метаданные), см. snapshot_io.
+    """
+    still_config, snapshot_controls = create_snapshot_configuration(camera, video_config, max_res,
+                                                                    snapshot_settings, video_controls)
+
+    # Кадры в режиме фото снимаются, пока метаданные не покажут примененные
+    # выдержку, положение линзы и сошедшийся AWB (или до тайм-аута, зависящего
+    # от выдержки); обычно подходит первый же кадр. Камера возвращается в режим
+    # видео сразу после захвата, запрос остается действительным до release()
+    camera.switch_mode(still_config)
+    watcher = ControlSettleWatcher(snapshot_controls, "snapshot", reference=reference_metadata, min_frames=1)
+    request = None
+    try:
+        while True:
+            request = camera.capture_request()
+            if watcher.update(request.get_metadata()) is not None:
+                break
+            request.release()
+            request = None
+    finally:
+        camera.switch_mode(video_config)
+        if request is not None and watcher.result is None:
+            request.release()
+
+    try:
+        # Копирование буферов, кодирование выполняется позже в фоне
+        job = extract_snapshot_job(request, snapshot_settings)
+        job['settings']['settle'] = watcher.result   # сохраняется в метаданных снимка
+    finally:
+        # освобождение буферов запроса
+        request.release()
+
+    return job
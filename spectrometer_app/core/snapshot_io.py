@@ -0,0 +1,177 @@
+# spectrometer_app/core/snapshot_io.py
+
+import io
+import os
+import json
+import time
+import threading
+import numpy as np
+
+try:
+    from core.catalog import spectrum_summary, snapshot_spectrum_summary
+except ImportError: # Fallback for running script directly
+    from spectrometer_app.core.catalog import spectrum_summary, snapshot_spectrum_summary
+
+
+# Имена файлов, зарезервированные ещё не записанными заданиями
+_reserved_names = set()
+_reserved_lock  = threading.Lock()
+
+
+def extract_snapshot_job(request, snapshot_settings):
+    """
+    Копирует буферы и метаданные из запроса камеры в задание на запись.
+    После вызова запрос можно сразу освободить (release), кодирование
+    выполняется позже по скопированным данным.
+    """
+    main_array = request.make_array("main")
+    raw_buffer = request.make_buffer("raw")
+
+    return {
+        'timestamp':   time.strftime("%Y-%m-%d_%H-%M-%S"),
+        'settings':    dict(snapshot_settings),
+        'metadata':    request.get_metadata(),
+        'main':        main_array,
+        'raw':         raw_buffer,
+        'main_config': dict(request.config['main']),
+        'raw_config':  dict(request.config['raw']),
+        'nbytes':      main_array.nbytes + raw_buffer.nbytes
+    }
+
+
+def reserve_basename(results_dir, timestamp):
+    """
+    Возвращает уникальное имя файла (без расширения) для снимка.
+    Несколько снимков в одну секунду получают суффиксы _1, _2, ...
+    """
+    with _reserved_lock:
+        name, index = timestamp, 0
+        while name in _reserved_names or \
+              os.path.exists(os.path.join(results_dir, f"{name}.jpg")) or \
+              os.path.exists(os.path.join(results_dir, f"{name}.json")):
+            index += 1
+            name = f"{timestamp}_{index}"
+        _reserved_names.add(name)
+    return name
+
+
+def release_basename(name):
+    with _reserved_lock:
+        _reserved_names.discard(name)
+
+
+def save_snapshot_metadata(metadata, snapshot_settings, filename):
+    """Сохраняет метаданные кадра и настройки снимка в JSON рядом с изображениями"""
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({'settings': snapshot_settings, 'metadata': metadata},
+                  f, ensure_ascii=False, indent=2, default=str)
+
+
+def write_snapshot_job(job, helpers, results_dir, progress_callback=None):
+    """
+    Кодирует и записывает задание снимка: JPEG, DNG и JSON с метаданными.
+    helpers - объект Picamera2.helpers (make_image / save_dng).
+    Возвращает словарь с именами файлов и измеренными задержками (с):
+        encode_time - кодирование JPEG в память;
+        write_time  - запись JPEG, формирование и запись DNG, запись JSON.
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    basename = reserve_basename(results_dir, job['timestamp'])
+
+    jpg_filename  = os.path.join(results_dir, f"{basename}.jpg")
+    raw_filename  = os.path.join(results_dir, f"{basename}.dng")
+    meta_filename = os.path.join(results_dir, f"{basename}.json")
+
+    def report(stage):
+        if progress_callback is not None:
+            progress_callback(basename, stage)
+
+    try:
+        # Коррекция темновым и плоским кадрами (полосами, на месте)
+        corrector = job.get('frame_corrector')
+        if corrector is not None:
+            report("correct")
+            height, width = job['main'].shape[:2]
+            corrector.resized(height, width, job.get('frame_corrector_reverse', False)) \
+                     .correct_into(job['main'], chunk_rows=256)
+            job['settings']['frame_correction_masters'] = corrector.describe()
+
+        # Сводка спектра полосы ROI - для каталога результатов
+        job['settings']['spectrum_summary'] = snapshot_spectrum_summary(job['main'], job['settings'])
+
+        # Кодирование JPEG в память
+        report("encode")
+        start_time = time.monotonic()
+        jpeg_data = io.BytesIO()
+        rgb_image = helpers.make_image(job['main'], job['main_config'])
+        rgb_image.save(jpeg_data, format='JPEG', quality=95)  # качество сжатия с потерями от 1 до 100
+        encode_time = time.monotonic() - start_time
+
+        # Запись на диск
+        report("write")
+        start_time = time.monotonic()
+        with open(jpg_filename, 'wb') as f:
+            f.write(jpeg_data.getbuffer())
+        print(f"JPEG saved: {jpg_filename}")
+
+        helpers.save_dng(job['raw'], job['metadata'], job['raw_config'], raw_filename)
+        print(f"RAW (DNG) saved: {raw_filename}")
+
+        save_snapshot_metadata(job['metadata'], job['settings'], meta_filename)
+        write_time = time.monotonic() - start_time
+
+    finally:
+        release_basename(basename)
+
+    return {
+        'jpg':         jpg_filename,
+        'raw':         raw_filename,
+        'metadata':    meta_filename,
+        'files':       [jpg_filename, raw_filename],
+        'encode_time': encode_time,
+        'write_time':  write_time
+    }
+
+
+def save_spectrum_csv(spectrum, wavelengths, filename):
+    """Спектр в CSV: длина волны (нм) или номер пикселя и интенсивность"""
+    axis = np.arange(len(spectrum)) if wavelengths is None else wavelengths
+    header = "pixel,intensity" if wavelengths is None else "wavelength_nm,intensity"
+    np.savetxt(filename, np.column_stack([axis, spectrum]), delimiter=',',
+               header=header, comments='', fmt='%.6g')
+
+
+def write_stack_job(job, helpers, results_dir, progress_callback=None):
+    """
+    Записывает результат накопления кадров или HDR-серии (job['kind']): кадр
+    float32 (.npy), спектр (.csv) и JSON с настройками и параметрами серии.
+    helpers не используется (сигнатура совпадает с write_snapshot_job для
+    общей очереди записи).
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    basename = reserve_basename(results_dir, f"{job['timestamp']}_{job.get('kind', 'stack')}")
+
+    frame_filename    = os.path.join(results_dir, f"{basename}.npy")
+    spectrum_filename = os.path.join(results_dir, f"{basename}.csv")
+    meta_filename     = os.path.join(results_dir, f"{basename}.json")
+
+    try:
+        if progress_callback is not None:
+            progress_callback(basename, "write")
+        start_time = time.monotonic()
+        np.save(frame_filename, job['stack'])
+        save_spectrum_csv(job['spectrum'], job.get('wavelengths'), spectrum_filename)
+        job['settings']['spectrum_summary'] = spectrum_summary(job['spectrum'], job.get('wavelengths'))
+        save_snapshot_metadata(job['metadata'], job['settings'], meta_filename)
+        write_time = time.monotonic() - start_time
+        print(f"Stacked frame saved: {frame_filename}")
+
+    finally:
+        release_basename(basename)
+
+    return {
+        'metadata':    meta_filename,
+        'files':       [frame_filename, spectrum_filename],
+        'encode_time': 0.0,
+        'write_time':  write_time
+    }
@@ -0,0 +1,106 @@
+# spectrometer_app/core/snapshot_writer.py
+
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QObject, pyqtSignal
+
+try:
+    from core.snapshot_io import write_snapshot_job
+except ImportError: # Fallback for running script directly
+    from spectrometer_app.core.snapshot_io import write_snapshot_job
+
+
+class SnapshotWriter(QObject):
+    """
+    Очередь заданий на запись снимков, обслуживаемая пулом рабочих потоков.
+    Кодирование JPEG и запись DNG/JSON выполняются вне потока интерфейса.
+
+    Объем памяти, занятой ожидающими заданиями, ограничен max_pending_bytes:
+    submit() блокирует поток-источник (поток камеры), пока место не освободится.
+    """
+
+    # Сигналы (испускаются из рабочих потоков, доставляются в основной поток)
+    queue_depth_changed = pyqtSignal(int)       # число заданий в очереди и в работе
+    job_progress        = pyqtSignal(str, str)  # имя снимка, этап ("encode" / "write")
+    job_finished        = pyqtSignal(dict)      # имена файлов и задержки
+    job_failed          = pyqtSignal(str)       # текст ошибки
+
+    def __init__(self, results_dir, max_workers=2, max_pending_bytes=256 * 1024 * 1024, catalog=None):
+        super().__init__()
+        self.results_dir       = results_dir
+        self.catalog           = catalog   # ResultsCatalog: строка на каждый записанный результат
+        self.max_pending_bytes = max_pending_bytes
+        self.pending_bytes     = 0
+        self.pending_jobs      = 0
+        self.latencies         = deque(maxlen=100)  # (encode_time, write_time) последних заданий
+
+        self._condition = threading.Condition()
+        self._executor  = ThreadPoolExecutor(max_workers=max_workers,
+                                             thread_name_prefix="snapshot-writer")
+
+    def is_full(self):
+        """True, если очередь заняла весь допустимый объем памяти"""
+        with self._condition:
+            return self.pending_jobs > 0 and self.pending_bytes >= self.max_pending_bytes
+
+    def submit(self, job, helpers, timeout=None):
+        """
+        Ставит задание в очередь. Если лимит памяти исчерпан - ждет освобождения
+        (не более timeout секунд). Возвращает False, если место так и не освободилось.
+        """
+        with self._condition:
+            # Одно задание принимается всегда, даже если оно больше лимита
+            has_space = self._condition.wait_for(
+                lambda: self.pending_jobs == 0 or
+                        self.pending_bytes + job['nbytes'] <= self.max_pending_bytes,
+                timeout)
+            if not has_space:
+                return False
+
+            self.pending_bytes += job['nbytes']
+            self.pending_jobs  += 1
+            depth = self.pending_jobs
+
+        self.queue_depth_changed.emit(depth)
+        self._executor.submit(self._run_job, job, helpers)
+        return True
+
+    def _run_job(self, job, helpers):
+        try:
+            # Задание может указать свою функцию записи (например, результат накопления)
+            write_function = job.get('write_function', write_snapshot_job)
+            result = write_function(job, helpers, self.results_dir,
+                                    progress_callback=self.job_progress.emit)
+            self.latencies.append((result['encode_time'], result['write_time']))
+            self._add_to_catalog(result)
+            print(f"Snapshot written: encode {result['encode_time'] * 1000:.0f} ms, "
+                  f"write {result['write_time'] * 1000:.0f} ms")
+            self.job_finished.emit(result)
+
+        except Exception as e:
+            print(f"ERROR during image saving: {e}")
+            traceback.print_exc() # Печать tb стека
+            self.job_failed.emit(str(e))
+
+        finally:
+            with self._condition:
+                self.pending_bytes -= job['nbytes']
+                self.pending_jobs  -= 1
+                depth = self.pending_jobs
+                self._condition.notify_all()
+            self.queue_depth_changed.emit(depth)
+
+    def _add_to_catalog(self, result):
+        """Запись в каталог; ошибка каталога не отменяет записанный результат"""
+        if self.catalog is None:
+            return
+        try:
+            self.catalog.add_sidecar(result['metadata'])
+        except Exception as e:
+            print(f"Error adding {result['metadata']} to the results catalog: {e}")
+
+    def shutdown(self, wait=True):
+        """Дожидается записи оставшихся снимков и останавливает пул"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,92 @@
+# spectrometer_app/core/spectrum.py
+
+import numpy as np
+
+try:
+    from utils.config import DEFAULT_SETTINGS
+except ImportError: # Fallback for running script directly
+    from spectrometer_app.utils.config import DEFAULT_SETTINGS
+
+
+# Веса каналов (порядок R, G, B) для свертки полосы в одномерный профиль
+CHANNEL_WEIGHTS = {
+    'luminance': (0.299, 0.587, 0.114),   # яркость по ITU-R BT.601
+    'sum':       (1.0, 1.0, 1.0),
+    'red':       (1.0, 0.0, 0.0),
+    'green':     (0.0, 1.0, 0.0),
+    'blue':      (0.0, 0.0, 1.0),
+}
+
+SPECTRUM_MODES = ('mean', 'sum')
+
+
+class SpectrumExtractor:
+    """
+    Извлечение одномерного спектра (интенсивность вдоль оси дисперсии = столбцы кадра)
+    из горизонтальной полосы строк (ROI).
+
+    roi_center, roi_height - центр и высота полосы в долях высоты кадра,
+    поэтому одна и та же настройка подходит для превью, снимков и файлов.
+    mode      - 'mean' (среднее по строкам) или 'sum';
+    weighting - ключ CHANNEL_WEIGHTS или кортеж весов (R, G, B).
+    """
+
+    def __init__(self, roi_center=0.5, roi_height=0.05, mode='mean', weighting='luminance',
+                 channel_order='rgb'):
+        if mode not in SPECTRUM_MODES:
+            raise ValueError(f"Unknown spectrum mode: {mode}")
+
+        self.roi_center = min(1.0, max(0.0, float(roi_center)))
+        self.roi_height = min(1.0, max(0.0, float(roi_height)))
+        self.mode       = mode
+        self.weighting  = weighting
+
+        weights = CHANNEL_WEIGHTS[weighting] if isinstance(weighting, str) else weighting
+        weights = np.asarray(weights, dtype=np.float32)
+        if channel_order == 'bgr':
+            weights = weights[::-1]
+        self.weights = np.ascontiguousarray(weights)
+
+        self._columns = None   # буфер суммы по строкам, переиспользуется между кадрами
+
+    @classmethod
+    def from_settings(cls, settings, channel_order='rgb'):
+        """Создание из словаря настроек приложения (current_settings)"""
+        return cls(roi_center=settings.get('roi_center', DEFAULT_SETTINGS['roi_center']),
+                   roi_height=settings.get('roi_height', DEFAULT_SETTINGS['roi_height']),
+                   mode=settings.get('spectrum_mode', DEFAULT_SETTINGS['spectrum_mode']),
+                   weighting=settings.get('spectrum_weighting', DEFAULT_SETTINGS['spectrum_weighting']),
+                   channel_order=channel_order)
+
+    def roi_rows(self, frame_height):
+        """Границы полосы строк [start, stop) для кадра заданной высоты (минимум одна строка)"""
+        rows  = max(1, int(round(self.roi_height * frame_height)))
+        start = int(round(self.roi_center * frame_height - rows / 2))
+        start = min(max(0, start), frame_height - rows)
+        return start, start + rows
+
+    def extract_band(self, band):
+        """Профиль по уже вырезанной полосе (строки x столбцы [x каналы])"""
+        rows = band.shape[0]
+        column_shape = band.shape[1:]
+
+        if self._columns is None or self._columns.shape != column_shape:
+            self._columns = np.empty(column_shape, dtype=np.float32)
+
+        # Сначала сумма по строкам (одна операция над полосой), затем
+        # свертка каналов - она выполняется уже над одной строкой
+        np.sum(band, axis=0, dtype=np.float32, out=self._columns)
+
+        if self._columns.ndim == 2:
+            spectrum = self._columns[:, :len(self.weights)] @ self.weights
+        else:
+            spectrum = self._columns.copy()   # монохромный кадр
+
+        if self.mode == 'mean':
+            spectrum *= 1.0 / rows
+        return spectrum
+
+    def extract(self, frame):
+        """Одномерный спектр кадра (float32, длина = ширина кадра)"""
+        start, stop = self.roi_rows(frame.shape[0])
+        return self.extract_band(frame[start:stop])
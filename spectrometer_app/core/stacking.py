@@ -0,0 +1,164 @@
+# spectrometer_app/core/stacking.py
+
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+STACK_MODES = ('mean', 'sum', 'median', 'sigma_clip')
+
+
+class FrameStacker:
+    """
+    Накопление count последовательных кадров для слабых источников.
+
+    mean / sum   - сумма в заранее выделенном накопителе uint32 (для 8-битных
+                   кадров точна до 16 млн кадров), память O(один кадр);
+    median       - медиана по блокам из block_size кадров (сортирующая сеть),
+                   затем среднее медиан;
+    sigma_clip   - среднее с отбрасыванием выбросов (> sigma СКО) внутри блока.
+
+    Для блочных режимов кадры копируются в один из двух буферов блока;
+    заполненный блок сворачивается в фоновом потоке (NumPy отпускает GIL),
+    пока поток камеры заполняет второй буфер - так накопление успевает
+    за частотой кадров. Память O(2 * block_size кадров).
+    """
+
+    REDUCE_ROWS = 64   # строк за один шаг свертки блока (sigma_clip)
+
+    def __init__(self, count, mode='mean', block_size=16, sigma=3.0):
+        if mode not in STACK_MODES:
+            raise ValueError(f"Unknown stacking mode: {mode}")
+
+        self.count      = max(1, int(count))
+        self.mode       = mode
+        self.block_size = max(2, int(block_size))
+        self.sigma      = float(sigma)
+        self.added      = 0
+
+        self._sum     = None   # накопитель суммы (uint32 или float32)
+        self._weights = None   # число учтенных кадров на пиксель (sigma_clip) или блоков (median)
+        self._blocks  = None   # два буфера блока
+        self._block_index = 0  # текущий буфер
+        self._block_fill  = 0  # кадров в текущем буфере
+        self._pending     = None  # свертка предыдущего блока в фоне
+        self._executor    = None
+        self._lock        = threading.Lock()
+
+    @property
+    def blockwise(self):
+        return self.mode in ('median', 'sigma_clip')
+
+    def _allocate(self, frame):
+        if not self.blockwise:
+            self._sum = np.zeros(frame.shape, dtype=np.uint32 if frame.dtype.kind == 'u' else np.float32)
+            return
+
+        self._sum    = np.zeros(frame.shape, dtype=np.float32)
+        block_size   = min(self.block_size, self.count)
+        self._blocks = [np.empty((block_size,) + frame.shape, dtype=frame.dtype) for _ in range(2)]
+        if self.mode == 'sigma_clip':
+            self._weights = np.zeros(frame.shape, dtype=np.float32)
+        else:
+            self._weights = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frame-stacker")
+
+    def add(self, frame):
+        """Добавляет кадр, возвращает True, когда набрано count кадров"""
+        if self._sum is None:
+            self._allocate(frame)
+        elif self._sum.shape != frame.shape:
+            raise ValueError("Frame size changed during stacking")
+
+        if not self.blockwise:
+            np.add(self._sum, frame, out=self._sum, casting='unsafe')
+        else:
+            block = self._blocks[self._block_index]
+            np.copyto(block[self._block_fill], frame)
+            self._block_fill += 1
+            if self._block_fill == len(block):
+                self._submit_block(block, self._block_fill)
+
+        self.added += 1
+        return self.added >= self.count
+
+    def _submit_block(self, block, fill):
+        """Передает заполненный блок на свертку в фоне и переключает буфер"""
+        self._wait_pending()   # второй буфер ещё мог сворачиваться
+        self._pending = self._executor.submit(self._reduce_block, block, fill)
+        self._block_index = 1 - self._block_index
+        self._block_fill  = 0
+
+    def _wait_pending(self):
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    @staticmethod
+    def _median_network(frames):
+        """
+        Медиана по оси кадров сортирующей сетью (попарные min/max целых кадров).
+        Для небольших блоков это намного быстрее np.median по оси 0, так как
+        каждая операция идет по непрерывной памяти. Блок сортируется на месте.
+        """
+        count = frames.shape[0]
+        low = np.empty_like(frames[0])
+        for step in range(count):
+            for i in range(step % 2, count - 1, 2):
+                first, second = frames[i], frames[i + 1]
+                np.minimum(first, second, out=low)
+                np.maximum(first, second, out=second)
+                np.copyto(first, low)
+
+        if count % 2:
+            return frames[count // 2]
+        return (frames[count // 2 - 1].astype(np.float32) + frames[count // 2]) * 0.5
+
+    def _reduce_block(self, block, fill):
+        """Свертка заполненного блока (в фоновом потоке)"""
+        frames = block[:fill]
+        if self.mode == 'median':
+            median = self._median_network(frames)
+            with self._lock:
+                np.add(self._sum, median, out=self._sum, casting='unsafe')
+                self._weights += 1
+            return
+
+        # sigma_clip полосами строк, чтобы временные массивы были небольшими:
+        # среднее и СКО по блоку из суммы и суммы квадратов, выбросы вычитаются
+        for start in range(0, frames.shape[1], self.REDUCE_ROWS):
+            rows  = slice(start, start + self.REDUCE_ROWS)
+            chunk = frames[:, rows]
+            total   = chunk.sum(axis=0, dtype=np.float32)
+            squares = np.square(chunk, dtype=np.float32).sum(axis=0)
+            mean  = total / fill
+            limit = self.sigma * np.sqrt(np.maximum(squares / fill - mean * mean, 0)) + 1e-6
+            rejected = np.abs(chunk - mean) > limit
+            kept_sum   = total - np.where(rejected, chunk, 0).sum(axis=0, dtype=np.float32)
+            kept_count = fill - rejected.sum(axis=0, dtype=np.float32)
+            with self._lock:
+                np.add(self._sum[rows], kept_sum, out=self._sum[rows])
+                np.add(self._weights[rows], kept_count, out=self._weights[rows])
+
+    def result(self):
+        """Результат накопления в float32 (для sum - сумма, для остальных - среднее)"""
+        if self._sum is None:
+            raise ValueError("No frames stacked")
+
+        if self.blockwise:
+            if self._block_fill:
+                self._submit_block(self._blocks[self._block_index], self._block_fill)
+            self._wait_pending()
+            self._executor.shutdown(wait=False)
+            if self.mode == 'median':
+                return self._sum / max(1, self._weights)
+            return np.divide(self._sum, self._weights, out=np.zeros_like(self._sum), where=self._weights > 0)
+
+        if self.mode == 'sum':
+            return self._sum.astype(np.float32)
+        return np.multiply(self._sum, 1.0 / self.added, dtype=np.float32)
+
+    def cancel(self):
+        """Освобождает фоновый поток без вычисления результата"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
@@ -1,15 +1,43 @@
 # для объединения классов и функций в 1 модуль
 
 from .main_window import CameraApp
-from .dialogs import show_instruction_dialog, show_settings_dialog, apply_camera_settings, confirm_reset_settings
+from .dialogs import (show_instruction_dialog, show_settings_dialog, apply_camera_settings, confirm_reset_settings,
+                      show_spectrum_settings_dialog, apply_spectrum_settings,
+                      show_calibration_dialog, apply_calibration_settings, apply_wavelength_calibration,
+                      show_calibration_frames_dialog, apply_frame_correction,
+                      show_stacking_dialog, start_stacking, show_hdr_dialog, start_hdr, stop_hdr,
+                      start_auto_exposure,
+                      start_autofocus, apply_strip_mode, refresh_sensor_modes,
+                      show_scan_dialog, stop_scan, rebuild_results_catalog)
+from .spectrum_plot import SpectrumPlotWidget
 from .ui_setup import setup_styles, create_menu_bar, setup_video_panel, setup_control_panel, setup_snapshot_button, setup_lens_controls, setup_camera_controls, set_window_icon
 
 __all__ = [
     'CameraApp',
+    'SpectrumPlotWidget',
     'show_instruction_dialog',
     'show_settings_dialog',
     'apply_camera_settings', 
     'confirm_reset_settings',
+    'show_spectrum_settings_dialog',
+    'apply_spectrum_settings',
+    'show_calibration_dialog',
+    'apply_calibration_settings',
+    'apply_wavelength_calibration',
+    'show_calibration_frames_dialog',
+    'apply_frame_correction',
+    'show_stacking_dialog',
+    'start_stacking',
+    'show_hdr_dialog',
+    'start_hdr',
+    'stop_hdr',
+    'start_auto_exposure',
+    'start_autofocus',
+    'apply_strip_mode',
+    'refresh_sensor_modes',
+    'show_scan_dialog',
+    'stop_scan',
+    'rebuild_results_catalog',
     'setup_styles', 
     'create_menu_bar', 
     'setup_video_panel', 
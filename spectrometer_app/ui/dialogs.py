@@ -1,15 +1,27 @@
 # spectrometer_app/ui/dialogs.py
 
+import threading
+import numpy as np
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
-                             QGroupBox, QMessageBox, QComboBox, QSlider)
+                             QGroupBox, QMessageBox, QComboBox, QSlider, QTableWidget,
+                             QTableWidgetItem, QDoubleSpinBox, QHeaderView, QSpinBox, QCheckBox,
+                             QGridLayout)
 from PyQt5.QtCore import Qt
 
 try:
     from spectrometer_app.utils.config import DEFAULT_SETTINGS
     from utils.camera_settings_utils import get_awb_mode, get_exposure_mode
+    from core.calibration import WavelengthCalibration, detect_lines
+    from core.camera_thread import MAIN_STREAM_SIZE
+    from core.scan import ScanEngine
+    from core.scan_dataset import scan_points, scan_axis_positions
 except ImportError: # Fallback for running script directly
     from spectrometer_app.utils.config import DEFAULT_SETTINGS
     from spectrometer_app.utils.camera_settings_utils import get_awb_mode, get_exposure_mode
+    from spectrometer_app.core.calibration import WavelengthCalibration, detect_lines
+    from spectrometer_app.core.camera_thread import MAIN_STREAM_SIZE
+    from spectrometer_app.core.scan import ScanEngine
+    from spectrometer_app.core.scan_dataset import scan_points, scan_axis_positions
 
 
 def show_instruction_dialog(parent):
@@ -48,7 +60,7 @@ def show_settings_dialog(parent):
     dialog.setWindowTitle("Настройки камеры")
 
     # Фиксируем его размеры
-    dialog.setFixedSize(400, 500)
+    dialog.setFixedSize(400, 570)
 
     # Создаем вертикальный layout (компоновка) для основного содержимого
     layout = QVBoxLayout()
@@ -142,9 +154,27 @@ def show_settings_dialog(parent):
     exposure_layout.addWidget(widgets['exposure_combo'])
     exposure_group.setLayout(exposure_layout)
 
+    """
+    Группа ограничения частоты кадров превью
+    """
+    fps_group = QGroupBox("Частота кадров превью")
+    fps_layout = QVBoxLayout()
+    widgets['fps_combo'] = QComboBox()
+
+    # Варианты частоты (0 - без ограничения, кадры идут с частотой камеры)
+    for fps in [0, 30, 15, 10, 5, 1]:
+        widgets['fps_combo'].addItem("без ограничения" if fps == 0 else f"{fps} к/с", fps)
+
+    # Устанавливаем текущее значение
+    fps_index = widgets['fps_combo'].findData(parent.current_settings['target_fps'])
+    widgets['fps_combo'].setCurrentIndex(max(0, fps_index))
+    fps_layout.addWidget(widgets['fps_combo'])
+    fps_group.setLayout(fps_layout)
+
     # Добавляем все группы в основной layout
     layout.addWidget(awb_group)
     layout.addWidget(exposure_group)
+    layout.addWidget(fps_group)
 
     # Создаем layout для кнопок
     button_layout = QHBoxLayout()
@@ -178,7 +208,8 @@ def apply_camera_settings(parent, dialog, widgets):
             'saturation':    float(widgets['saturation_value'].text()),
             'sharpness':     float(widgets['sharpness_value'].text()),
             'awb_mode':      widgets['awb_combo'].currentText(),
-            'exposure_mode': widgets['exposure_combo'].currentText()
+            'exposure_mode': widgets['exposure_combo'].currentText(),
+            'target_fps':    int(widgets['fps_combo'].currentData())
         }
 
         # Обновляем настройки в родительском окне
@@ -206,6 +237,7 @@ def apply_camera_settings(parent, dialog, widgets):
                 'Saturation':     new_settings['saturation'],
                 'Sharpness':      new_settings['sharpness']
             })
+            parent.camera_thread.set_target_fps(new_settings['target_fps'])
         except Exception as e:
             QMessageBox.warning(parent, "Ошибка", f"Не удалось применить настройки: {e}")
 
@@ -232,7 +264,8 @@ def confirm_reset_settings(parent, widgets):
             'saturation':    DEFAULT_SETTINGS['saturation'],
             'sharpness':     DEFAULT_SETTINGS['sharpness'],
             'awb_mode':      DEFAULT_SETTINGS['awb_mode'],
-            'exposure_mode': DEFAULT_SETTINGS['exposure_mode']
+            'exposure_mode': DEFAULT_SETTINGS['exposure_mode'],
+            'target_fps':    DEFAULT_SETTINGS['target_fps']
         }
 
         # Обновляем настройки в родительском окне
@@ -245,6 +278,7 @@ def confirm_reset_settings(parent, widgets):
         widgets['sharpness_slider'].setValue(int(defaults_to_reset['sharpness'] * 100))
         widgets['awb_combo'].setCurrentText(defaults_to_reset['awb_mode'])
         widgets['exposure_combo'].setCurrentText(defaults_to_reset['exposure_mode'])
+        widgets['fps_combo'].setCurrentIndex(max(0, widgets['fps_combo'].findData(defaults_to_reset['target_fps'])))
 
         # Применяем настройки по умолчанию к камере
         if parent.camera_connected and parent.camera_thread and hasattr(parent.camera_thread, 'camera'):
@@ -261,5 +295,728 @@ def confirm_reset_settings(parent, widgets):
                     'Saturation':     DEFAULT_SETTINGS['saturation'],
                     'Sharpness':      DEFAULT_SETTINGS['sharpness']
                 })
+                parent.camera_thread.set_target_fps(DEFAULT_SETTINGS['target_fps'])
             except Exception as e:
-                QMessageBox.warning(parent, "Ошибка", f"Не удалось сбросить настройки: {e}")
\ No newline at end of file
+                QMessageBox.warning(parent, "Ошибка", f"Не удалось сбросить настройки: {e}")
+
+def show_spectrum_settings_dialog(parent):
+    """ Выводит диалоговое окно настройки извлечения спектра (ROI и веса каналов) """
+
+    dialog = QDialog(parent)
+    dialog.setWindowTitle("Настройки спектра")
+    dialog.setFixedSize(400, 450)
+    layout = QVBoxLayout()
+    widgets = {}
+
+    # Положение и высота полосы задаются в процентах высоты кадра
+    for key, name, min_val in [('roi_center', 'Центр полосы, % высоты кадра', 0),
+                               ('roi_height', 'Высота полосы, % высоты кадра', 1)]:
+        group = QGroupBox(name)
+        h_layout = QHBoxLayout()
+
+        widgets[f'{key}_slider'] = QSlider(Qt.Horizontal)
+        widgets[f'{key}_slider'].setRange(min_val, 100)
+        widgets[f'{key}_slider'].setValue(int(round(parent.current_settings[key] * 100)))
+        h_layout.addWidget(widgets[f'{key}_slider'])
+
+        widgets[f'{key}_value'] = QLabel(f"{parent.current_settings[key] * 100:.0f}")
+        h_layout.addWidget(widgets[f'{key}_value'])
+        group.setLayout(h_layout)
+
+        widgets[f'{key}_slider'].valueChanged.connect(lambda v, l=widgets[f'{key}_value']: l.setText(str(v)))
+        layout.addWidget(group)
+
+    # Суммирование или усреднение строк полосы
+    mode_group = QGroupBox("Обработка строк полосы")
+    mode_layout = QVBoxLayout()
+    widgets['mode_combo'] = QComboBox()
+    widgets['mode_combo'].addItem("среднее", 'mean')
+    widgets['mode_combo'].addItem("сумма", 'sum')
+    widgets['mode_combo'].setCurrentIndex(max(0, widgets['mode_combo'].findData(parent.current_settings['spectrum_mode'])))
+    mode_layout.addWidget(widgets['mode_combo'])
+    mode_group.setLayout(mode_layout)
+    layout.addWidget(mode_group)
+
+    # Веса каналов
+    weighting_group = QGroupBox("Каналы")
+    weighting_layout = QVBoxLayout()
+    widgets['weighting_combo'] = QComboBox()
+    for value, name in [('luminance', "яркость"), ('sum', "сумма каналов"),
+                        ('red', "красный"), ('green', "зеленый"), ('blue', "синий")]:
+        widgets['weighting_combo'].addItem(name, value)
+    widgets['weighting_combo'].setCurrentIndex(
+        max(0, widgets['weighting_combo'].findData(parent.current_settings['spectrum_weighting'])))
+    weighting_layout.addWidget(widgets['weighting_combo'])
+    weighting_group.setLayout(weighting_layout)
+    layout.addWidget(weighting_group)
+
+    # Источник кадра: после ISP или сырые данные сенсора (линейная интенсивность)
+    source_group = QGroupBox("Данные для спектра")
+    source_layout = QVBoxLayout()
+    widgets['source_combo'] = QComboBox()
+    for value, name in [('isp', "обработанный кадр (ISP)"), ('raw_rgb', "сырые данные, каналы R/G/B"),
+                        ('raw_mono', "сырые данные, монохромное бинирование")]:
+        widgets['source_combo'].addItem(name, value)
+    widgets['source_combo'].setCurrentIndex(
+        max(0, widgets['source_combo'].findData(parent.current_settings['analysis_source'])))
+    source_layout.addWidget(widgets['source_combo'])
+    source_group.setLayout(source_layout)
+    layout.addWidget(source_group)
+
+    # Кнопки
+    button_layout = QHBoxLayout()
+    apply_btn = QPushButton("Применить")
+    apply_btn.clicked.connect(lambda: apply_spectrum_settings(parent, dialog, widgets))
+    cancel_btn = QPushButton("Отмена")
+    cancel_btn.clicked.connect(dialog.reject)
+    button_layout.addWidget(apply_btn)
+    button_layout.addWidget(cancel_btn)
+    layout.addLayout(button_layout)
+
+    dialog.setLayout(layout)
+    dialog.exec_()
+
+
+def apply_spectrum_settings(parent, dialog, widgets):
+    """ Функция для применения настроек извлечения спектра """
+
+    parent.current_settings.update({
+        'roi_center':         widgets['roi_center_slider'].value() / 100.0,
+        'roi_height':         widgets['roi_height_slider'].value() / 100.0,
+        'spectrum_mode':      widgets['mode_combo'].currentData(),
+        'spectrum_weighting': widgets['weighting_combo'].currentData(),
+        'analysis_source':    widgets['source_combo'].currentData()
+    })
+
+    if parent.camera_thread:
+        parent.camera_thread.set_spectrum_settings(parent.current_settings.copy())
+        parent.camera_thread.set_analysis_source(parent.current_settings['analysis_source'],
+                                                 parent.current_settings.copy())
+
+    dialog.accept()
+
+
+def show_calibration_dialog(parent):
+    """ Выводит диалоговое окно калибровки пиксель -> длина волны по опорным линиям """
+
+    dialog = QDialog(parent)
+    dialog.setWindowTitle("Калибровка длин волн")
+    dialog.setFixedSize(420, 520)
+    layout = QVBoxLayout()
+    widgets = {}
+
+    current = WavelengthCalibration.from_json(parent.current_settings.get('calibration', ''))
+
+    # Таблица опорных линий: положение в пикселях и известная длина волны
+    lines_group = QGroupBox("Опорные линии")
+    lines_layout = QVBoxLayout()
+    widgets['table'] = QTableWidget(8, 2)
+    widgets['table'].setHorizontalHeaderLabels(["Пиксель", "Длина волны, нм"])
+    widgets['table'].horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+    if current is not None:
+        widgets['table'].setRowCount(max(8, len(current.pixels)))
+        for row, (pixel, nm) in enumerate(zip(current.pixels, current.wavelengths)):
+            widgets['table'].setItem(row, 0, QTableWidgetItem(f"{pixel:.2f}"))
+            widgets['table'].setItem(row, 1, QTableWidgetItem(f"{nm:.3f}"))
+    lines_layout.addWidget(widgets['table'])
+
+    # Поиск ярких линий в текущем спектре (заполняет столбец пикселей)
+    detect_btn = QPushButton("Найти линии в текущем спектре")
+    detect_btn.clicked.connect(lambda: fill_detected_lines(parent, widgets))
+    lines_layout.addWidget(detect_btn)
+    lines_group.setLayout(lines_layout)
+    layout.addWidget(lines_group)
+
+    # Параметры полинома и сетки
+    fit_group = QGroupBox("Аппроксимация")
+    fit_layout = QHBoxLayout()
+    fit_layout.addWidget(QLabel("Степень:"))
+    widgets['degree_combo'] = QComboBox()
+    for degree in (1, 2, 3):
+        widgets['degree_combo'].addItem(str(degree), degree)
+    widgets['degree_combo'].setCurrentIndex(
+        max(0, widgets['degree_combo'].findData(current.degree if current else 2)))
+    fit_layout.addWidget(widgets['degree_combo'])
+
+    fit_layout.addWidget(QLabel("Шаг, нм:"))
+    widgets['step_spin'] = QDoubleSpinBox()
+    widgets['step_spin'].setRange(0.0, 10.0)
+    widgets['step_spin'].setDecimals(3)
+    widgets['step_spin'].setSpecialValueText("авто")   # 0 - шаг по дисперсии
+    widgets['step_spin'].setValue((current.step_nm or 0.0) if current else 0.0)
+    fit_layout.addWidget(widgets['step_spin'])
+    fit_group.setLayout(fit_layout)
+    layout.addWidget(fit_group)
+
+    widgets['status_label'] = QLabel(
+        f"Текущая калибровка: СКО {current.rms_error():.3f} нм" if current else "Калибровка не задана")
+    layout.addWidget(widgets['status_label'])
+
+    # Кнопки
+    button_layout = QHBoxLayout()
+    apply_btn = QPushButton("Применить")
+    apply_btn.clicked.connect(lambda: apply_calibration_settings(parent, dialog, widgets))
+    clear_btn = QPushButton("Сбросить")
+    clear_btn.clicked.connect(lambda: (apply_wavelength_calibration(parent, None), dialog.accept()))
+    cancel_btn = QPushButton("Отмена")
+    cancel_btn.clicked.connect(dialog.reject)
+    button_layout.addWidget(apply_btn)
+    button_layout.addWidget(clear_btn)
+    button_layout.addWidget(cancel_btn)
+    layout.addLayout(button_layout)
+
+    dialog.setLayout(layout)
+    dialog.exec_()
+
+
+def fill_detected_lines(parent, widgets):
+    """ Заполняет столбец пикселей положениями найденных линий """
+
+    spectrum = parent.camera_thread.last_spectrum if parent.camera_thread else None
+    if spectrum is None:
+        QMessageBox.warning(parent, "Ошибка", "Нет спектра с камеры")
+        return
+
+    table = widgets['table']
+    lines = detect_lines(spectrum, count=table.rowCount())
+    for row in range(table.rowCount()):
+        text = f"{lines[row]:.2f}" if row < len(lines) else ""
+        table.setItem(row, 0, QTableWidgetItem(text))
+    widgets['status_label'].setText(f"Найдено линий: {len(lines)}, введите их длины волн")
+
+
+def apply_calibration_settings(parent, dialog, widgets):
+    """ Функция для расчета и применения калибровки по таблице опорных линий """
+
+    pixels, wavelengths = [], []
+    table = widgets['table']
+    for row in range(table.rowCount()):
+        items = [table.item(row, column) for column in (0, 1)]
+        texts = [item.text().strip().replace(',', '.') if item else "" for item in items]
+        if not texts[0] or not texts[1]:
+            continue                    # незаполненные строки пропускаются
+        try:
+            pixels.append(float(texts[0]))
+            wavelengths.append(float(texts[1]))
+        except ValueError:
+            QMessageBox.warning(parent, "Ошибка", f"Некорректное число в строке {row + 1}")
+            return
+
+    try:
+        calibration = WavelengthCalibration(pixels, wavelengths,
+                                            degree=widgets['degree_combo'].currentData(),
+                                            step_nm=widgets['step_spin'].value())
+        calibration.prepare(MAIN_STREAM_SIZE[0])
+    except (ValueError, TypeError, np.linalg.LinAlgError) as e:
+        QMessageBox.warning(parent, "Ошибка", f"Не удалось построить калибровку: {e}")
+        return
+
+    apply_wavelength_calibration(parent, calibration)
+    QMessageBox.information(parent, "Калибровка",
+                            f"Калибровка применена, СКО {calibration.rms_error():.3f} нм")
+    dialog.accept()
+
+
+def apply_wavelength_calibration(parent, calibration):
+    """ Применяет калибровку (или None) к потоку камеры и графику и сохраняет в QSettings """
+
+    if calibration is not None:
+        try:
+            calibration.prepare(MAIN_STREAM_SIZE[0])
+        except ValueError as e:
+            print(f"Wavelength calibration rejected: {e}")
+            calibration = None
+
+    parent.current_settings['calibration'] = calibration.to_json() if calibration else ''
+    parent.settings.setValue('calibration', parent.current_settings['calibration'])
+
+    if parent.camera_thread:
+        parent.camera_thread.set_calibration(calibration)
+    parent.spectrum_plot.set_wavelength_range(calibration.wavelength_range() if calibration else None)
+
+
+def show_calibration_frames_dialog(parent):
+    """ Выводит диалоговое окно записи темновых/плоских кадров и включения коррекции """
+
+    dialog = QDialog(parent)
+    dialog.setWindowTitle("Калибровочные кадры")
+    dialog.setFixedSize(400, 300)
+    layout = QVBoxLayout()
+
+    # Число кадров для усреднения
+    count_group = QGroupBox("Число кадров для мастер-кадра")
+    count_layout = QHBoxLayout()
+    count_spin = QSpinBox()
+    count_spin.setRange(1, 1000)
+    count_spin.setValue(16)
+    count_layout.addWidget(count_spin)
+    count_group.setLayout(count_layout)
+    layout.addWidget(count_group)
+
+    # Запись: выдержка и настройки изображения должны совпадать с рабочими
+    record_group = QGroupBox("Запись (при текущей выдержке и настройках)")
+    record_layout = QVBoxLayout()
+    dark_btn = QPushButton("Записать темновые кадры (закройте объектив)")
+    dark_btn.clicked.connect(lambda: record_calibration_frames(parent, 'dark', count_spin.value()))
+    flat_btn = QPushButton("Записать плоские кадры (равномерная засветка)")
+    flat_btn.clicked.connect(lambda: record_calibration_frames(parent, 'flat', count_spin.value()))
+    record_layout.addWidget(dark_btn)
+    record_layout.addWidget(flat_btn)
+    record_group.setLayout(record_layout)
+    layout.addWidget(record_group)
+
+    correction_check = QCheckBox("Применять коррекцию к превью, спектру и снимкам")
+    correction_check.setChecked(bool(parent.current_settings['frame_correction']))
+    correction_check.toggled.connect(lambda checked: apply_frame_correction(parent, checked))
+    layout.addWidget(correction_check)
+
+    close_btn = QPushButton("Закрыть")
+    close_btn.clicked.connect(dialog.accept)
+    layout.addWidget(close_btn)
+
+    dialog.setLayout(layout)
+    dialog.exec_()
+
+
+def record_calibration_frames(parent, kind, count):
+    """ Запускает запись темновых или плоских кадров в потоке камеры """
+
+    if not parent.camera_connected or not parent.camera_thread:
+        QMessageBox.warning(parent, "Ошибка", "Камера не подключена или поток не запущен!")
+        return
+    parent.camera_thread.record_calibration_frames(kind, count, parent.current_settings.copy())
+
+
+def apply_frame_correction(parent, enabled):
+    """ Включает/выключает коррекцию темновым и плоским кадрами """
+
+    parent.current_settings['frame_correction'] = bool(enabled)
+    parent.settings.setValue('frame_correction', bool(enabled))
+    if parent.camera_thread:
+        parent.camera_thread.set_frame_correction(enabled)
+
+
+def handle_calibration_frames_progress(parent, kind, added, count):
+    """ Отображение хода записи калибровочных кадров """
+
+    names = {'dark': "темновых", 'flat': "плоских"}
+    parent.statusBar().showMessage(f"Запись {names.get(kind, kind)} кадров: {added}/{count}")
+
+
+def handle_calibration_frames_ready(parent, result):
+    """ Мастер-кадр построен (или запись не удалась) """
+
+    names = {'dark': "Темновой", 'flat': "Плоский"}
+    if result.get('path') is None:
+        QMessageBox.warning(parent, "Ошибка", f"Не удалось записать калибровочные кадры: {result.get('error')}")
+        return
+    parent.statusBar().showMessage(
+        f"{names.get(result['kind'], result['kind'])} мастер-кадр по {result['count']} кадрам сохранен")
+
+
+def show_stacking_dialog(parent):
+    """ Выводит диалоговое окно накопления кадров для слабых источников """
+
+    dialog = QDialog(parent)
+    dialog.setWindowTitle("Накопление кадров")
+    dialog.setFixedSize(360, 230)
+    layout = QVBoxLayout()
+    widgets = {}
+
+    count_group = QGroupBox("Число кадров")
+    count_layout = QHBoxLayout()
+    widgets['count_spin'] = QSpinBox()
+    widgets['count_spin'].setRange(2, 10000)
+    widgets['count_spin'].setValue(int(parent.current_settings['stack_count']))
+    count_layout.addWidget(widgets['count_spin'])
+    count_group.setLayout(count_layout)
+    layout.addWidget(count_group)
+
+    mode_group = QGroupBox("Способ накопления")
+    mode_layout = QVBoxLayout()
+    widgets['mode_combo'] = QComboBox()
+    for value, name in [('mean', "среднее"), ('sum', "сумма"),
+                        ('median', "медиана по блокам"), ('sigma_clip', "среднее с отсечением выбросов")]:
+        widgets['mode_combo'].addItem(name, value)
+    widgets['mode_combo'].setCurrentIndex(
+        max(0, widgets['mode_combo'].findData(parent.current_settings['stack_mode'])))
+    mode_layout.addWidget(widgets['mode_combo'])
+    mode_group.setLayout(mode_layout)
+    layout.addWidget(mode_group)
+
+    button_layout = QHBoxLayout()
+    start_btn = QPushButton("Начать")
+    start_btn.clicked.connect(lambda: start_stacking(parent, dialog, widgets))
+    cancel_btn = QPushButton("Отмена")
+    cancel_btn.clicked.connect(dialog.reject)
+    button_layout.addWidget(start_btn)
+    button_layout.addWidget(cancel_btn)
+    layout.addLayout(button_layout)
+
+    dialog.setLayout(layout)
+    dialog.exec_()
+
+
+def start_stacking(parent, dialog, widgets):
+    """ Запускает накопление кадров в потоке камеры """
+
+    if not parent.camera_connected or not parent.camera_thread:
+        QMessageBox.warning(parent, "Ошибка", "Камера не подключена или поток не запущен!")
+        return
+
+    parent.current_settings['stack_count'] = widgets['count_spin'].value()
+    parent.current_settings['stack_mode']  = widgets['mode_combo'].currentData()
+    parent.camera_thread.start_stacking(parent.current_settings['stack_count'],
+                                        parent.current_settings['stack_mode'],
+                                        parent.current_settings.copy())
+    dialog.accept()
+
+
+def handle_stack_progress(parent, added, count):
+    """ Отображение хода накопления кадров """
+
+    parent.statusBar().showMessage(f"Накопление кадров: {added}/{count}")
+
+
+def handle_stack_finished(parent, result):
+    """ Накопление завершено: результат передан в очередь записи """
+
+    if 'error' in result:
+        QMessageBox.warning(parent, "Ошибка", f"Накопление кадров не удалось: {result['error']}")
+        return
+    parent.statusBar().showMessage(
+        f"Накоплено {result['count']} кадров ({result['mode']}) за {result['elapsed']:.1f} с "
+        f"({result['fps']:.1f} кадр/с), идет запись...")
+
+
+def show_hdr_dialog(parent):
+    """ Выводит диалоговое окно HDR-серии выдержек (сильные и слабые линии в одном спектре) """
+
+    dialog = QDialog(parent)
+    dialog.setWindowTitle("HDR-серия выдержек")
+    dialog.setFixedSize(360, 250)
+    layout = QVBoxLayout()
+    widgets = {}
+
+    range_group = QGroupBox("Выдержки")
+    range_layout = QVBoxLayout()
+    for key, label, minimum, maximum, decimals in [('hdr_min_exposure', "Самая короткая, с", 0.0001, 100.0, 4),
+                                                   ('hdr_max_exposure', "Самая длинная, с", 0.0001, 200.0, 4),
+                                                   ('hdr_factor', "Шаг (отношение выдержек)", 1.1, 64.0, 1)]:
+        row = QHBoxLayout()
+        row.addWidget(QLabel(label))
+        spin = QDoubleSpinBox()
+        spin.setDecimals(decimals)
+        spin.setRange(minimum, maximum)
+        spin.setValue(float(parent.current_settings[key]))
+        row.addWidget(spin)
+        range_layout.addLayout(row)
+        widgets[key] = spin
+    range_group.setLayout(range_layout)
+    layout.addWidget(range_group)
+
+    note = QLabel("Слияние по выдержке выполняется по сырому потоку (линейные данные).")
+    note.setWordWrap(True)
+    layout.addWidget(note)
+
+    button_layout = QHBoxLayout()
+    start_btn = QPushButton("Начать")
+    start_btn.clicked.connect(lambda: start_hdr(parent, dialog, widgets))
+    cancel_btn = QPushButton("Отмена")
+    cancel_btn.clicked.connect(dialog.reject)
+    button_layout.addWidget(start_btn)
+    button_layout.addWidget(cancel_btn)
+    layout.addLayout(button_layout)
+
+    dialog.setLayout(layout)
+    dialog.exec_()
+
+
+def start_hdr(parent, dialog, widgets):
+    """ Запускает HDR-серию в потоке камеры """
+
+    if not parent.camera_connected or not parent.camera_thread:
+        QMessageBox.warning(parent, "Ошибка", "Камера не подключена или поток не запущен!")
+        return
+
+    for key, spin in widgets.items():
+        parent.current_settings[key] = spin.value()
+    if parent.current_settings['hdr_max_exposure'] < parent.current_settings['hdr_min_exposure']:
+        QMessageBox.warning(parent, "Ошибка", "Самая длинная выдержка меньше самой короткой!")
+        return
+    parent.camera_thread.start_hdr(parent.current_settings.copy())
+    dialog.accept()
+
+
+def stop_hdr(parent):
+    """ Прерывает HDR-серию, выдержка видеорежима восстанавливается """
+
+    if parent.camera_thread:
+        parent.camera_thread.cancel_hdr()
+        parent.statusBar().showMessage("HDR-серия остановлена")
+
+
+def handle_hdr_progress(parent, captured, count):
+    """ Отображение хода HDR-серии """
+
+    parent.statusBar().showMessage(f"HDR-серия: снято {captured}/{count} кадров")
+
+
+def handle_hdr_finished(parent, result):
+    """ HDR-серия завершена: объединенный спектр передан в очередь записи """
+
+    if 'error' in result:
+        QMessageBox.warning(parent, "Ошибка", f"HDR-серия не удалась: {result['error']}")
+        return
+    message = (f"HDR-серия: {result['count']} кадров ({result['exposures'][0]:g}-"
+               f"{result['exposures'][-1]:g} с) за {result['elapsed']:.1f} с, идет запись...")
+    if result['clipped'] > 0:
+        message += f" Насыщено при самой короткой выдержке: {result['clipped'] * 100:.2f}% пикселей"
+    parent.statusBar().showMessage(message)
+
+
+def start_auto_exposure(parent):
+    """ Запускает автоэкспозицию по пику спектра в потоке камеры """
+
+    if not parent.camera_connected or not parent.camera_thread:
+        QMessageBox.warning(parent, "Ошибка", "Камера не подключена или поток не запущен!")
+        return
+    parent.statusBar().showMessage("Автоэкспозиция по спектру...")
+    parent.camera_thread.start_auto_exposure(parent.current_settings.copy())
+
+
+def handle_auto_exposure_finished(parent, result):
+    """ Итог автоэкспозиции: выдержка, число итераций и время """
+
+    if 'error' in result:
+        QMessageBox.warning(parent, "Ошибка", f"Автоэкспозиция не удалась: {result['error']}")
+        return
+    if result['saturated']:
+        QMessageBox.warning(parent, "Автоэкспозиция",
+                            "Спектр насыщен даже при минимальной выдержке, уменьшите освещенность.")
+        return
+    parent.statusBar().showMessage(
+        f"Выдержка {result['exposure']:.3f} с, пик {result['peak'] * 100:.0f}% шкалы "
+        f"({result['iterations']} итераций за {result['elapsed']:.2f} с)")
+
+
+def start_autofocus(parent):
+    """ Запускает автофокус по резкости линий спектра в потоке камеры """
+
+    if not parent.camera_connected or not parent.camera_thread:
+        QMessageBox.warning(parent, "Ошибка", "Камера не подключена или поток не запущен!")
+        return
+    parent.statusBar().showMessage("Автофокус по спектру...")
+    parent.camera_thread.start_autofocus()
+
+
+def handle_autofocus_finished(parent, result):
+    """ Итог автофокуса: фокус, число кадров и время """
+
+    if 'error' in result:
+        QMessageBox.warning(parent, "Ошибка", f"Автофокус не удался: {result['error']}")
+        return
+    parent.statusBar().showMessage(
+        f"Фокус {result['focus']} мм (LensPosition {result['lens_position']:.2f}), "
+        f"{result['iterations']} кадров за {result['elapsed']:.2f} с")
+
+
+def apply_strip_mode(parent, enabled):
+    """ Включает/выключает режим полосы спектра (камера перенастраивается) """
+
+    parent.current_settings['strip_mode'] = bool(enabled)
+    parent.settings.setValue('strip_mode', bool(enabled))
+    if parent.camera_thread:
+        parent.camera_thread.set_strip_mode(enabled, parent.current_settings.copy())
+
+
+def refresh_sensor_modes(parent):
+    """ Повторный опрос режимов сенсора (после смены камеры или обновления ПО) """
+
+    if not parent.camera_connected or not parent.camera_thread:
+        QMessageBox.warning(parent, "Ошибка", "Камера не подключена или поток не запущен!")
+        return
+    parent.statusBar().showMessage("Опрос режимов сенсора...")
+    parent.camera_thread.refresh_sensor_modes(parent.current_settings.copy())
+
+
+def handle_frame_rate_measured(parent, report):
+    """ Фактическая частота кадров режима (и ранее измеренная в другом режиме) """
+
+    width, height = report['size']
+    if report['mode'] == 'strip':
+        sensor_w, sensor_h = report['sensor_mode']
+        text = (f"Полоса спектра {width}x{height} (режим сенсора {sensor_w}x{sensor_h}): "
+                f"{report['fps']:.1f} кадр/с из {report['max_fps']:.1f}")
+        if 'full' in report['modes']:
+            text += f", полный кадр: {report['modes']['full']:.1f} кадр/с"
+    else:
+        text = f"Полный кадр {width}x{height}: {report['fps']:.1f} кадр/с"
+        if 'sensor_mode' in report:
+            sensor_w, sensor_h = report['sensor_mode']
+            text += f" (режим сенсора {sensor_w}x{sensor_h}, до {report['max_fps']:.1f})"
+        if 'strip' in report['modes']:
+            text += f", полоса спектра: {report['modes']['strip']:.1f} кадр/с"
+    if report['fps'] * report['exposure'] > 0.9:
+        text += " (ограничено выдержкой)"
+    parent.statusBar().showMessage(text)
+
+
+def show_scan_dialog(parent):
+    """ Выводит диалоговое окно сканирования по положениям линзы и камеры """
+
+    if getattr(parent, 'scan_engine', None) is not None and parent.scan_engine.is_running():
+        QMessageBox.information(parent, "Сканирование", "Сканирование уже выполняется.")
+        return
+
+    dialog = QDialog(parent)
+    dialog.setWindowTitle("Сканирование")
+    dialog.setFixedSize(420, 330)
+    layout = QVBoxLayout()
+    widgets = {}
+
+    range_group = QGroupBox("Положения, мм")
+    range_layout = QGridLayout()
+    for column, title in enumerate(["", "Начало", "Конец", "Шаг"]):
+        range_layout.addWidget(QLabel(title), 0, column)
+    for row, (axis, title) in enumerate([('lens1', "Линза"), ('lens2', "Камера")], start=1):
+        range_layout.addWidget(QLabel(title), row, 0)
+        current = float(parent.current_settings[f"{axis}_pos"])
+        for column, (name, value) in enumerate([('start', current), ('stop', current), ('step', 1.0)], start=1):
+            spin = QDoubleSpinBox()
+            spin.setRange(0.0 if name == 'step' else -10000.0, 10000.0)
+            spin.setDecimals(2)
+            spin.setValue(value)
+            widgets[f"{axis}_{name}"] = spin
+            range_layout.addWidget(spin, row, column)
+    range_group.setLayout(range_layout)
+    layout.addWidget(range_group)
+
+    mode_group = QGroupBox("Порядок точек")
+    mode_layout = QVBoxLayout()
+    widgets['mode_combo'] = QComboBox()
+    widgets['mode_combo'].addItem("все сочетания (змейкой)", 'grid')
+    widgets['mode_combo'].addItem("попарно", 'paired')
+    mode_layout.addWidget(widgets['mode_combo'])
+    mode_group.setLayout(mode_layout)
+    layout.addWidget(mode_group)
+
+    capture_layout = QHBoxLayout()
+    capture_layout.addWidget(QLabel("Успокоение, с"))
+    widgets['settle_spin'] = QDoubleSpinBox()
+    widgets['settle_spin'].setRange(0.0, 10.0)
+    widgets['settle_spin'].setSingleStep(0.05)
+    widgets['settle_spin'].setValue(float(parent.current_settings['scan_settle']))
+    capture_layout.addWidget(widgets['settle_spin'])
+    widgets['frames_check'] = QCheckBox("Сохранять кадры")
+    widgets['frames_check'].setChecked(bool(parent.current_settings['scan_save_frames']))
+    capture_layout.addWidget(widgets['frames_check'])
+    layout.addLayout(capture_layout)
+
+    button_layout = QHBoxLayout()
+    start_btn = QPushButton("Начать")
+    start_btn.clicked.connect(lambda: start_scan(parent, dialog, widgets))
+    cancel_btn = QPushButton("Отмена")
+    cancel_btn.clicked.connect(dialog.reject)
+    button_layout.addWidget(start_btn)
+    button_layout.addWidget(cancel_btn)
+    layout.addLayout(button_layout)
+
+    dialog.setLayout(layout)
+    dialog.exec_()
+
+
+def start_scan(parent, dialog, widgets):
+    """ Строит точки сканирования и запускает ScanEngine """
+
+    if not parent.camera_connected or not parent.camera_thread:
+        QMessageBox.warning(parent, "Ошибка", "Камера не подключена или поток не запущен!")
+        return
+
+    try:
+        positions = {axis: scan_axis_positions(widgets[f"{axis}_start"].value(),
+                                               widgets[f"{axis}_stop"].value(),
+                                               widgets[f"{axis}_step"].value())
+                     for axis in ('lens1', 'lens2')}
+        points = scan_points(positions, widgets['mode_combo'].currentData())
+        for axis in positions:
+            limits = parent.motion_controller.limits(axis)
+            if limits is not None and not all(limits[0] <= p <= limits[1] for p in positions[axis]):
+                raise ValueError(f"Положения {axis} выходят за пределы {limits}")
+    except ValueError as e:
+        QMessageBox.warning(parent, "Ошибка", str(e))
+        return
+
+    parent.current_settings['scan_settle']      = widgets['settle_spin'].value()
+    parent.current_settings['scan_save_frames'] = widgets['frames_check'].isChecked()
+
+    engine = ScanEngine(parent.motion_controller, parent.camera_thread, points,
+                        parent.snapshot_writer.results_dir,
+                        settle_time=parent.current_settings['scan_settle'],
+                        save_frames=parent.current_settings['scan_save_frames'],
+                        settings=parent.current_settings.copy(),
+                        catalog=parent.results_catalog)
+    engine.progress.connect(parent.on_scan_progress)
+    engine.finished.connect(parent.on_scan_finished)
+    engine.failed.connect(parent.on_scan_failed)
+    parent.scan_engine = engine
+    engine.start()
+    parent.statusBar().showMessage(f"Сканирование: 0/{len(points)}")
+    dialog.accept()
+
+
+def stop_scan(parent):
+    """ Прерывает сканирование (снятые точки остаются в наборе данных) """
+
+    if getattr(parent, 'scan_engine', None) is not None and parent.scan_engine.is_running():
+        parent.scan_engine.cancel()
+        parent.statusBar().showMessage("Сканирование прерывается...")
+
+
+def handle_scan_progress(parent, captured, total):
+    """ Отображение хода сканирования """
+
+    parent.statusBar().showMessage(f"Сканирование: {captured}/{total}")
+
+
+def handle_scan_finished(parent, result):
+    """ Итог сканирования: время против теоретического минимума """
+
+    parent.statusBar().showMessage(
+        f"Сканирование {'прервано' if result['cancelled'] else 'завершено'}: "
+        f"{result['captured']}/{result['points']} точек за {result['elapsed']:.1f} с "
+        f"(минимум {result['minimum']:.1f} с, {result['efficiency'] * 100:.0f}%) - {result['directory']}")
+
+
+def handle_scan_failed(parent, error_message):
+    QMessageBox.warning(parent, "Ошибка", f"Сканирование не удалось: {error_message}")
+
+
+def rebuild_results_catalog(parent):
+    """ Перестраивает каталог результатов по файлам на диске (в фоновом потоке) """
+
+    if getattr(parent, 'catalog_rebuild_thread', None) is not None and parent.catalog_rebuild_thread.is_alive():
+        parent.statusBar().showMessage("Каталог результатов уже перестраивается...")
+        return
+
+    def run():
+        try:
+            result = parent.results_catalog.rebuild()
+        except Exception as e:
+            print(f"Error rebuilding the results catalog: {e}")
+            result = {'error': str(e)}
+        parent.catalog_rebuilt.emit(result)
+
+    parent.statusBar().showMessage("Перестроение каталога результатов...")
+    parent.catalog_rebuild_thread = threading.Thread(target=run, name="catalog-rebuild", daemon=True)
+    parent.catalog_rebuild_thread.start()
+
+
+def handle_catalog_rebuilt(parent, result):
+    """ Итог перестроения каталога результатов """
+
+    if 'error' in result:
+        QMessageBox.warning(parent, "Ошибка", f"Не удалось перестроить каталог результатов: {result['error']}")
+        return
+    parent.statusBar().showMessage(
+        f"Каталог результатов: {result['count']} записей ({result['files']} файлов) за {result['elapsed']:.1f} с")
@@ -6,44 +6,95 @@ import time
 import traceback 
 import subprocess
 from PyQt5.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QMessageBox
-from PyQt5.QtCore import Qt, QTimer, QSettings
+from PyQt5.QtCore import Qt, QTimer, QSettings, pyqtSignal
 from PyQt5.QtGui import QPixmap
 from picamera2 import Picamera2
 from libcamera import controls, Transform
 try:
-    from utils.config import DEFAULT_SETTINGS
+    from utils.config import DEFAULT_SETTINGS, MOTION_CONFIG
     from core.camera_thread import CameraThread
     from ui_setup import (setup_styles, create_menu_bar, setup_video_panel,
                            setup_control_panel, set_window_icon)
-    from dialogs import show_instruction_dialog, show_settings_dialog
+    from dialogs import (show_instruction_dialog, show_settings_dialog, show_spectrum_settings_dialog,
+                         show_calibration_dialog, apply_wavelength_calibration,
+                         show_calibration_frames_dialog, handle_calibration_frames_progress,
+                         handle_calibration_frames_ready, show_stacking_dialog,
+                         handle_stack_progress, handle_stack_finished,
+                         show_hdr_dialog, stop_hdr, handle_hdr_progress, handle_hdr_finished,
+                         start_auto_exposure, handle_auto_exposure_finished,
+                         start_autofocus, handle_autofocus_finished,
+                         apply_strip_mode, handle_frame_rate_measured, refresh_sensor_modes,
+                         show_scan_dialog, stop_scan, handle_scan_progress,
+                         handle_scan_finished, handle_scan_failed,
+                         rebuild_results_catalog, handle_catalog_rebuilt)
+    from core.calibration import WavelengthCalibration
     from utils.camera_settings_utils import get_awb_mode
-    from core.snapshot import take_and_save_snapshot_standalone
+    from core.snapshot import (take_and_save_snapshot_standalone,
+                               handle_snapshot_captured, handle_snapshot_failed,
+                               handle_snapshot_exposure_started, handle_snapshot_cancelled,
+                               cancel_snapshot,
+                               handle_snapshot_progress, handle_snapshot_written,
+                               handle_snapshot_queue_depth)
+    from core.snapshot_writer import SnapshotWriter
+    from core.catalog import ResultsCatalog
+    from core.motion import MotionProfile, create_axis_driver
+    from core.motion_controller import MotionController
     from utils.event_handlers import (
         update_settings_from_camera,
         change_exposure, update_exposure,
         change_focus, update_focus,
-        change_lens_pos, update_lens1_pos, update_lens2_pos
+        change_lens_pos, update_lens1_pos, update_lens2_pos,
+        handle_position_changed, handle_position_reached, handle_move_failed
     )
 
 except ImportError: # Fallback
-    from spectrometer_app.utils.config import DEFAULT_SETTINGS
+    from spectrometer_app.utils.config import DEFAULT_SETTINGS, MOTION_CONFIG
     from spectrometer_app.core.camera_thread import CameraThread
     from spectrometer_app.ui.ui_setup import (setup_styles, create_menu_bar, setup_video_panel,
                            setup_control_panel, set_window_icon)
-    from spectrometer_app.ui.dialogs import show_instruction_dialog, show_settings_dialog
+    from spectrometer_app.ui.dialogs import (show_instruction_dialog, show_settings_dialog,
+                                            show_spectrum_settings_dialog, show_calibration_dialog,
+                                            apply_wavelength_calibration,
+                                            show_calibration_frames_dialog,
+                                            handle_calibration_frames_progress,
+                                            handle_calibration_frames_ready, show_stacking_dialog,
+                                            handle_stack_progress, handle_stack_finished,
+                                            show_hdr_dialog, stop_hdr, handle_hdr_progress,
+                                            handle_hdr_finished,
+                                            start_auto_exposure, handle_auto_exposure_finished,
+                                            start_autofocus, handle_autofocus_finished,
+                                            apply_strip_mode, handle_frame_rate_measured,
+                                            refresh_sensor_modes,
+                                            show_scan_dialog, stop_scan, handle_scan_progress,
+                                            handle_scan_finished, handle_scan_failed,
+                                            rebuild_results_catalog, handle_catalog_rebuilt)
+    from spectrometer_app.core.calibration import WavelengthCalibration
     from spectrometer_app.utils.camera_settings_utils import get_awb_mode
-    from spectrometer_app.core.snapshot import take_and_save_snapshot_standalone
+    from spectrometer_app.core.snapshot import (take_and_save_snapshot_standalone,
+                                                handle_snapshot_captured, handle_snapshot_failed,
+                                                handle_snapshot_exposure_started, handle_snapshot_cancelled,
+                                                cancel_snapshot,
+                                                handle_snapshot_progress, handle_snapshot_written,
+                                                handle_snapshot_queue_depth)
+    from spectrometer_app.core.snapshot_writer import SnapshotWriter
+    from spectrometer_app.core.catalog import ResultsCatalog
+    from spectrometer_app.core.motion import MotionProfile, create_axis_driver
+    from spectrometer_app.core.motion_controller import MotionController
     # Import the new event handler functions (fallback path)
     from spectrometer_app.utils.event_handlers import (
         update_settings_from_camera,
         change_exposure, update_exposure,
         change_focus, update_focus,
-        change_lens_pos, update_lens1_pos, update_lens2_pos
+        change_lens_pos, update_lens1_pos, update_lens2_pos,
+        handle_position_changed, handle_position_reached, handle_move_failed
     )
 
 
 class CameraApp(QMainWindow):
     """ Основной класс приложения, по сути класс основного окна """
+
+    catalog_rebuilt = pyqtSignal(dict)   # каталог результатов перестроен (из фонового потока)
+
     def __init__(self):
         super().__init__()      # инициализация родительского класса
         self.setWindowTitle("Спектрометр")      # заголовок окна
@@ -52,15 +103,65 @@ class CameraApp(QMainWindow):
         # Инициализация настроек приложения
         self.settings = QSettings("MyCompany", "SpectrometerApp")
         self.current_settings = DEFAULT_SETTINGS.copy()
+        # Калибровка длин волн хранится только в QSettings, не сбрасываем ее при закрытии
+        self.current_settings['calibration'] = self.settings.value('calibration', DEFAULT_SETTINGS['calibration'])
+        self.current_settings['frame_correction'] = self.settings.value(
+            'frame_correction', DEFAULT_SETTINGS['frame_correction'], type=bool)
+        self.current_settings['analysis_source'] = self.settings.value(
+            'analysis_source', DEFAULT_SETTINGS['analysis_source'])
+        self.current_settings['strip_mode'] = self.settings.value(
+            'strip_mode', DEFAULT_SETTINGS['strip_mode'], type=bool)
+        self.current_settings['target_fps'] = self.settings.value(
+            'target_fps', DEFAULT_SETTINGS['target_fps'], type=int)
+        for key in ('roi_center', 'roi_height'):
+            self.current_settings[key] = self.settings.value(key, DEFAULT_SETTINGS[key], type=float)
+        for key in ('spectrum_mode', 'spectrum_weighting'):
+            self.current_settings[key] = self.settings.value(key, DEFAULT_SETTINGS[key])
 
         # Переменных состояния
         self.current_frame    = None       # текущий кадр
+        self.current_pooled_frame = None   # кадр пула, на памяти которого построен current_frame
         self.camera_connected = False      # флаг подключения камеры
         self.camera_thread    = None       # поток управления камерой
+        self.scan_engine      = None       # текущее сканирование
+
+        # Каталог результатов (SQLite) и фоновая очередь записи снимков (живут дольше потока камеры)
+        self.results_catalog = ResultsCatalog(os.path.abspath("./results"))
+        self.catalog_rebuilt.connect(self.on_catalog_rebuilt)
+        self.snapshot_writer = SnapshotWriter(os.path.abspath("./results"), catalog=self.results_catalog)
+        self.snapshot_writer.job_progress.connect(self.on_snapshot_progress)
+        self.snapshot_writer.job_finished.connect(self.on_snapshot_written)
+        self.snapshot_writer.job_failed.connect(self.on_snapshot_failed)
+        self.snapshot_writer.queue_depth_changed.connect(self.on_snapshot_queue_depth)
+
+        # Оси перемещения (линза, камера): положение, на котором они остались, и профиль скорости
+        for axis in MOTION_CONFIG:
+            self.current_settings[f"{axis}_pos"] = self.settings.value(
+                f"{axis}_pos", DEFAULT_SETTINGS[f"{axis}_pos"], type=float)
+        for key in ('motion_velocity', 'motion_acceleration'):
+            self.current_settings[key] = self.settings.value(key, DEFAULT_SETTINGS[key], type=float)
+        self.motion_controller = MotionController(
+            {axis: create_axis_driver(config, self.current_settings[f"{axis}_pos"])
+             for axis, config in MOTION_CONFIG.items()},
+            MotionProfile(self.current_settings['motion_velocity'],
+                          self.current_settings['motion_acceleration']))
+        self.motion_controller.position_changed.connect(self.on_position_changed)
+        self.motion_controller.position_reached.connect(self.on_position_reached)
+        self.motion_controller.move_failed.connect(self.on_move_failed)
+
+        # Отложенная перенастройка потока превью при изменении размера окна
+        self.preview_resize_timer = QTimer(self)
+        self.preview_resize_timer.setSingleShot(True)
+        self.preview_resize_timer.timeout.connect(self.update_preview_size)
 
         self.initUI()       # Инициализация интерфейса
         self.initCamera()   # Инициализация камеры
 
+        # Ось длин волн графика по сохраненной калибровке
+        calibration = WavelengthCalibration.from_json(self.current_settings['calibration'])
+        if calibration is not None:
+            apply_wavelength_calibration(self, calibration)
+
     def _load_settings(self):
         """Загрузка сохраненных настроек из QSettings"""
         settings_dict = DEFAULT_SETTINGS.copy() # Копия настроек по умолчанию
@@ -107,7 +208,7 @@ class CameraApp(QMainWindow):
 
             # Отключение сигналов
             try: 
-                self.camera_thread.change_pixmap.disconnect(self.set_image)
+                self.camera_thread.change_pixmap.disconnect(self.update_pixmap)
             except TypeError: 
                 pass
             try: 
@@ -118,21 +219,106 @@ class CameraApp(QMainWindow):
                 self.camera_thread.settings_updated.disconnect(self.update_settings_from_camera_wrapper)
             except TypeError: 
                 pass
+            try: 
+                self.camera_thread.snapshot_captured.disconnect(self.on_snapshot_captured)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.snapshot_failed.disconnect(self.on_snapshot_failed)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.snapshot_exposure_started.disconnect(self.on_snapshot_exposure_started)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.snapshot_cancelled.disconnect(self.on_snapshot_cancelled)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.spectrum_ready.disconnect(self.spectrum_plot.set_spectrum)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.calibration_frames_progress.disconnect(self.on_calibration_frames_progress)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.calibration_frames_ready.disconnect(self.on_calibration_frames_ready)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.stack_progress.disconnect(self.on_stack_progress)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.stack_finished.disconnect(self.on_stack_finished)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.hdr_progress.disconnect(self.on_hdr_progress)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.hdr_finished.disconnect(self.on_hdr_finished)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.auto_exposure_finished.disconnect(self.on_auto_exposure_finished)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.autofocus_finished.disconnect(self.on_autofocus_finished)
+            except TypeError: 
+                pass
+            try: 
+                self.camera_thread.frame_rate_measured.disconnect(self.on_frame_rate_measured)
+            except TypeError: 
+                pass
 
         print("Initializing new camera thread...")
 
         # Создание нового потока камеры
-        self.camera_thread = CameraThread(self.settings)
+        self.camera_thread = CameraThread(self.settings, snapshot_writer=self.snapshot_writer)
 
         # Подключение сигналов
-        self.camera_thread.change_pixmap.connect(self.set_image)
+        self.camera_thread.change_pixmap.connect(self.update_pixmap)
         self.camera_thread.camera_error.connect(self.handle_camera_error)
         self.camera_thread.settings_updated.connect(self.update_settings_from_camera_wrapper)
+        self.camera_thread.snapshot_captured.connect(self.on_snapshot_captured)
+        self.camera_thread.snapshot_failed.connect(self.on_snapshot_failed)
+        self.camera_thread.snapshot_exposure_started.connect(self.on_snapshot_exposure_started)
+        self.camera_thread.snapshot_cancelled.connect(self.on_snapshot_cancelled)
+        self.camera_thread.spectrum_ready.connect(self.spectrum_plot.set_spectrum)
+        self.camera_thread.calibration_frames_progress.connect(self.on_calibration_frames_progress)
+        self.camera_thread.calibration_frames_ready.connect(self.on_calibration_frames_ready)
+        self.camera_thread.stack_progress.connect(self.on_stack_progress)
+        self.camera_thread.stack_finished.connect(self.on_stack_finished)
+        self.camera_thread.hdr_progress.connect(self.on_hdr_progress)
+        self.camera_thread.hdr_finished.connect(self.on_hdr_finished)
+        self.camera_thread.auto_exposure_finished.connect(self.on_auto_exposure_finished)
+        self.camera_thread.autofocus_finished.connect(self.on_autofocus_finished)
+        self.camera_thread.frame_rate_measured.connect(self.on_frame_rate_measured)
         self.camera_thread.start()
     
         # Отложенное применение настроек
         QTimer.singleShot(500, lambda: self.camera_thread.apply_full_ui_settings(self.current_settings))
 
+    def update_pixmap(self):
+        """Забирает самый новый кадр из почтового ящика потока камеры"""
+        if not self.camera_thread:
+            return
+
+        frame = self.camera_thread.frame_mailbox.take()
+        if frame is None:
+            return
+
+        # Кадр пула занят, пока он отображается; предыдущий возвращается в пул
+        previous_frame, self.current_pooled_frame = self.current_pooled_frame, frame
+        self.set_image(frame.image)
+        if previous_frame is not None:
+            previous_frame.release()
+
     def set_image(self, image):
         """Отображение кадра с камеры в интерфейсе"""
 
@@ -145,11 +331,25 @@ class CameraApp(QMainWindow):
         pixmap = QPixmap.fromImage(image)   # преобразование в QPixmap
 
         if hasattr(self, 'video_label'):
+            label_size = self.video_label.size()
+
+            # Поток lores уже размером с виджет - масштабирование не нужно
+            if image.width() <= label_size.width() and image.height() <= label_size.height() and \
+               (image.width() >= label_size.width() - 2 or image.height() >= label_size.height() - 2):
+                self.video_label.setPixmap(pixmap)
+                return
+
             # Масштабирование и отображение изображения
             self.video_label.setPixmap(pixmap.scaled(
-                self.video_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation
+                label_size, Qt.KeepAspectRatio, Qt.SmoothTransformation
             ))
 
+    def update_preview_size(self):
+        """Запрос потока превью под текущий размер виджета видео"""
+        if self.camera_thread and self.camera_thread.isRunning() and hasattr(self, 'video_label'):
+            self.camera_thread.set_preview_size(self.video_label.width(), self.video_label.height(),
+                                                self.current_settings.copy())
+
     def handle_camera_error(self):
         """Обработка ошибки инициализации/работы камеры."""
         
@@ -216,15 +416,126 @@ class CameraApp(QMainWindow):
     def update_lens2_pos(self):
         update_lens2_pos(self)
 
+    def on_position_changed(self, axis, position):
+        handle_position_changed(self, axis, position)
+
+    def on_position_reached(self, axis, position):
+        handle_position_reached(self, axis, position)
+
+    def on_move_failed(self, axis, error_message):
+        handle_move_failed(self, axis, error_message)
+
     def show_instruction_dialog(self):
         show_instruction_dialog(self)
 
     def show_settings_dialog(self):
         show_settings_dialog(self)
 
+    def show_spectrum_settings_dialog(self):
+        show_spectrum_settings_dialog(self)
+
+    def show_calibration_dialog(self):
+        show_calibration_dialog(self)
+
+    def show_calibration_frames_dialog(self):
+        show_calibration_frames_dialog(self)
+
+    def on_calibration_frames_progress(self, kind, added, count):
+        handle_calibration_frames_progress(self, kind, added, count)
+
+    def on_calibration_frames_ready(self, result):
+        handle_calibration_frames_ready(self, result)
+
+    def show_stacking_dialog(self):
+        show_stacking_dialog(self)
+
+    def on_stack_progress(self, added, count):
+        handle_stack_progress(self, added, count)
+
+    def on_stack_finished(self, result):
+        handle_stack_finished(self, result)
+
+    def show_hdr_dialog(self):
+        show_hdr_dialog(self)
+
+    def stop_hdr(self):
+        stop_hdr(self)
+
+    def on_hdr_progress(self, captured, count):
+        handle_hdr_progress(self, captured, count)
+
+    def on_hdr_finished(self, result):
+        handle_hdr_finished(self, result)
+
+    def start_auto_exposure(self):
+        start_auto_exposure(self)
+
+    def on_auto_exposure_finished(self, result):
+        handle_auto_exposure_finished(self, result)
+
+    def start_autofocus(self):
+        start_autofocus(self)
+
+    def on_autofocus_finished(self, result):
+        handle_autofocus_finished(self, result)
+
+    def apply_strip_mode(self, enabled):
+        apply_strip_mode(self, enabled)
+
+    def on_frame_rate_measured(self, report):
+        handle_frame_rate_measured(self, report)
+
+    def refresh_sensor_modes(self):
+        refresh_sensor_modes(self)
+
+    def show_scan_dialog(self):
+        show_scan_dialog(self)
+
+    def stop_scan(self):
+        stop_scan(self)
+
+    def on_scan_progress(self, captured, total):
+        handle_scan_progress(self, captured, total)
+
+    def on_scan_finished(self, result):
+        handle_scan_finished(self, result)
+
+    def on_scan_failed(self, error_message):
+        handle_scan_failed(self, error_message)
+
     def take_and_save_snapshot(self):
         take_and_save_snapshot_standalone(self)
+
+    def on_snapshot_captured(self, result):
+        handle_snapshot_captured(self, result)
+
+    def on_snapshot_failed(self, error_message):
+        handle_snapshot_failed(self, error_message)
+
+    def on_snapshot_exposure_started(self, info):
+        handle_snapshot_exposure_started(self, info)
+
+    def cancel_snapshot(self):
+        cancel_snapshot(self)
+
+    def on_snapshot_cancelled(self):
+        handle_snapshot_cancelled(self)
+
+    def on_snapshot_progress(self, basename, stage):
+        handle_snapshot_progress(self, basename, stage)
+
+    def on_snapshot_written(self, result):
+        handle_snapshot_written(self, result)
+
+    def on_snapshot_queue_depth(self, depth):
+        handle_snapshot_queue_depth(self, depth)
         
+    def rebuild_results_catalog(self):
+        rebuild_results_catalog(self)
+
+    def on_catalog_rebuilt(self, result):
+        handle_catalog_rebuilt(self, result)
+
     def open_results_folder(self):
         """Открывает папку с результатами в файловом менеджере"""
         results_dir = os.path.abspath("./results")
@@ -245,6 +556,7 @@ class CameraApp(QMainWindow):
     # --- Переопределенные методы Qt ---
     def resizeEvent(self, event):
         """Обработка изменения размера окна"""
+        self.preview_resize_timer.start(200)    # перенастройка превью после окончания изменения
         if self.camera_connected and self.current_frame:
             self.set_image(self.current_frame)  # Обновление изображения
         elif not self.camera_connected:
@@ -254,7 +566,10 @@ class CameraApp(QMainWindow):
     def closeEvent(self, event):
         """Обработка закрытия окна"""
 
-        self._save_settings() # Сохранение настроек
+        # Прерывание сканирования до остановки камеры и осей
+        if self.scan_engine is not None and self.scan_engine.is_running():
+            self.scan_engine.cancel()
+            self.scan_engine.wait(5.0)
 
         # Остановка потока камеры
         if hasattr(self, 'camera_thread') and self.camera_thread.isRunning():
@@ -262,5 +577,17 @@ class CameraApp(QMainWindow):
             if not self.camera_thread.wait(2000):
                  print("Warning: Camera thread did not stop gracefully on close.")
 
+        # Дожидаемся записи снимков, оставшихся в очереди
+        self.snapshot_writer.shutdown(wait=True)
+        self.results_catalog.close()
+
+        # Остановка осей и освобождение драйверов
+        self.motion_controller.shutdown()
+
+        # Сохраняется фактическое положение осей (после остановки), а не цель перемещения
+        for axis in MOTION_CONFIG:
+            self.current_settings[f"{axis}_pos"] = float(self.motion_controller.position(axis))
+        self._save_settings() # Сохранение настроек
+
         event.accept() # закрытие окна
 
@@ -0,0 +1,125 @@
+# spectrometer_app/ui/spectrum_plot.py
+
+import time
+import numpy as np
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QPainter, QPen, QColor, QPolygonF
+
+
+class SpectrumPlotWidget(QWidget):
+    """
+    График спектра в реальном времени.
+
+    Перерисовка происходит только при поступлении новых данных (или изменении
+    размера). Если точек больше, чем пикселей по ширине, выполняется min/max
+    децимация: для каждого столбца пикселей рисуется вертикальный отрезок
+    от минимума до максимума, поэтому узкие линии спектра не теряются.
+    Координаты пишутся прямо в память заранее выделенного QPolygonF.
+    """
+
+    MARGIN = 6   # отступ области графика от краев виджета, px
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumHeight(120)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)   # фон рисуем сами, без очистки Qt
+
+        self.spectrum       = None   # последние данные
+        self.wavelength_range = None # (нм слева, нм справа) при наличии калибровки
+        self.last_paint_ms  = 0.0    # длительность последней перерисовки
+
+        self._polygon       = None   # QPolygonF, переиспользуется
+        self._points        = None   # представление памяти _polygon как массива (N, 2)
+        self._bin_starts    = None   # начала интервалов децимации
+        self._layout_key    = None   # (число точек, ширина) для которых построены буферы
+
+        self._background = QColor(20, 20, 20)
+        self._frame_pen  = QPen(QColor(90, 90, 90))
+        self._line_pen   = QPen(QColor(80, 220, 120))
+        self._text_pen   = QPen(QColor(200, 200, 200))
+
+    def set_spectrum(self, spectrum):
+        """Новые данные: сохраняются и планируется перерисовка (Qt объединяет запросы)"""
+        self.spectrum = spectrum
+        self.update()
+
+    def set_wavelength_range(self, wavelength_range):
+        """Подписи оси длин волн (нм на краях графика) или None для оси в пикселях"""
+        self.wavelength_range = wavelength_range
+        self.update()
+
+    def _prepare_buffers(self, count, width):
+        """Выделение QPolygonF и интервалов децимации под (число точек, ширина)"""
+        if self._layout_key == (count, width):
+            return
+
+        if count > 2 * width:
+            # Границы интервалов: ровно width интервалов по count точкам
+            self._bin_starts = np.linspace(0, count, width, endpoint=False).astype(np.intp)
+            point_count = 2 * width
+        else:
+            self._bin_starts = None
+            point_count = count
+
+        self._polygon = QPolygonF(point_count)
+        pointer = self._polygon.data()
+        pointer.setsize(point_count * 2 * np.dtype(np.float64).itemsize)
+        self._points = np.frombuffer(pointer, dtype=np.float64).reshape(point_count, 2)
+        self._layout_key = (count, width)
+
+    def _fill_polygon(self, spectrum, plot_rect, y_max):
+        """Запись экранных координат в буфер полигона (векторизовано)"""
+        left, top = plot_rect.left(), plot_rect.top()
+        width, height = plot_rect.width(), plot_rect.height()
+        y_scale = height / y_max
+
+        if self._bin_starts is not None:
+            # min/max по каждому столбцу пикселей, точки идут парами (min, max)
+            minima = np.minimum.reduceat(spectrum, self._bin_starts)
+            maxima = np.maximum.reduceat(spectrum, self._bin_starts)
+            columns = left + np.arange(len(self._bin_starts), dtype=np.float64) * (width / len(self._bin_starts))
+            self._points[0::2, 0] = columns
+            self._points[1::2, 0] = columns
+            self._points[0::2, 1] = minima
+            self._points[1::2, 1] = maxima
+        else:
+            count = len(spectrum)
+            self._points[:, 0] = left + np.arange(count, dtype=np.float64) * (width / max(1, count - 1))
+            self._points[:, 1] = spectrum
+
+        # Значения -> экранная координата y (ось y направлена вниз)
+        np.multiply(self._points[:, 1], -y_scale, out=self._points[:, 1])
+        self._points[:, 1] += top + height
+
+    def paintEvent(self, event):
+        start_time = time.perf_counter()
+
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self._background)
+
+        plot_rect = QRectF(self.rect()).adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        painter.setPen(self._frame_pen)
+        painter.drawRect(plot_rect)
+
+        spectrum = self.spectrum
+        if spectrum is not None and len(spectrum) > 1 and plot_rect.width() > 1:
+            y_max = float(spectrum.max())
+            y_max = y_max if y_max > 0 else 1.0
+
+            self._prepare_buffers(len(spectrum), int(plot_rect.width()))
+            self._fill_polygon(spectrum, plot_rect, y_max)
+
+            painter.setPen(self._line_pen)
+            painter.drawPolyline(self._polygon)
+
+            painter.setPen(self._text_pen)
+            painter.drawText(plot_rect.adjusted(4, 2, -4, -2), Qt.AlignTop | Qt.AlignRight, f"max {y_max:.1f}")
+
+            if self.wavelength_range is not None:
+                text_rect = plot_rect.adjusted(4, 2, -4, -2)
+                painter.drawText(text_rect, Qt.AlignBottom | Qt.AlignLeft, f"{self.wavelength_range[0]:.1f} нм")
+                painter.drawText(text_rect, Qt.AlignBottom | Qt.AlignRight, f"{self.wavelength_range[1]:.1f} нм")
+
+        painter.end()
+        self.last_paint_ms = (time.perf_counter() - start_time) * 1000
@@ -11,9 +11,11 @@ from PyQt5.QtGui import QIntValidator, QDoubleValidator, QIcon
 
 try:
     from utils.validators import ClampingIntValidator, ClampingDoubleValidator
+    from spectrum_plot import SpectrumPlotWidget
     
 except ImportError: # Fallback
     from spectrometer_app.utils.validators import ClampingIntValidator, ClampingDoubleValidator
+    from spectrometer_app.ui.spectrum_plot import SpectrumPlotWidget
 
 def setup_styles(parent):
     """Настройка стилей интерфейса"""
@@ -87,6 +89,75 @@ def create_menu_bar(parent):
     settings_action.triggered.connect(parent.show_settings_dialog) 
     settings_menu.addAction(settings_action)
 
+    spectrum_action = QAction("Настройки спектра", parent)
+    spectrum_action.triggered.connect(parent.show_spectrum_settings_dialog)
+    settings_menu.addAction(spectrum_action)
+
+    calibration_action = QAction("Калибровка длин волн", parent)
+    calibration_action.triggered.connect(parent.show_calibration_dialog)
+    settings_menu.addAction(calibration_action)
+
+    frames_action = QAction("Темновые и плоские кадры", parent)
+    frames_action.triggered.connect(parent.show_calibration_frames_dialog)
+    settings_menu.addAction(frames_action)
+
+    sensor_modes_action = QAction("Обновить режимы сенсора", parent)
+    sensor_modes_action.triggered.connect(parent.refresh_sensor_modes)
+    settings_menu.addAction(sensor_modes_action)
+
+    """ Создание меню "Результаты" """
+    results_menu = menubar.addMenu("Результаты")
+    open_results_action = QAction("Открыть папку результатов", parent)
+    open_results_action.triggered.connect(parent.open_results_folder)
+    results_menu.addAction(open_results_action)
+
+    rebuild_catalog_action = QAction("Перестроить каталог результатов", parent)
+    rebuild_catalog_action.triggered.connect(parent.rebuild_results_catalog)
+    results_menu.addAction(rebuild_catalog_action)
+
+    """ Создание меню "Съемка" """
+    acquisition_menu = menubar.addMenu("Съемка")
+    stacking_action = QAction("Накопление кадров", parent)
+    stacking_action.triggered.connect(parent.show_stacking_dialog)
+    acquisition_menu.addAction(stacking_action)
+
+    hdr_action = QAction("HDR-серия выдержек...", parent)
+    hdr_action.triggered.connect(parent.show_hdr_dialog)
+    acquisition_menu.addAction(hdr_action)
+
+    stop_hdr_action = QAction("Остановить HDR-серию", parent)
+    stop_hdr_action.triggered.connect(parent.stop_hdr)
+    acquisition_menu.addAction(stop_hdr_action)
+
+    auto_exposure_action = QAction("Автоэкспозиция по спектру", parent)
+    auto_exposure_action.triggered.connect(parent.start_auto_exposure)
+    acquisition_menu.addAction(auto_exposure_action)
+
+    autofocus_action = QAction("Автофокус по спектру", parent)
+    autofocus_action.triggered.connect(parent.start_autofocus)
+    acquisition_menu.addAction(autofocus_action)
+
+    # Режим полосы спектра (переключатель, состояние сохраняется в настройках)
+    strip_action = QAction("Режим полосы спектра (высокая частота кадров)", parent)
+    strip_action.setCheckable(True)
+    strip_action.setChecked(bool(parent.current_settings['strip_mode']))
+    strip_action.toggled.connect(parent.apply_strip_mode)
+    acquisition_menu.addAction(strip_action)
+
+    acquisition_menu.addSeparator()
+    scan_action = QAction("Сканирование...", parent)
+    scan_action.triggered.connect(parent.show_scan_dialog)
+    acquisition_menu.addAction(scan_action)
+
+    stop_scan_action = QAction("Остановить сканирование", parent)
+    stop_scan_action.triggered.connect(parent.stop_scan)
+    acquisition_menu.addAction(stop_scan_action)
+
+    acquisition_menu.addSeparator()
+    cancel_snapshot_action = QAction("Отменить снимок", parent)
+    cancel_snapshot_action.triggered.connect(parent.cancel_snapshot)
+    acquisition_menu.addAction(cancel_snapshot_action)
+
 def setup_video_panel(parent, main_layout):
     """Настройка панели видео"""
     
@@ -99,8 +170,13 @@ def setup_video_panel(parent, main_layout):
     # Создание метки для отображения видео
     parent.video_label = QLabel()                   # сохраняем в родительском классе
     parent.video_label.setAlignment(Qt.AlignCenter) # выравнивание по центру
-    parent.video_label.setMinimumSize(711, 530)     # минимальный размер
-    video_layout.addWidget(parent.video_label)      # добавление в layout
+    parent.video_label.setMinimumSize(711, 400)     # минимальный размер
+    video_layout.addWidget(parent.video_label, stretch=1)   # добавление в layout
+
+    # График спектра под изображением
+    parent.spectrum_plot = SpectrumPlotWidget()
+    parent.spectrum_plot.setFixedHeight(150)
+    video_layout.addWidget(parent.spectrum_plot)
 
     # Добавление в основной layout с коэффициентом растяжения
     main_layout.addWidget(video_frame, stretch=3)
@@ -141,6 +217,11 @@ def setup_snapshot_button(parent, layout):
 
     # Добавление в layout
     layout.addWidget(parent.snapshot_btn)
+
+    # Индикатор очереди фоновой записи снимков
+    parent.snapshot_queue_label = QLabel("Очередь записи: 0")
+    parent.snapshot_queue_label.setAlignment(Qt.AlignCenter)
+    layout.addWidget(parent.snapshot_queue_label)
     
     # Создание кнопки открытия папки результатов
     parent.open_results_btn = QPushButton("Результаты")
@@ -174,7 +255,7 @@ def setup_lens_controls(parent, layout):
     parent.lens1_pos_label.setAlignment(Qt.AlignCenter) # Выравнивание
 
     # Поле ввода
-    parent.lens1_pos_input = QLineEdit(str(parent.current_settings['lens1_pos'])) 
+    parent.lens1_pos_input = QLineEdit(str(int(round(parent.current_settings['lens1_pos'])))) 
 
     # Валидатор целых чисел
     parent.lens1_pos_input.setValidator(QIntValidator())  
@@ -207,7 +288,7 @@ def setup_lens_controls(parent, layout):
 
     parent.lens2_pos_label = QLabel("Положение, мм")
     parent.lens2_pos_label.setAlignment(Qt.AlignCenter)
-    parent.lens2_pos_input = QLineEdit(str(parent.current_settings['lens2_pos']))
+    parent.lens2_pos_input = QLineEdit(str(int(round(parent.current_settings['lens2_pos']))))
     parent.lens2_pos_input.setValidator(QIntValidator())
     parent.lens2_pos_input.returnPressed.connect(parent.update_lens2_pos)
 
@@ -1,49 +1,52 @@
 # для объединения классов и функций в 1 модуль
+#
+# Импорт ленивый (PEP 562): модуль загружается при первом обращении к имени.
+# Так обработка сохраненных данных и запуск без интерфейса не тянут за собой
+# PyQt5 и picamera2, пока не используются поток камеры и окна.
 
+import importlib
 
-from .camera_settings_utils import (get_awb_mode, get_exposure_mode,    
-                                    restore_camera_settings_from_qsettings,
-                                    apply_full_ui_settings_to_camera,
-                                    set_camera_focus,
-                                    update_specific_camera_settings,
-                                    save_camera_metadata,
-                                    restore_last_camera_settings
-                                )
-from .event_handlers import (update_settings_from_camera, 
-                             change_exposure,
-                             update_exposure,
-                             change_focus,
-                             update_focus,
-                             change_lens_pos,
-                             update_lens_pos,
-                             update_lens1_pos,
-                             update_lens2_pos)
+_EXPORTS = {   # имя -> модуль пакета
+    'get_awb_mode':                           'camera_settings_utils',
+    'get_exposure_mode':                      'camera_settings_utils',
+    'restore_camera_settings_from_qsettings': 'camera_settings_utils',
+    'apply_full_ui_settings_to_camera':       'camera_settings_utils',
+    'set_camera_focus':                       'camera_settings_utils',
+    'update_specific_camera_settings':        'camera_settings_utils',
+    'save_camera_metadata':                   'camera_settings_utils',
+    'restore_last_camera_settings':           'camera_settings_utils',
+    'apply_controls':                         'camera_settings_utils',
+    'ControlSettleWatcher':                   'control_settle',
+    'wait_for_settle':                        'control_settle',
+    'update_settings_from_camera':            'event_handlers',
+    'change_exposure':                        'event_handlers',
+    'update_exposure':                        'event_handlers',
+    'change_focus':                           'event_handlers',
+    'update_focus':                           'event_handlers',
+    'change_lens_pos':                        'event_handlers',
+    'update_lens_pos':                        'event_handlers',
+    'update_lens1_pos':                       'event_handlers',
+    'update_lens2_pos':                       'event_handlers',
+    'handle_position_changed':                'event_handlers',
+    'handle_position_reached':                'event_handlers',
+    'handle_move_failed':                     'event_handlers',
+    'ClampingIntValidator':                   'validators',
+    'ClampingDoubleValidator':                'validators',
+    'DEFAULT_SETTINGS':                       'config',
+    'MOTION_CONFIG':                          'config',
+}
 
-from .validators import (ClampingIntValidator,
-                         ClampingDoubleValidator)
+__all__ = list(_EXPORTS)
 
-from .config import DEFAULT_SETTINGS
 
-__all__ = [
-    'get_awb_mode',
-    'get_exposure_mode',
-    'restore_camera_settings_from_qsettings',
-    'apply_full_ui_settings_to_camera',
-    'set_camera_focus',
-    'update_specific_camera_settings',
-    'save_camera_metadata',
-    'restore_last_camera_settings',
-    'update_settings_from_camera', 
-    'change_exposure',
-    'update_exposure',
-    'change_focus',
-    'update_focus',
-    'change_lens_pos',
-    'update_lens_pos',
-    'update_lens1_pos',
-    'update_lens2_pos',
-    'ClampingIntValidator',
-    'ClampingDoubleValidator', 
-    'DEFAULT_SETTINGS'
-]
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value   # следующие обращения - без __getattr__
+    return value
 
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -3,6 +3,11 @@
 import traceback
 from libcamera import controls
 
+try:
+    from utils.control_settle import ControlSettleWatcher, wait_for_settle
+except ImportError: # Fallback for running script directly
+    from spectrometer_app.utils.control_settle import ControlSettleWatcher, wait_for_settle
+
 try:
     from utils.config import DEFAULT_SETTINGS
 
@@ -23,7 +28,26 @@ except ImportError: # Fallback for running script directly
             'focus':         1000,
             'exposure':      3.0, 
             'lens1_pos':     0, 
-            'lens2_pos':     0
+            'lens2_pos':     0,
+            'target_fps':    0,
+            'roi_center':    0.5,
+            'roi_height':    0.05,
+            'spectrum_mode': 'mean',
+            'spectrum_weighting': 'luminance',
+            'analysis_source': 'isp',
+            'strip_mode':    False,
+            'calibration':   '',
+            'frame_correction': True,
+            'stack_count':   16,
+            'stack_mode':    'mean',
+            'ae_target':     0.85,
+            'hdr_min_exposure': 0.01,
+            'hdr_max_exposure': 30.0,
+            'hdr_factor':    4.0,
+            'motion_velocity':     5.0,
+            'motion_acceleration': 20.0,
+            'scan_settle':   0.2,
+            'scan_save_frames': False
         }
 
 
@@ -70,7 +94,27 @@ def get_exposure_mode(mode_str):
     return exposure_modes.get(mode_key, controls.AeExposureModeEnum.Normal)
 
 
-def restore_camera_settings_from_qsettings(camera, settings_manager):
+def apply_controls(camera, controls_to_set, label="controls", settle=None):
+    """
+    Применяет настройки и отслеживает их фактическое применение по метаданным.
+    settle(watcher) - регистрация наблюдателя в цикле кадров потока камеры
+    (без блокировки); без settle ожидание блокирующее (capture_metadata).
+    До запуска камеры кадров нет - настройки действуют с первого кадра.
+    Возвращает ControlSettleWatcher или None.
+    """
+    camera.set_controls(controls_to_set)
+    if not getattr(camera, 'started', False):
+        return None
+
+    watcher = ControlSettleWatcher(controls_to_set, label)
+    if settle is not None:
+        settle(watcher)
+    else:
+        wait_for_settle(camera, watcher)
+    return watcher
+
+
+def restore_camera_settings_from_qsettings(camera, settings_manager, settle=None):
     """Восстанавливает базовые настройки из QSettings"""
 
     # Проверка наличия камеры
@@ -102,7 +146,7 @@ def restore_camera_settings_from_qsettings(camera, settings_manager):
                                            DEFAULT_SETTINGS[default_key], type=float)
             controls_to_set[param] = value
 
-        camera.set_controls(controls_to_set) # Применение настроек
+        apply_controls(camera, controls_to_set, "QSettings", settle) # Применение настроек
 
         print("Restored settings from QSettings:", controls_to_set)
         return True
@@ -112,7 +156,7 @@ def restore_camera_settings_from_qsettings(camera, settings_manager):
         return False
 
 
-def apply_full_ui_settings_to_camera(camera, ui_settings):
+def apply_full_ui_settings_to_camera(camera, ui_settings, settle=None):
     """
     Применяет к камере полный набор настроек из словаря.
     Возвращает словарь, содержащий фактически примененные значения фокуса 
@@ -162,7 +206,7 @@ def apply_full_ui_settings_to_camera(camera, ui_settings):
         applied_state['focus']          = focus_mm
 
         print(f"Applying full settings to camera: {controls_to_set}")
-        camera.set_controls(controls_to_set) # применение всех настроек
+        apply_controls(camera, controls_to_set, "full settings", settle) # применение всех настроек
         return applied_state                 # возврат примененных значений
 
     except Exception as e:
@@ -171,15 +215,15 @@ def apply_full_ui_settings_to_camera(camera, ui_settings):
         return None
 
 
-def set_camera_focus(camera, distance_mm):
+def set_camera_focus(camera, distance_mm, settle=None):
     """Устанавливает ручной фокус камеры на указанное расстояние"""
     if camera is None: 
         return False
     try:
         lens_position = 1.0 / (distance_mm / 1000.0) # позиция линзы камеры
         
-        camera.set_controls({"AfMode": controls.AfModeEnum.Manual,
-                             "LensPosition": lens_position})
+        apply_controls(camera, {"AfMode": controls.AfModeEnum.Manual,
+                                "LensPosition": lens_position}, "focus", settle)
         print(f"Set camera focus to {distance_mm}mm (LensPosition: {lens_position})")
         return True
     except Exception as e:
@@ -187,7 +231,7 @@ def set_camera_focus(camera, distance_mm):
         return False
 
 
-def update_specific_camera_settings(camera, settings_dict):
+def update_specific_camera_settings(camera, settings_dict, settle=None):
     """
     Обновляет конкретные настройки камеры из словаря
     Возвращает словарь, содержащий фактически примененные значения фокуса 
@@ -221,7 +265,7 @@ def update_specific_camera_settings(camera, settings_dict):
 
         if controls_to_set:
             print(f"Updating specific camera settings: {controls_to_set}")
-            camera.set_controls(controls_to_set)
+            apply_controls(camera, controls_to_set, "/".join(sorted(applied_state)), settle)
             return applied_state    # вовзрат изменений
         return None                 # нет изменений
     
@@ -252,7 +296,7 @@ def save_camera_metadata(camera, thread_current_settings):
         return {}
 
 
-def restore_last_camera_settings(camera, last_settings_dict):
+def restore_last_camera_settings(camera, last_settings_dict, settle=None):
     """Восстанавливает настройки из сохраненного словаря (исключая некоторые параметры)"""
 
     if camera is None or not last_settings_dict: 
@@ -270,7 +314,7 @@ def restore_last_camera_settings(camera, last_settings_dict):
 
         if controls_to_set:
             print(f"Restoring last camera settings: {controls_to_set}")
-            camera.set_controls(controls_to_set)
+            apply_controls(camera, controls_to_set, "last settings", settle)
             return True 
         
         return False  # Нет параметров для восстановления
@@ -11,5 +11,40 @@ DEFAULT_SETTINGS = {
     'focus':          1000,   # in mm
     'exposure':       3.00,    # in seconds
     'lens1_pos':      0,
-    'lens2_pos':      0
+    'lens2_pos':      0,
+    'target_fps':     0,      # ограничение частоты превью, 0 - без ограничения
+    'roi_center':     0.5,    # центр полосы спектра, доля высоты кадра
+    'roi_height':     0.05,   # высота полосы спектра, доля высоты кадра
+    'spectrum_mode':  'mean', # 'mean' / 'sum' по строкам полосы
+    'spectrum_weighting': 'luminance', # веса каналов: luminance / sum / red / green / blue
+    'analysis_source': 'isp', # кадр для спектра: isp (main после ISP) / raw_rgb / raw_mono (сырой, линейный)
+    'strip_mode':     False,  # режим полосы спектра: ScalerCrop на ROI, быстрый режим сенсора
+    'calibration':    '',     # калибровка пиксель -> нм (JSON), '' - нет калибровки
+    'frame_correction': True, # вычитание темнового кадра и деление на плоский (если записаны)
+    'stack_count':    16,     # число кадров для накопления
+    'stack_mode':     'mean', # mean / sum / median / sigma_clip
+    'ae_target':      0.85,   # автоэкспозиция: пик самой яркой линии, доля полной шкалы
+    'hdr_min_exposure': 0.01, # HDR-серия: самая короткая выдержка, с
+    'hdr_max_exposure': 30.0, # HDR-серия: самая длинная выдержка, с
+    'hdr_factor':     4.0,    # HDR-серия: отношение соседних выдержек
+    'motion_velocity':     5.0,   # скорость перемещения осей, мм/с
+    'motion_acceleration': 20.0,  # ускорение осей, мм/с²
+    'scan_settle':    0.2,    # сканирование: ожидание успокоения после перемещения, с
+    'scan_save_frames': False # сканирование: сохранять кадры main, а не только спектры
+}
+
+MAIN_STREAM_SIZE = (1280, 720)   # поток main: анализ и запись видео (ширина - ось калибровки)
+ANALYSIS_SOURCES = ('isp', 'raw_rgb', 'raw_mono')   # источник кадра для спектра
+FRAME_MARGIN_US  = 20000   # запас длительности кадра сверх ручной выдержки в видеорежиме, мкс
+
+CALIBRATION_FRAMES_DIR = "./calibration_frames"   # кэш мастер-кадров (темновые/плоские)
+SENSOR_MODES_CACHE     = "./sensor_modes.json"    # кэш режимов сенсора по камерам
+
+# Оси перемещения: драйвер и его параметры.
+# driver: 'simulated' / 'gpio' (step_pin, dir_pin, enable_pin, steps_per_mm, invert_direction)
+#         / 'serial' (port, baudrate, axis - контроллер GRBL)
+# limits: допустимый диапазон положения, мм
+MOTION_CONFIG = {
+    'lens1': {'driver': 'simulated', 'limits': (-500, 500)},
+    'lens2': {'driver': 'simulated', 'limits': (-500, 500)},
 }
\ No newline at end of file
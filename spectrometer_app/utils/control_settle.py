@@ -0,0 +1,155 @@
+# spectrometer_app/utils/control_settle.py
+
+import time
+
+
+SETTLE_BASE_TIMEOUT = 0.5   # запас ожидания применения настроек, с
+SETTLE_FRAMES       = 6     # кадров ожидания сверх запаса (выдержка/длительность кадра)
+SETTLE_MIN_FRAMES   = 2     # кадров после запроса для настроек без отражения в метаданных
+
+# Допуски сравнения запрошенного значения с метаданными кадра: (относительный, абсолютный)
+SETTLE_TOLERANCES = {
+    'ExposureTime': (0.02, 100),    # мкс; выдержка квантуется длительностью строки
+    'AnalogueGain': (0.02, 0.0),
+    'LensPosition': (0.01, 0.02),   # диоптрии
+    'ColourGains':  (0.02, 0.0),
+    'ScalerCrop':   (0.0, 2),       # пиксели сенсора
+}
+STABLE_TOLERANCE = 0.01   # изменение за кадр, при котором AE/AWB считаются сошедшимися
+
+
+def _close(actual, requested, tolerance):
+    relative, absolute = tolerance
+    if isinstance(requested, (tuple, list)):
+        return actual is not None and len(actual) == len(requested) and \
+               all(_close(a, r, tolerance) for a, r in zip(actual, requested))
+    return actual is not None and abs(actual - requested) <= max(absolute, relative * abs(requested))
+
+
+def _stable(previous, current):
+    return previous is not None and current is not None and \
+           abs(current - previous) <= STABLE_TOLERANCE * max(abs(previous), 1e-9)
+
+
+class ControlSettleWatcher:
+    """
+    Ожидание фактического применения настроек камеры по метаданным кадров
+    (вместо фиксированной паузы).
+
+    Настройка считается примененной:
+        ExposureTime, AnalogueGain, LensPosition, ColourGains, ScalerCrop -
+            значение в метаданных совпадает с запрошенным в пределах допуска;
+        AeEnable=True - AeLocked в метаданных или стабильное произведение
+            выдержки на усиление; AwbMode / AwbEnable=True - стабильные ColourGains;
+        остальные (яркость, контраст, режимы) в метаданных не отражаются -
+            после min_frames кадров, снятых после запроса.
+    Учитываются только кадры, экспонирование которых началось после запроса.
+    Тайм-аут растет с длительностью кадра: длинной выдержке нужно больше времени.
+    reference - метаданные последнего кадра до запроса: если AE/AWB уже были
+    в равновесии, сходимость видна по первому же кадру.
+    """
+
+    def __init__(self, requested, label="controls", timeout=None, reference=None,
+                 min_frames=SETTLE_MIN_FRAMES):
+        self.requested  = dict(requested)
+        self.label      = label
+        self.timeout    = timeout
+        self.min_frames = min_frames
+        self.started    = time.monotonic()
+        self.started_ns = time.monotonic_ns()
+        self.frames     = 0
+        self.result     = None
+
+        exposure = self.requested.get('ExposureTime')
+        self.frame_time = exposure / 1e6 if exposure else 0.0
+        self.pending = set(self.requested)
+        self._previous = {}   # предыдущие значения для проверки сходимости AE/AWB
+        if reference:
+            self._remember(reference)
+
+    @property
+    def deadline(self):
+        timeout = self.timeout
+        if timeout is None:
+            timeout = SETTLE_BASE_TIMEOUT + SETTLE_FRAMES * self.frame_time
+        return self.started + timeout
+
+    def limit_exposure(self, max_frame_us):
+        """
+        Ручная выдержка длиннее максимальной длительности кадра недостижима:
+        сенсор ограничит ее, поэтому ExposureTime не ожидается, а тайм-аут
+        считается по длительности кадра
+        """
+        exposure = self.requested.get('ExposureTime')
+        if exposure is None or max_frame_us is None or exposure <= max_frame_us:
+            return
+        self.pending.discard('ExposureTime')
+        self.frame_time = max_frame_us / 1e6
+        print(f"Settle ({self.label}): exposure {exposure / 1e6:g} s exceeds frame duration "
+              f"{max_frame_us / 1e6:g} s, limited by the sensor")
+
+    def _settled(self, name, metadata):
+        requested = self.requested[name]
+        if name in SETTLE_TOLERANCES:
+            if name not in metadata:
+                return self.frames >= self.min_frames   # не отражается этой камерой
+            return _close(metadata[name], requested, SETTLE_TOLERANCES[name])
+
+        if name == 'AeEnable' and requested:
+            if 'AeLocked' in metadata:
+                return bool(metadata['AeLocked'])
+            brightness = metadata.get('ExposureTime', 0) * metadata.get('AnalogueGain', 1.0)
+            return _stable(self._previous.get('ae'), brightness) and self.frames >= self.min_frames
+        if name in ('AwbMode', 'AwbEnable') and requested:
+            gains = metadata.get('ColourGains')
+            previous = self._previous.get('awb')
+            if gains is None:
+                return self.frames >= self.min_frames
+            return previous is not None and all(_stable(p, g) for p, g in zip(previous, gains))
+        return self.frames >= self.min_frames
+
+    def update(self, metadata):
+        """
+        Очередной кадр. Возвращает итог, когда все настройки применены или
+        истек тайм-аут ({'settled', 'elapsed', 'frames', 'pending'}), иначе None.
+        """
+        if self.result is not None:
+            return self.result
+
+        timestamp = metadata.get('SensorTimestamp')
+        if timestamp is None or timestamp >= self.started_ns:
+            self.frames += 1
+            if 'FrameDuration' in metadata:
+                self.frame_time = max(self.frame_time, metadata['FrameDuration'] / 1e6)
+            self.pending = {name for name in self.pending if not self._settled(name, metadata)}
+            self._remember(metadata)
+
+        settled = not self.pending
+        if not settled and time.monotonic() < self.deadline:
+            return None
+        return self._finish(settled)
+
+    def _remember(self, metadata):
+        self._previous['ae'] = metadata.get('ExposureTime', 0) * metadata.get('AnalogueGain', 1.0)
+        self._previous['awb'] = metadata.get('ColourGains')
+
+    def _finish(self, settled):
+        elapsed = time.monotonic() - self.started
+        self.result = {'settled': settled, 'elapsed': elapsed, 'frames': self.frames,
+                       'pending': sorted(self.pending)}
+        if settled:
+            print(f"Settle ({self.label}): applied in {elapsed * 1000:.0f} ms, {self.frames} frames")
+        else:
+            print(f"Settle ({self.label}): timed out after {elapsed * 1000:.0f} ms, "
+                  f"{self.frames} frames, pending {sorted(self.pending)}")
+        return self.result
+
+
+def wait_for_settle(camera, watcher):
+    """
+    Блокирующее ожидание по метаданным кадров (capture_metadata) - для кода
+    вне цикла событий потока камеры. Возвращает итог наблюдателя.
+    """
+    while watcher.result is None:
+        watcher.update(camera.capture_metadata())
+    return watcher.result
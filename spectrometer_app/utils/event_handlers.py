@@ -10,7 +10,7 @@ def update_settings_from_camera(app_instance, camera_settings):
        abs(camera_settings['exposure'] - app_instance.current_settings['exposure']) > 1e-6:
         # Обновление текущих настроек и текстового поля
         app_instance.current_settings['exposure'] = camera_settings['exposure']
-        app_instance.exposure_input.setText(f"{camera_settings['exposure']:.1f}")
+        app_instance.exposure_input.setText(f"{camera_settings['exposure']:.2f}")
 
     # Проверка наличия настроек фокуса и соответствующего поля ввода
     if 'focus' in camera_settings and hasattr(app_instance, 'focus_input') and \
@@ -140,12 +140,21 @@ def update_focus(app_instance):
         QMessageBox.critical(app_instance, "Критическая ошибка", f"Ошибка при установке фокуса: {e}")
 
 
+def _clamp_lens_pos(app_instance, axis, value):
+    """Ограничение положения пределами оси (если они заданы)"""
+    limits = app_instance.motion_controller.limits(axis)
+    if limits is None:
+        return value
+    return int(max(limits[0], min(limits[1], value)))
+
+
 def change_lens_pos(app_instance, lens_num, delta):
-    """Изменение положения линзы кнопками +/- (симуляция)"""
+    """Изменение положения линзы кнопками +/- (перемещение в фоне)"""
 
     # Определение атрибутов в зависимости от номера линзы
     input_attr = 'lens1_pos_input' if lens_num == 1 else 'lens2_pos_input'
     setting_key = 'lens1_pos' if lens_num == 1 else 'lens2_pos'
+    axis = f"lens{lens_num}"
 
     if not hasattr(app_instance, input_attr): return
 
@@ -159,14 +168,16 @@ def change_lens_pos(app_instance, lens_num, delta):
         except ValueError:
             current_val = app_instance.current_settings.get(setting_key, 0)  # Значение по умолчанию
 
-        # Расчет нового значения
-        new_val = current_val + delta
+        # Расчет нового значения с ограничением пределами оси
+        new_val = _clamp_lens_pos(app_instance, axis, current_val + delta)
 
-        # Обновление настроек и интерфейса
+        # Обновление настроек и интерфейса (поле показывает целевое положение)
         app_instance.current_settings[setting_key] = new_val
         input_widget.setText(str(new_val))
-        
-        print(f"Lens {lens_num} position changed to: {new_val} (Simulated)")
+
+        # Команда ставится в очередь оси, интерфейс не ждет окончания движения
+        app_instance.motion_controller.move_to(axis, new_val)
+        print(f"Lens {lens_num} moving to: {new_val}")
 
     except ValueError:
         print(f"Invalid value in lens {lens_num} input during change.")
@@ -176,11 +187,12 @@ def change_lens_pos(app_instance, lens_num, delta):
 
 
 def update_lens_pos(app_instance, lens_num):
-    """Обновление положения линзы из поля ввода (симуляция)"""
+    """Обновление положения линзы из поля ввода (перемещение в фоне)"""
 
     # Определение атрибутов в зависимости от номера линзы
     input_attr = 'lens1_pos_input' if lens_num == 1 else 'lens2_pos_input'
     setting_key = 'lens1_pos' if lens_num == 1 else 'lens2_pos'
+    axis = f"lens{lens_num}"
 
     if not hasattr(app_instance, input_attr): 
         return
@@ -189,9 +201,11 @@ def update_lens_pos(app_instance, lens_num):
 
     try:
         # Парсинг значения и обновление настроек
-        value = int(input_widget.text())
+        value = _clamp_lens_pos(app_instance, axis, int(input_widget.text()))
+        input_widget.setText(str(value))
         app_instance.current_settings[setting_key] = value
-        print(f"Lens {lens_num} position set to: {value} (Simulated)")
+        app_instance.motion_controller.move_to(axis, value)
+        print(f"Lens {lens_num} moving to: {value}")
 
     except ValueError:
         # Восстановление предыдущего значения при ошибке
@@ -202,6 +216,27 @@ def update_lens_pos(app_instance, lens_num):
     except Exception as e:
         print(f"Error updating lens {lens_num} position: {e}")
 
+
+def handle_position_changed(app_instance, axis, position):
+    """Текущее положение движущейся оси - в строку состояния"""
+    app_instance.statusBar().showMessage(f"{axis}: {position:.2f} мм")
+
+
+def handle_position_reached(app_instance, axis, position):
+    """Ось пришла в точку: строка состояния и поле ввода, если новых команд нет"""
+    app_instance.statusBar().showMessage(f"{axis}: {position:.2f} мм", 3000)
+
+    input_widget = getattr(app_instance, f"{axis}_pos_input", None)
+    if input_widget is None or app_instance.motion_controller.is_moving(axis):
+        return
+    value = int(round(position))
+    app_instance.current_settings[f"{axis}_pos"] = value
+    input_widget.setText(str(value))
+
+
+def handle_move_failed(app_instance, axis, error_message):
+    QMessageBox.warning(app_instance, "Ошибка", f"Ошибка перемещения {axis}: {error_message}")
+
 # Обертки для удобного вызова функций для конкретных линз
 def update_lens1_pos(app_instance):
     update_lens_pos(app_instance, 1)